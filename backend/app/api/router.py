@@ -1,8 +1,12 @@
-from fastapi import APIRouter, UploadFile, File, Form, BackgroundTasks
-from typing import List
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 import uuid
-from ..services import flow_orchestrator, renderer, storage
+import asyncio
+from pydantic import ValidationError
+from ..services import flow_orchestrator, renderer, storage, job_queue, job_registry, job_events, proxy_cache, geometry, resources, storyboard_service
 from ..models.job import JobResponse
+from ..models.storyboard import Storyboard
 
 api_router = APIRouter()
 
@@ -12,55 +16,153 @@ async def health_check():
     return {"status": "ok"}
 
 
+@api_router.get("/metrics")
+async def metrics():
+    """
+    Render resource metrics for instance sizing: this node's memory budget and
+    headroom, usage of running renders, and peaks of recent ones (bytes).
+    """
+    committed = await asyncio.to_thread(job_queue.committed_rss)
+    stats = await asyncio.to_thread(job_registry.resource_stats)
+    return {
+        "node": {
+            "memory_budget_bytes": resources.memory_budget(),
+            "memory_available_bytes": resources.memory_available(),
+            "committed_rss_bytes": committed,
+            "headroom_bytes": resources.headroom(committed),
+        },
+        **stats,
+    }
+
+
+def _upload_http_error(e: storage.UploadError) -> HTTPException:
+    if isinstance(e, storage.UploadTooLarge):
+        return HTTPException(status_code=413, detail=str(e))
+    if isinstance(e, storage.UploadNotFound):
+        return HTTPException(status_code=404, detail=f"Upload not found: {e}")
+    if isinstance(e, storage.UploadBusy):
+        return HTTPException(status_code=409, detail=str(e))
+    return HTTPException(status_code=400, detail=str(e))
+
+
+def _check_quality(quality: str):
+    if quality not in job_registry.QUALITIES:
+        raise HTTPException(status_code=400, detail=f"quality must be one of {', '.join(job_registry.QUALITIES)}")
+
+
 @api_router.post("/analyze", response_model=dict)
 async def analyze_media(
-    background_tasks: BackgroundTasks,
-    files: List[UploadFile] = File(...),
+    files: List[UploadFile] = File(None),
+    upload_ids: Optional[List[str]] = Form(None),
     style: str = Form("Hollywood"),
     duration_seconds: int = Form(30),
     aspect_ratio: str = Form("9:16"),
     language: str = Form("Auto"),
     use_music: bool = Form(False),
     use_voiceover: bool = Form(False),
+    priority: int = Form(0),
+    force_replan: bool = Form(False),
+    quality: str = Form(job_registry.QUALITY_FINAL),
 ):
-    print(f"[API] Analyze request received. Files: {len(files)}, Style: {style}")
+    files = files or []
+    if not files and not upload_ids:
+        raise HTTPException(status_code=400, detail="Send files or upload_ids")
+    _check_quality(quality)
+    if aspect_ratio not in geometry.ASPECT_RATIOS:
+        raise HTTPException(status_code=400, detail=f"aspect_ratio must be one of {', '.join(geometry.ASPECT_RATIOS)}")
+    print(f"[API] Analyze request received. Files: {len(files) + len(upload_ids or [])}, Style: {style}")
     
-    stored_paths = await storage.save_uploads(files)
-
-    # 1. Plan Storyboard (Fast, uses Gemini)
-    storyboard = await flow_orchestrator.plan_storyboard(
-        media_paths=stored_paths,
-        style=style,
-        duration_seconds=duration_seconds,
-        aspect_ratio=aspect_ratio,
-        use_music=use_music,
-        use_voiceover=use_voiceover,
-    )
-    
-    # 2. Assign Job ID immediately
+    # Assign Job ID up front so planning shows up in the registry too
     job_id = str(uuid.uuid4())
-    storyboard["job_id"] = job_id
+    await asyncio.to_thread(job_registry.create, job_id, job_registry.PLANNING)
+
+    try:
+        stored_paths = await storage.save_uploads(files, request_id=job_id, upload_ids=upload_ids)
+        # Start analysis proxies now; planning picks them up (or waits on them) per file
+        await asyncio.to_thread(proxy_cache.prefetch, stored_paths)
+        # The model sees the client's filenames, not blob hashes
+        media_names = await asyncio.to_thread(storage.display_names, stored_paths, job_id)
+
+        # 1. Plan Storyboard (Fast, uses Gemini)
+        storyboard = await flow_orchestrator.plan_storyboard(
+            media_paths=stored_paths,
+            style=style,
+            duration_seconds=duration_seconds,
+            aspect_ratio=aspect_ratio,
+            use_music=use_music,
+            use_voiceover=use_voiceover,
+            force_replan=force_replan,
+            media_names=media_names,
+        )
+    except storage.UploadError as e:
+        await asyncio.to_thread(job_registry.set_state, job_id, job_registry.FAILED, error=str(e))
+        raise _upload_http_error(e)
+    except Exception as e:
+        await asyncio.to_thread(job_registry.set_state, job_id, job_registry.FAILED, error=f"Planning failed: {e}")
+        raise
+
+    # 2. Validate once (scenes the model got wrong are dropped) and attach Job ID
+    try:
+        plan = Storyboard.from_plan({**storyboard, "job_id": job_id, "quality": quality})
+        plan = await asyncio.to_thread(storyboard_service.prepare, plan)
+    except (ValidationError, storyboard_service.InvalidSource) as e:
+        await asyncio.to_thread(job_registry.set_state, job_id, job_registry.FAILED, error=f"Invalid storyboard: {e}")
+        raise HTTPException(status_code=502, detail="Planner returned an invalid storyboard")
+    storyboard = plan.model_dump(mode="json")
     
-    # 3. Offload Rendering to Background (Non-blocking)
-    # Note: We call a synchronous wrapper or change renderer to sync to use threadpool
-    background_tasks.add_task(renderer.render_from_storyboard_sync, storyboard, job_id)
+    # 3. Queue Rendering for the render workers (Non-blocking; SQLite + memory estimate off the event loop)
+    await asyncio.to_thread(job_queue.enqueue, storyboard, job_id, priority=priority)
     
     return {
         **storyboard,
         "job_id": job_id,
         "output_url": None, # Not ready yet
-        "status": "processing"
+        "status": "queued"
     }
 
 
 @api_router.post("/render", response_model=JobResponse)
-async def render_reel(storyboard: dict):
+async def render_reel(storyboard: Storyboard, priority: int = 0, quality: Optional[str] = None):
     """
-    Accepts storyboard JSON and triggers async render job.
-    For now we can run it sync and just return job_id + file url.
+    Accepts a storyboard (validated by the model, 422 otherwise; scene files must be
+    uploads or library clips) and queues a render job.
+    Always gets a fresh job_id: a re-render must not report the previous output as done.
+    `quality=preview` renders a fast low-res preview; finalize it with POST /finalize/{job_id}.
     """
-    job = await renderer.render_from_storyboard(storyboard)
-    return job
+    quality = quality or storyboard.quality
+    _check_quality(quality)
+    job_id = str(uuid.uuid4())
+    # Sources are checked, and cuts clamped to the probed source lengths, once, here
+    try:
+        storyboard = await asyncio.to_thread(storyboard_service.prepare, storyboard)
+    except storyboard_service.InvalidSource as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    storyboard = storyboard.model_copy(update={"job_id": job_id, "quality": quality})
+    if quality == job_registry.QUALITY_PREVIEW:
+        # Previews read proxies that are ready and never wait on one: start any missing now
+        clips = [scene.file_path for scene in storyboard.scenes if scene.input_type == "user_clip" and scene.file_path]
+        await asyncio.to_thread(proxy_cache.prefetch, clips)
+    await asyncio.to_thread(job_queue.enqueue, storyboard.model_dump(mode="json"), job_id, priority=priority)
+    return JobResponse(job_id=job_id, status="queued", message="Queued for rendering", quality=quality)
+
+
+@api_router.post("/finalize/{job_id}", response_model=JobResponse)
+async def finalize_render(job_id: str, priority: int = 0):
+    """Re-renders the storyboard of an approved (preview) job at full quality, as a new job."""
+    storyboard = await asyncio.to_thread(job_queue.get_storyboard, job_id)
+    if storyboard is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    final_job_id = str(uuid.uuid4())
+    try:
+        storyboard = storyboard_service.check_sources(Storyboard.model_validate(storyboard))
+    except storyboard_service.InvalidSource as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    storyboard = storyboard.model_copy(update={"job_id": final_job_id, "quality": job_registry.QUALITY_FINAL})
+    await asyncio.to_thread(job_queue.enqueue, storyboard.model_dump(mode="json"), final_job_id, priority=priority)
+    print(f"[API] Finalizing {job_id} as {final_job_id}")
+    return JobResponse(
+        job_id=final_job_id, status="queued", message="Queued for rendering", quality=job_registry.QUALITY_FINAL
+    )
 
 
 @api_router.get("/status/{job_id}", response_model=JobResponse)
@@ -68,6 +170,35 @@ async def get_status(job_id: str):
     return await renderer.get_job_status(job_id)
 
 
+@api_router.get("/status/{job_id}/events")
+async def stream_status(job_id: str, request: Request):
+    """
+    Server-Sent Events stream of state transitions and encode progress.
+    Each `status` event carries the same payload as GET /status/{job_id}.
+    """
+    # Unknown jobs would otherwise hold a stream slot open until SSE_MAX_SECONDS
+    if await asyncio.to_thread(job_registry.get, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    try:
+        events = job_events.stream_job_events(job_id, request)
+    except job_events.TooManyConnections:
+        raise HTTPException(status_code=429, detail="Too many open streams for this job")
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@api_router.post("/cancel/{job_id}", response_model=JobResponse)
+async def cancel_job(job_id: str):
+    """Cancels a queued job, or stops a running render."""
+    job = await asyncio.to_thread(job_queue.cancel, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return await renderer.get_job_status(job_id)
+
+
 from ..services import chat_service
 from pydantic import BaseModel
 
@@ -79,7 +210,65 @@ class ChatRequest(BaseModel):
 async def chat_edit(request: ChatRequest):
     """
     Accepts current storyboard + user message.
-    Returns new storyboard + AI explanation.
+    Returns new storyboard + AI explanation, the applied edit operations and
+    the indices of changed scenes.
     """
+    try:
+        storyboard_service.check_sources(Storyboard.model_validate(request.storyboard))
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid storyboard: {e.errors()[0].get('msg')}")
+    except storyboard_service.InvalidSource as e:
+        raise HTTPException(status_code=422, detail=str(e))
     result = await chat_service.process_edit_request(request.storyboard, request.message)
+    # Edited B-roll scenes need a new clip
+    await flow_orchestrator.refresh_broll(result["storyboard"], result["changed_scenes"])
     return result
+
+
+class UploadInitRequest(BaseModel):
+    filename: str
+    size: int
+    sha256: Optional[str] = None
+
+
+@api_router.post("/uploads")
+async def init_upload(request: UploadInitRequest):
+    """
+    Starts a resumable chunked upload. Send parts with PUT /uploads/{id}/parts/{n}
+    (`part_size` bytes each, last one shorter), then POST /uploads/{id}/complete.
+    """
+    try:
+        return await asyncio.to_thread(storage.init_upload, request.filename, request.size, request.sha256)
+    except storage.UploadError as e:
+        raise _upload_http_error(e)
+
+
+@api_router.get("/uploads/{upload_id}")
+async def get_upload(upload_id: str):
+    """Upload status including `received_parts`, so clients can resume."""
+    try:
+        return await asyncio.to_thread(storage.get_upload, upload_id)
+    except storage.UploadError as e:
+        raise _upload_http_error(e)
+
+
+@api_router.put("/uploads/{upload_id}/parts/{part_number}")
+async def upload_part(upload_id: str, part_number: int, request: Request):
+    """Raw request body is one part; retrying a part overwrites it."""
+    try:
+        return await storage.write_upload_part(upload_id, part_number, request.stream())
+    except storage.UploadError as e:
+        raise _upload_http_error(e)
+
+
+@api_router.post("/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str):
+    """Verifies and stores the file; pass the upload_id to /analyze as `upload_ids`."""
+    try:
+        # Hashing a large file is blocking work, keep it off the event loop
+        meta = await asyncio.to_thread(storage.complete_upload, upload_id)
+    except storage.UploadError as e:
+        raise _upload_http_error(e)
+    # Start the analysis proxy so it's ready by the time the client calls /analyze
+    await asyncio.to_thread(proxy_cache.prefetch, [meta["path"]])
+    return meta
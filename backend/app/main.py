@@ -1,9 +1,10 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
 from .api.router import api_router
-from .services import storage
+from .services import storage, job_queue
 
 app = FastAPI(
     title="A.V.E.A – Automated Video Editing Agent",
@@ -18,8 +19,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    # Refuse before the multipart body is spooled to (memory-backed) /tmp
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > storage.MAX_UPLOAD_REQUEST_BYTES:
+        return JSONResponse(status_code=413, content={"detail": "Request body too large"})
+    return await call_next(request)
+
+
 app.include_router(api_router, prefix="/api")
 
+
+@app.on_event("startup")
+def start_render_workers():
+    # Renders run in separate processes claimed from the persistent queue
+    if job_queue.JOB_WORKERS > 0:
+        job_queue.start_workers(job_queue.JOB_WORKERS)
+
+
+@app.on_event("shutdown")
+def stop_render_workers():
+    job_queue.stop_workers()
+
 # Serve media directory (input + output) as static files
 app.mount(
     "/media",
@@ -2,8 +2,37 @@ from pydantic import BaseModel
 from typing import Optional
 
 
+class JobResources(BaseModel):
+    """Render resource accounting: estimate at submit, current and peak while running (bytes)."""
+    rss_estimate_bytes: Optional[int] = None
+    rss_bytes: Optional[int] = None
+    rss_peak_bytes: Optional[int] = None
+    # ffmpeg reader/writer processes
+    open_readers: Optional[int] = None
+    open_readers_peak: Optional[int] = None
+    temp_disk_bytes: Optional[int] = None
+    temp_disk_peak_bytes: Optional[int] = None
+
+
 class JobResponse(BaseModel):
     job_id: str
+    # queued | planning | rendering | encoding | completed | failed | cancelled
     status: str
     output_url: Optional[str] = None
     message: Optional[str] = None
+    # Encode progress, 0.0 - 1.0
+    progress: Optional[float] = None
+    error: Optional[str] = None
+    # Unix timestamps (seconds)
+    created_at: Optional[float] = None
+    updated_at: Optional[float] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    # Jobs ahead of this one while queued
+    queue_position: Optional[int] = None
+    # Suggested seconds before the next status poll (None once finished)
+    poll_after: Optional[float] = None
+    # preview (fast low-res render) | final
+    quality: Optional[str] = None
+    # Memory, ffmpeg processes and temp disk of the render (None until measured/estimated)
+    resources: Optional[JobResources] = None
@@ -0,0 +1,121 @@
+import json
+import hashlib
+from typing import Dict, Any, Optional, Tuple, Literal
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator, model_validator
+
+# Typed storyboard, validated once where it enters the system (/render, /analyze,
+# chat edits) and immutable afterwards. Timing is normalized so downstream code
+# never re-guesses defaults:
+# - user_clip: start < end always holds and duration == end - start
+#   ("end" missing or <= start means the first `duration` seconds)
+# - user_image / ai_broll: duration only (start = end = 0)
+# Unknown keys (style, sentiment, note, ...) are kept and round-trip to clients.
+# Checks that need the services (where sources may live, probed lengths) are in
+# services/storyboard_service.py.
+
+DEFAULT_SCENE_DURATION = 3.0
+
+# Output presets a storyboard may ask for (services/geometry.py maps them to frame sizes)
+ASPECT_RATIOS = ("9:16", "1:1", "4:5", "16:9")
+DEFAULT_ASPECT_RATIO = "9:16"
+# Resolution ladder, by the output's short side
+RESOLUTIONS = (
+    "360p",   # previews while a storyboard is being iterated on
+    "720p",   # drafts
+    "1080p",  # finals
+)
+
+FIT_COVER = "cover"     # fill the frame, crop the overflow
+FIT_CONTAIN = "contain" # show everything, pad the rest
+
+# Render quality tiers: previews are fast low-res renders for iterating on a
+# storyboard; finals are the full-quality deliverable
+QUALITY_PREVIEW = "preview"
+QUALITY_FINAL = "final"
+
+
+def _canonical_hash(data: Dict[str, Any]) -> str:
+    payload = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Scene(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="allow")
+
+    input_type: Literal["user_clip", "user_image", "ai_broll"]
+    file_path: Optional[str] = None
+    start: float = Field(0.0, ge=0)
+    end: float = Field(0.0, ge=0)
+    duration: float = Field(DEFAULT_SCENE_DURATION, gt=0)
+    role: Optional[str] = None
+    caption: str = ""
+    effect: Optional[str] = None
+    fit: Literal["cover", "contain"] = FIT_COVER
+    b_roll_keyword: Optional[str] = None
+    prompt: Optional[str] = None
+    provider: Optional[str] = None
+    asset_key: Optional[str] = None
+
+    @model_validator(mode="before")
+    @classmethod
+    def _normalize_timing(cls, data: Any) -> Any:
+        if not isinstance(data, dict):
+            return data
+        data = {k: v for k, v in data.items() if v is not None}
+        data.setdefault("caption", "")
+        if data.get("input_type") != "user_clip":
+            return {**data, "start": 0.0, "end": 0.0}
+        try:
+            start = float(data.get("start", 0.0))
+            end = float(data.get("end", 0.0))
+            duration = float(data.get("duration", DEFAULT_SCENE_DURATION))
+        except (TypeError, ValueError):
+            return data  # Field validation reports it
+        if end <= start:
+            start, end = 0.0, duration
+        return {**data, "start": start, "end": end, "duration": end - start}
+
+    def canonical_hash(self) -> str:
+        return _canonical_hash(self.model_dump(mode="json"))
+
+
+class Storyboard(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="allow")
+
+    scenes: Tuple[Scene, ...] = ()
+    use_music: bool = False
+    use_voiceover: bool = False
+    aspect_ratio: str = DEFAULT_ASPECT_RATIO
+    resolution: Optional[str] = None
+    quality: Literal["preview", "final"] = QUALITY_FINAL
+    job_id: Optional[str] = None
+
+    @field_validator("aspect_ratio")
+    @classmethod
+    def _known_aspect_ratio(cls, value: str) -> str:
+        if value not in ASPECT_RATIOS:
+            raise ValueError(f"aspect_ratio must be one of {', '.join(ASPECT_RATIOS)}")
+        return value
+
+    @field_validator("resolution")
+    @classmethod
+    def _known_resolution(cls, value: Optional[str]) -> Optional[str]:
+        if value is not None and value not in RESOLUTIONS:
+            raise ValueError(f"resolution must be one of {', '.join(RESOLUTIONS)}")
+        return value
+
+    @classmethod
+    def from_plan(cls, data: Dict[str, Any]) -> "Storyboard":
+        """Lenient parse for model-generated plans: scenes that don't validate are dropped."""
+        scenes = []
+        for i, raw in enumerate(data.get("scenes") or []):
+            try:
+                scenes.append(Scene.model_validate(raw))
+            except ValidationError as e:
+                print(f"[Storyboard] Dropping invalid scene {i}: {e.errors()[0].get('msg')}")
+        return cls.model_validate({**data, "scenes": scenes})
+
+    def canonical_hash(self) -> str:
+        """Stable identity of what gets rendered (job_id excluded)."""
+        return _canonical_hash(self.model_dump(mode="json", exclude={"job_id"}))
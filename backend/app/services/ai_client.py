@@ -0,0 +1,184 @@
+import os
+import time
+import random
+import asyncio
+import hashlib
+import functools
+import threading
+import concurrent.futures
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+# Process-wide async layer over the blocking google.generativeai SDK.
+# - One bounded executor for every Gemini call (uploads, generations), so a burst
+#   of requests can't spawn unbounded threads or exceed the API's concurrency
+# - A token-bucket rate limit shared by all callers
+# - Timeouts on the awaiting side (the SDK call itself can't be interrupted)
+# - Identical in-flight generations are coalesced into one API call
+# Blocking calls never run on the event loop, and waiting (rate limit, polling
+# remote processing) never occupies an executor thread: only SDK calls do.
+
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "8"))
+AI_REQUESTS_PER_MINUTE = float(os.getenv("AI_REQUESTS_PER_MINUTE", "60"))
+AI_GENERATE_TIMEOUT = float(os.getenv("AI_GENERATE_TIMEOUT", "180"))
+AI_UPLOAD_TIMEOUT = float(os.getenv("AI_UPLOAD_TIMEOUT", "600"))
+
+# Backoff for polling remote state (file processing etc.)
+POLL_INITIAL_DELAY = 0.5
+POLL_MAX_DELAY = 8.0
+
+_executor = concurrent.futures.ThreadPoolExecutor(max_workers=AI_MAX_CONCURRENCY, thread_name_prefix="ai")
+_inflight: Dict[str, concurrent.futures.Future] = {}
+_inflight_lock = threading.Lock()
+# Keeps the tasks that start coalesced calls alive until they've submitted
+_starting: Set[asyncio.Task] = set()
+
+
+class _RateLimiter:
+    """Token bucket: `rate_per_minute` calls, bursting up to one minute's worth."""
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1.0, rate_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    async def acquire(self):
+        """Takes one token, sleeping on the event loop until one is available."""
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            await asyncio.sleep(wait)
+
+
+_rate_limiter = _RateLimiter(AI_REQUESTS_PER_MINUTE)
+
+
+async def run_blocking(fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+    """
+    One blocking SDK call: waits for the shared rate limit (on the loop), then runs
+    `fn` on the shared executor and awaits it with a timeout.
+    """
+    await _rate_limiter.acquire()
+    future = _executor.submit(functools.partial(fn, *args, **kwargs))
+    return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+
+
+async def wait_with_backoff(
+    fetch: Callable[[], Awaitable[Any]],
+    pending: Callable[[Any], bool],
+    value: Any,
+    timeout: Optional[float] = None,
+) -> Any:
+    """
+    Re-fetches `value` (`await fetch()`) while `pending(value)` is true, sleeping
+    with jittered exponential backoff (POLL_INITIAL_DELAY .. POLL_MAX_DELAY).
+    Raises TimeoutError if still pending after `timeout` seconds.
+    """
+    delay = POLL_INITIAL_DELAY
+    deadline = time.monotonic() + timeout if timeout else None
+    while pending(value):
+        if deadline and time.monotonic() + delay > deadline:
+            raise TimeoutError("Timed out waiting for remote processing")
+        await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+        delay = min(delay * 2, POLL_MAX_DELAY)
+        value = await fetch()
+    return value
+
+
+async def gather_each(fn: Callable[[Any], Awaitable[Any]], items: List[Any], timeout: Optional[float] = None) -> List[Any]:
+    """`await fn(item)` for every item, concurrently; failures/timeouts come back as None."""
+    async def _one(item):
+        try:
+            return await asyncio.wait_for(fn(item), timeout)
+        except Exception as e:
+            print(f"[AI] Call failed for {item}: {e!r}")
+            return None
+    return await asyncio.gather(*(_one(item) for item in items))
+
+
+def _part_key(part: Any) -> str:
+    # Uploaded files are identified by their remote name; everything else by value
+    name = getattr(part, "name", None)
+    if name and not isinstance(part, (str, bytes, dict)):
+        return f"file:{name}"
+    return f"value:{part!r}"
+
+
+def _request_key(model_name: str, contents: List[Any], generation_config: Optional[Dict[str, Any]]) -> str:
+    h = hashlib.sha256()
+    h.update(model_name.encode("utf-8"))
+    h.update(repr(sorted((generation_config or {}).items())).encode("utf-8"))
+    for part in contents:
+        h.update(b"\0")
+        h.update(_part_key(part).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _generate_blocking(model_name: str, contents: List[Any], generation_config: Optional[Dict[str, Any]]) -> str:
+    import google.generativeai as genai
+
+    model = genai.GenerativeModel(model_name, generation_config=generation_config)
+    response = model.generate_content(contents)
+    return response.text
+
+
+async def _start_generate(future: concurrent.futures.Future, *args):
+    """Submits a coalesced generation once the rate limit allows; its result lands in `future`."""
+    try:
+        await _rate_limiter.acquire()
+        call = _executor.submit(_generate_blocking, *args)
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+
+    def _copy(done: concurrent.futures.Future):
+        if done.exception() is not None:
+            future.set_exception(done.exception())
+        else:
+            future.set_result(done.result())
+    call.add_done_callback(_copy)
+
+
+async def generate(
+    model_name: str,
+    contents: List[Any],
+    generation_config: Optional[Dict[str, Any]] = None,
+    timeout: float = AI_GENERATE_TIMEOUT,
+) -> str:
+    """
+    generate_content without blocking the event loop; returns the response text.
+    Concurrent identical requests (same model, config and contents) share one call.
+    Raises asyncio.TimeoutError after `timeout` seconds.
+    """
+    key = _request_key(model_name, contents, generation_config)
+    with _inflight_lock:
+        future = _inflight.get(key)
+        joined = future is not None
+        if not joined:
+            # Registered before the rate-limit wait, so identical requests join it meanwhile
+            future = concurrent.futures.Future()
+            _inflight[key] = future
+
+    if joined:
+        print(f"[AI] Joining in-flight request {key[:12]}")
+    else:
+        def _done(_):
+            with _inflight_lock:
+                _inflight.pop(key, None)
+        future.add_done_callback(_done)
+        # A task of its own: one caller timing out mustn't cancel the shared call
+        task = asyncio.ensure_future(_start_generate(future, model_name, contents, generation_config))
+        _starting.add(task)
+        task.add_done_callback(_starting.discard)
+
+    # shield: one caller timing out must not cancel the call for the others
+    return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
@@ -1,22 +1,387 @@
 import os
-import random
+import re
+import json
+import hashlib
+import math
+import time
+import uuid
+import threading
+import subprocess
+import concurrent.futures
+from typing import Dict, Any, List, Optional, Set, Tuple
 
-# In a real scenario, this would call Pexels/Pixabay API
-# For Phase 2 Foundation, we return a "Virtual Path" that the renderer understands
+from . import storage, media_probe
 
-def get_broll_path(keyword: str) -> str:
+# Local stock B-roll library.
+# - BROLL_LIBRARY_DIR is scanned into an on-disk index (filename words, sidecar tags,
+#   probed duration/orientation); only new or changed files are re-indexed
+# - Lookups hit an in-memory inverted index (token -> clips), so a search is a few
+#   dict/set operations; a background thread rescans the directory every
+#   BROLL_INDEX_REFRESH_SECONDS and swaps the new index in. With no persisted
+#   index yet (first run), the first lookup scans once before answering
+# - Candidates are ranked for the reel's frame, and clips that keep getting picked
+#   get a pre-cropped copy at that output size (one per size), so the renderer
+#   doesn't scale/crop the same stock clip on every reel
+#
+# Sidecar tags: "<clip>.txt" (comma/whitespace separated) or "<clip>.json" ({"tags": [...]}).
+
+BROLL_LIBRARY_DIR = os.getenv("BROLL_LIBRARY_DIR", os.path.join(storage.BASE_MEDIA_DIR, "broll_library"))
+BROLL_INDEX_PATH = os.path.join(storage.CACHE_DIR, "broll_index.json")
+BROLL_CROP_DIR = os.path.join(storage.CACHE_DIR, "broll_cache")
+os.makedirs(BROLL_CROP_DIR, exist_ok=True)
+
+BROLL_INDEX_REFRESH_SECONDS = float(os.getenv("BROLL_INDEX_REFRESH_SECONDS", "60"))
+# Picks before a clip gets a pre-cropped copy
+BROLL_POPULAR_HITS = int(os.getenv("BROLL_POPULAR_HITS", "3"))
+# Fraction of the keyword's words a clip must match to be returned at all
+BROLL_MIN_MATCH = float(os.getenv("BROLL_MIN_MATCH", "0.5"))
+
+# Default output frame (9:16 at 1080p) when the caller doesn't pass one
+CROP_W, CROP_H = 1080, 1920
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".m4v", ".mkv", ".webm")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {"a", "an", "the", "of", "and", "in", "on", "with", "for", "to", "at", "by", "clip", "stock", "broll"}
+
+_lock = threading.Lock()
+_entries: Dict[str, Dict[str, Any]] = {}
+_inverted: Dict[str, Set[str]] = {}
+_hits: Dict[str, int] = {}
+_hits_dirty = False
+_loaded = False
+_last_refresh = 0.0
+_refreshing = False
+_refresher: Optional[threading.Thread] = None
+# Held while the refresher is started (and the first scan runs, if there's no index)
+_start_lock = threading.Lock()
+
+_crop_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="broll-crop")
+_crops_inflight: Set[str] = set()
+
+
+def _tokens(text: str) -> Set[str]:
+    """Lowercase words minus stopwords, plus naive singulars ("cities" -> "city", "cars" -> "car")."""
+    out = set()
+    for word in _TOKEN_RE.findall(text.lower()):
+        if word in _STOPWORDS:
+            continue
+        out.add(word)
+        if len(word) > 4 and word.endswith("ies"):
+            out.add(word[:-3] + "y")
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            out.add(word[:-1])
+    return out
+
+
+def _sidecar_tags(path: str) -> Set[str]:
+    stem = os.path.splitext(path)[0]
+    tags = set()
+    try:
+        with open(stem + ".txt", encoding="utf-8") as f:
+            tags |= _tokens(f.read())
+    except OSError:
+        pass
+    try:
+        with open(stem + ".json", encoding="utf-8") as f:
+            tags |= _tokens(" ".join(json.load(f).get("tags", [])))
+    except (OSError, ValueError, AttributeError):
+        pass
+    return tags
+
+
+def _sidecar_mtime(path: str) -> float:
+    stem = os.path.splitext(path)[0]
+    latest = 0.0
+    for ext in (".txt", ".json"):
+        try:
+            latest = max(latest, os.stat(stem + ext).st_mtime)
+        except OSError:
+            pass
+    return latest
+
+
+def _index_file(path: str, st: os.stat_result) -> Optional[Dict[str, Any]]:
+    info = media_probe.probe(path)
+    if not info or not info.get("duration"):
+        return None
+    width, height = info["display_width"], info["display_height"]
+    rel = os.path.relpath(path, BROLL_LIBRARY_DIR)
+    tokens = _tokens(os.path.splitext(rel)[0]) | _sidecar_tags(path)
+    if width and height:
+        tokens.add("vertical" if height > width else "horizontal" if width > height else "square")
+    return {
+        "size": st.st_size,
+        "mtime": st.st_mtime,
+        "sidecar_mtime": _sidecar_mtime(path),
+        "duration": info["duration"],
+        "width": width,
+        "height": height,
+        "tokens": sorted(tokens),
+    }
+
+
+def _build_inverted(entries: Dict[str, Dict[str, Any]]) -> Dict[str, Set[str]]:
+    inverted: Dict[str, Set[str]] = {}
+    for rel, entry in entries.items():
+        for token in entry["tokens"]:
+            inverted.setdefault(token, set()).add(rel)
+    return inverted
+
+
+def _load_index():
+    """Loads the persisted index (caller holds _lock)."""
+    global _entries, _inverted, _loaded
+    try:
+        with open(BROLL_INDEX_PATH, encoding="utf-8") as f:
+            data = json.load(f)
+        _entries = dict(data.get("files", {}))
+        _hits.update(data.get("hits", {}))
+    except (OSError, ValueError):
+        pass
+    _inverted = _build_inverted(_entries)
+    _loaded = True
+
+
+def _save_index(entries: Dict[str, Dict[str, Any]], hits: Dict[str, int]):
+    temp_path = f"{BROLL_INDEX_PATH}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": entries, "hits": hits}, f)
+        os.replace(temp_path, BROLL_INDEX_PATH)
+    except OSError as e:
+        print(f"[B-Roll Service] Could not persist index: {e}")
+
+
+def _scan(previous: Dict[str, Dict[str, Any]]) -> Tuple[Dict[str, Dict[str, Any]], bool]:
+    """New index of the library directory, reusing unchanged entries. Returns (entries, changed)."""
+    entries: Dict[str, Dict[str, Any]] = {}
+    changed = False
+    for root, _, names in os.walk(BROLL_LIBRARY_DIR):
+        for name in names:
+            if not name.lower().endswith(VIDEO_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, BROLL_LIBRARY_DIR)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entry = previous.get(rel)
+            if (entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime
+                    and entry.get("sidecar_mtime", 0.0) == _sidecar_mtime(path)):
+                entries[rel] = entry
+                continue
+            new_entry = _index_file(path, st)
+            if new_entry:
+                entries[rel] = new_entry
+            changed = True
+    return entries, changed or set(previous) != set(entries)
+
+
+def refresh_index(force: bool = False):
     """
-    Returns a file path for the requested B-Roll keyword.
-    If API is configured, downloads and returns local path.
-    Otherwise, returns a special placeholder string.
+    Rescans the library, re-indexing only new/changed files. Cheap no-op between
+    intervals; runs on the background refresher thread (see _ensure_index).
+    The scan (ffprobe per new file) runs outside the lock; the finished index is
+    swapped in whole, so lookups never wait on it or see it half-built.
+    """
+    global _entries, _inverted, _last_refresh, _hits_dirty, _refreshing
+    with _lock:
+        if not _loaded:
+            _load_index()
+        now = time.monotonic()
+        if _refreshing or (not force and _last_refresh and now - _last_refresh < BROLL_INDEX_REFRESH_SECONDS):
+            return
+        _last_refresh = now
+        if not os.path.isdir(BROLL_LIBRARY_DIR):
+            return
+        _refreshing = True
+        previous = _entries
+        # Pick counts are persisted with the next scan rather than on every lookup
+        hits_changed = _hits_dirty
+        _hits_dirty = False
+
+    try:
+        entries, changed = _scan(previous)
+    finally:
+        with _lock:
+            _refreshing = False
+    if not (changed or hits_changed):
+        return
+
+    inverted = _build_inverted(entries)
+    with _lock:
+        _entries, _inverted = entries, inverted
+        for rel in set(_hits) - set(entries):
+            del _hits[rel]
+        hits = dict(_hits)
+    _save_index(entries, hits)
+    if changed:
+        print(f"[B-Roll Service] Index has {len(entries)} library clips")
+
+
+def _refresh_loop(scan_now: bool):
+    while True:
+        if scan_now:
+            try:
+                refresh_index(force=True)
+            except Exception as e:
+                print(f"[B-Roll Service] Index refresh failed: {e}")
+        scan_now = True
+        time.sleep(BROLL_INDEX_REFRESH_SECONDS)
+
+
+def _ensure_index():
+    """
+    Loads the persisted index once and starts the background rescans (first one
+    right away). Without a persisted index the library is scanned here first, so
+    lookups right after a fresh start can match; concurrent callers wait for it.
+    """
+    global _refresher
+    with _lock:
+        if not _loaded:
+            _load_index()
+        if _refresher is not None:
+            return
+    with _start_lock:
+        if _refresher is not None:
+            return
+        scanned = False
+        if not os.path.exists(BROLL_INDEX_PATH):
+            try:
+                refresh_index(force=True)
+                scanned = True
+            except Exception as e:
+                print(f"[B-Roll Service] Initial index scan failed: {e}")
+        refresher = threading.Thread(target=_refresh_loop, args=(not scanned,), name="broll-index", daemon=True)
+        refresher.start()
+        _refresher = refresher
+
+
+def _score(entry: Dict[str, Any], matched: int, n_query: int, duration: float, aspect: float) -> float:
+    """Keyword match dominates; duration and aspect fit break ties between matches."""
+    keyword = matched / n_query
+    # Full credit if the clip covers the scene, otherwise proportional
+    duration_fit = min(1.0, entry["duration"] / duration) if duration > 0 else 1.0
+    aspect_fit = 0.0
+    if entry["width"] and entry["height"] and aspect > 0:
+        aspect_fit = max(0.0, 1.0 - abs(math.log((entry["width"] / entry["height"]) / aspect)))
+    return 2.0 * keyword + 0.5 * duration_fit + 0.5 * aspect_fit
+
+
+def search(keyword: str, duration: float = 3.0, aspect: float = CROP_W / CROP_H, limit: int = 5) -> List[Tuple[str, float]]:
+    """
+    Ranked (absolute path, score) matches for `keyword`, best first. Scans the
+    library only on a first run with no persisted index (see _ensure_index).
+    """
+    _ensure_index()
+    query = _tokens(keyword)
+    if not query:
+        return []
+    # Published indexes are never modified, so this pair stays consistent
+    with _lock:
+        entries, inverted = _entries, _inverted
+
+    matched: Dict[str, int] = {}
+    for token in query:
+        for rel in inverted.get(token, ()):
+            matched[rel] = matched.get(rel, 0) + 1
+
+    min_matched = BROLL_MIN_MATCH * len(query)
+    ranked = sorted(
+        (
+            (rel, _score(entries[rel], n, len(query), duration, aspect))
+            for rel, n in matched.items()
+            if n >= min_matched
+        ),
+        key=lambda item: item[1],
+        reverse=True,
+    )
+    return [(os.path.join(BROLL_LIBRARY_DIR, rel), score) for rel, score in ranked[:limit]]
+
+
+def is_library_path(path: Optional[str]) -> bool:
+    """True for an existing clip inside the stock library (or its pre-cropped copies)."""
+    if not path or not os.path.isfile(path):
+        return False
+    real = os.path.realpath(path)
+    for root in (BROLL_LIBRARY_DIR, BROLL_CROP_DIR):
+        root = os.path.realpath(root)
+        if os.path.commonpath([real, root]) == root:
+            return True
+    return False
+
+
+def _crop_path_for(rel: str, entry: Dict[str, Any], size: Tuple[int, int]) -> str:
+    # Keyed on the index entry rather than the clip's bytes: a replaced clip gets a new copy
+    key = hashlib.sha256(f"{rel}\0{entry['size']}\0{entry['mtime']}".encode("utf-8")).hexdigest()
+    return os.path.join(BROLL_CROP_DIR, f"{key}_{size[0]}x{size[1]}.mp4")
+
+
+def _encode_crop(path: str, output_path: str, size: Tuple[int, int]):
+    """Scale-to-cover + center crop to the reel frame (`size`), in the renderer's segment format."""
+    crop_w, crop_h = size
+    import imageio_ffmpeg
+    ffmpeg_exe = imageio_ffmpeg.get_ffmpeg_exe()
+
+    info = media_probe.probe(path) or {}
+    # Always carry an audio track so the copy can be stream-copied into a reel
+    audio_input = 0 if info.get("has_audio") else 1
+    temp_path = f"{output_path}.{uuid.uuid4().hex}.tmp.mp4"
+    cmd = [
+        ffmpeg_exe, "-y",
+        "-i", path,
+        "-f", "lavfi", "-i", "anullsrc=r=44100:cl=stereo",
+        "-map", "0:v:0", "-map", f"{audio_input}:a:0",
+        "-vf", f"scale={crop_w}:{crop_h}:force_original_aspect_ratio=increase,crop={crop_w}:{crop_h},format=yuv420p",
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "20",
+        "-c:a", "aac", "-ar", "44100", "-ac", "2",
+        "-shortest",
+        temp_path,
+    ]
+    try:
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        os.replace(temp_path, output_path)
+        print(f"[B-Roll Service] Pre-cropped {os.path.basename(path)}")
+    except Exception as e:
+        print(f"[B-Roll Service] Pre-crop failed for {path}: {e}")
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        with _lock:
+            _crops_inflight.discard(output_path)
+
+
+def _record_hit(rel: str, path: str, size: Tuple[int, int]) -> str:
+    """Counts the pick; returns the pre-cropped copy at `size` if there is one, scheduling it once popular."""
+    global _hits_dirty
+    with _lock:
+        entry = _entries.get(rel)
+    if not entry:
+        return path
+    crop_path = _crop_path_for(rel, entry, size)
+    if os.path.exists(crop_path):
+        return crop_path
+    with _lock:
+        _hits[rel] = _hits.get(rel, 0) + 1
+        _hits_dirty = True
+        popular = _hits[rel] >= BROLL_POPULAR_HITS and crop_path not in _crops_inflight
+        if popular:
+            _crops_inflight.add(crop_path)
+    if popular:
+        _crop_executor.submit(_encode_crop, path, crop_path, size)
+    return path
+
+
+def get_broll_path(keyword: str, duration: float = 3.0, out_size: Tuple[int, int] = (CROP_W, CROP_H)) -> str:
+    """
+    Returns a file path for the requested B-Roll keyword: the best library match
+    for the reel's frame `out_size` (its pre-cropped copy at that size once
+    popular), or a "BROLL_PLACEHOLDER:" string if nothing in the library fits.
     """
-    # Mock Logic
     print(f"[B-Roll Service] Searching for: {keyword}")
-    
-    # Check for Pexels Key (Future Proofing)
-    pexels_key = os.getenv("PEXELS_API_KEY")
-    if pexels_key:
-        # TODO: Implement Pexels Download
-        pass
-        
+    results = search(keyword, duration=duration, aspect=out_size[0] / out_size[1], limit=1)
+    if results:
+        path = results[0][0]
+        return _record_hit(os.path.relpath(path, BROLL_LIBRARY_DIR), path, tuple(out_size))
     return f"BROLL_PLACEHOLDER:{keyword}"
@@ -0,0 +1,185 @@
+import os
+import hashlib
+import functools
+from typing import Dict, Any, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from . import storage
+
+# Caption sprites: each caption is rasterized once with Pillow/FreeType into a
+# tight RGBA PNG (text + box), cached on disk by text + style + font, so identical
+# captions are shared across scenes, jobs and processes. Frames only blend the
+# sprite's own rectangle; nothing composites a full 1080x1920 layer, and
+# ImageMagick isn't involved.
+
+CAPTION_CACHE_DIR = os.path.join(storage.CACHE_DIR, "caption_cache")
+os.makedirs(CAPTION_CACHE_DIR, exist_ok=True)
+
+# Optional TTF; otherwise CAPTION_FONT is resolved by FreeType, then common fallbacks
+CAPTION_FONTFILE = os.getenv("CAPTION_FONTFILE")
+CAPTION_FONT = os.getenv("CAPTION_FONT", "Arial")
+_FALLBACK_FONTS = ("arial.ttf", "DejaVuSans.ttf", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf")
+
+# Styles are designed for a 1080px short side and scaled for other output sizes
+REFERENCE_SHORT_SIDE = 1080
+# Caption top edge sits this fraction of the frame height above the bottom (280px at 1920)
+CAPTION_BOTTOM_FRACTION = 280 / 1920
+
+# Bottom caption: white on a 60% black box, 80% of the frame wide
+CAPTION_STYLE = {
+    "fontsize": 60,
+    "color": (255, 255, 255, 255),
+    "box": (0, 0, 0, 153),
+    "padding": (20, 10),
+    "max_width": 0.8,
+}
+# B-roll placeholder card label
+PLACEHOLDER_STYLE = {
+    "fontsize": 70,
+    "color": (255, 255, 0, 255),
+    "box": None,
+    "padding": (0, 0),
+    "max_width": 0.9,
+}
+
+
+@functools.lru_cache(maxsize=16)
+def _load_font(size: int) -> ImageFont.ImageFont:
+    candidates = [CAPTION_FONTFILE, CAPTION_FONT, f"{CAPTION_FONT}.ttf", *_FALLBACK_FONTS]
+    for name in candidates:
+        if not name:
+            continue
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    print("[Captions] No TrueType font found, using Pillow's default")
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:  # Pillow < 10.1
+        return ImageFont.load_default()
+
+
+def _wrap(text: str, font: ImageFont.ImageFont, max_width: int) -> str:
+    """Greedy word wrap on rendered pixel width (explicit newlines are kept)."""
+    lines = []
+    for paragraph in text.splitlines() or [""]:
+        line = ""
+        for word in paragraph.split():
+            candidate = f"{line} {word}" if line else word
+            if line and font.getlength(candidate) > max_width:
+                lines.append(line)
+                line = word
+            else:
+                line = candidate
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _sprite_key(text: str, style: Dict[str, Any], frame_w: int) -> str:
+    raw = f"{text}\0{sorted(style.items())!r}\0{frame_w}\0{CAPTION_FONTFILE}\0{CAPTION_FONT}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _rasterize(text: str, style: Dict[str, Any], frame_w: int, path: str):
+    font = _load_font(style["fontsize"])
+    wrapped = _wrap(text, font, int(frame_w * style["max_width"]))
+
+    probe = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+    left, top, right, bottom = probe.multiline_textbbox((0, 0), wrapped, font=font, align="center")
+    pad_x, pad_y = style["padding"]
+    width = int(right - left) + 1 + 2 * pad_x
+    height = int(bottom - top) + 1 + 2 * pad_y
+
+    image = Image.new("RGBA", (max(1, width), max(1, height)), style["box"] or (0, 0, 0, 0))
+    ImageDraw.Draw(image).multiline_text(
+        (pad_x - left, pad_y - top), wrapped, font=font, fill=style["color"], align="center"
+    )
+    temp_path = f"{path}.{os.getpid()}.tmp.png"
+    image.save(temp_path)
+    os.replace(temp_path, path)
+
+
+def scaled_style(style: Dict[str, Any], frame_w: int, frame_h: int) -> Dict[str, Any]:
+    """`style` with font size and padding scaled to the output's short side."""
+    factor = min(frame_w, frame_h) / REFERENCE_SHORT_SIDE
+    if factor == 1:
+        return style
+    pad_x, pad_y = style["padding"]
+    return {
+        **style,
+        "fontsize": max(8, round(style["fontsize"] * factor)),
+        "padding": (round(pad_x * factor), round(pad_y * factor)),
+    }
+
+
+def sprite_path(text: str, style: Dict[str, Any] = CAPTION_STYLE, frame_w: int = 1080) -> str:
+    """PNG sprite for `text` in `style`, rasterized on first use."""
+    path = os.path.join(CAPTION_CACHE_DIR, f"{_sprite_key(text, style, frame_w)}.png")
+    if not os.path.exists(path):
+        _rasterize(text, style, frame_w, path)
+    return path
+
+
+@functools.lru_cache(maxsize=256)
+def _load_sprite(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """(premultiplied RGB, 1 - alpha) as float32, ready for blending."""
+    rgba = np.asarray(Image.open(path).convert("RGBA"), dtype=np.float32)
+    alpha = rgba[:, :, 3:4] / 255.0
+    return rgba[:, :, :3] * alpha, 1.0 - alpha
+
+
+def blend(frame: np.ndarray, path: str, x: int, y: int) -> np.ndarray:
+    """Alpha-blends the sprite onto `frame` at (x, y), touching only the sprite's rectangle."""
+    color, inv_alpha = _load_sprite(path)
+    frame_h, frame_w = frame.shape[:2]
+    h, w = inv_alpha.shape[:2]
+    # Clip to the frame
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(frame_w, x + w), min(frame_h, y + h)
+    if x0 >= x1 or y0 >= y1:
+        return frame
+    if not frame.flags.writeable:
+        frame = frame.copy()
+    region = frame[y0:y1, x0:x1]
+    sx, sy = x0 - x, y0 - y
+    sprite_color = color[sy:sy + (y1 - y0), sx:sx + (x1 - x0)]
+    sprite_inv = inv_alpha[sy:sy + (y1 - y0), sx:sx + (x1 - x0)]
+    region[:] = (region * sprite_inv + sprite_color).astype(np.uint8)
+    return frame
+
+
+def sprite_size(path: str) -> Tuple[int, int]:
+    _, inv_alpha = _load_sprite(path)
+    return inv_alpha.shape[1], inv_alpha.shape[0]
+
+
+def caption_placement(text: str, frame_w: int, frame_h: int) -> Tuple[str, int, int]:
+    """Sprite path and top-left corner: centered horizontally, near the bottom of the frame."""
+    path = sprite_path(text, scaled_style(CAPTION_STYLE, frame_w, frame_h), frame_w)
+    w, _ = sprite_size(path)
+    return path, (frame_w - w) // 2, frame_h - round(frame_h * CAPTION_BOTTOM_FRACTION)
+
+
+def burn_caption(frame: np.ndarray, text: str) -> np.ndarray:
+    """Caption blended into a single frame (for stills that are encoded directly)."""
+    frame_h, frame_w = frame.shape[:2]
+    path, x, y = caption_placement(text, frame_w, frame_h)
+    return blend(frame, path, x, y)
+
+
+def overlay_caption(clip, text: str, frame_w: int, frame_h: int):
+    """Returns `clip` with the caption sprite blended into every frame."""
+    path, x, y = caption_placement(text, frame_w, frame_h)
+    return clip.fl_image(lambda frame: blend(frame, path, x, y))
+
+
+def placeholder_frame(label: str, frame_w: int, frame_h: int, background=(30, 30, 30)) -> np.ndarray:
+    """Static B-roll placeholder card: solid background with the centered label."""
+    frame = np.empty((frame_h, frame_w, 3), dtype=np.uint8)
+    frame[:] = background
+    path = sprite_path(label, scaled_style(PLACEHOLDER_STYLE, frame_w, frame_h), frame_w)
+    w, h = sprite_size(path)
+    return blend(frame, path, (frame_w - w) // 2, (frame_h - h) // 2)
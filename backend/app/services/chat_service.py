@@ -4,6 +4,8 @@ import json
 import google.generativeai as genai
 from typing import Dict, Any
 
+from . import ai_client, storyboard_patch
+
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 if GOOGLE_API_KEY:
     genai.configure(api_key=GOOGLE_API_KEY)
@@ -13,49 +15,74 @@ MODEL_NAME = "gemini-2.5-flash"  # Using 2.5 Flash for speed/reasoning
 async def process_edit_request(current_storyboard: Dict[str, Any], user_message: str) -> Dict[str, Any]:
     """
     Takes the current storyboard JSON and a user's natural language request.
-    Returns a tuple: (new_storyboard_json, explanation_text)
+    The model sees a compact view and returns edit operations only; they are
+    validated and applied here (all or nothing).
+    Returns {"explanation", "storyboard", "operations", "changed_scenes"}:
+    changed_scenes are indices of new or modified scenes in the new storyboard.
     """
     
     prompt = f"""
 You are an AI Video Editor Assistant.
-Your goal is to modify the keys in the JSON storyboard based on the User's Request.
+Your goal is to edit the storyboard below based on the User's Request.
 
-CURRENT STORYBOARD JSON:
-{json.dumps(current_storyboard, indent=2)}
+CURRENT STORYBOARD (one scene per line: index, then its fields; sources refer to MEDIA):
+{storyboard_patch.compact(current_storyboard)}
 
 USER REQUEST: "{user_message}"
 
 INSTRUCTIONS:
 1. Understand the user's intent (e.g., "remove last scene", "make the hook longer", "change caption").
-2. Modify the JSON to reflect this change.
-3. Keep the overall structure valid.
-4. Return the NEW JSON and a short explanation of what you did.
+2. Express the change as JSON Patch operations, touching only what the request asks for.
+   - {{"op": "replace", "path": "/scenes/2/caption", "value": "New text"}}
+   - {{"op": "remove", "path": "/scenes/4"}}
+   - {{"op": "add", "path": "/scenes/1", "value": {{"input_type": "ai_broll", "b_roll_keyword": "city night", "duration": 2.5}}}}
+   - {{"op": "move", "from": "/scenes/3", "path": "/scenes/0"}}
+   - {{"op": "replace", "path": "/use_music", "value": true}}
+   Scene indices refer to the storyboard as it is after the previous operations.
+   Scene fields: {", ".join(storyboard_patch.SCENE_FIELDS)}. Settings: {", ".join(storyboard_patch.STORYBOARD_FIELDS)}.
+3. Return the operations and a short explanation of what you did.
 
 OUTPUT FORMAT (Strict JSON):
 {{
   "explanation": "I removed the last scene as requested.",
-  "storyboard": {{ ... new storyboard json ... }}
+  "operations": [ ... ]
 }}
 """
 
     try:
-        model = genai.GenerativeModel(
+        text = (await ai_client.generate(
             MODEL_NAME,
-            generation_config={"response_mime_type": "application/json"}
-        )
-        response = model.generate_content(prompt)
-        text = response.text.strip()
+            [prompt],
+            generation_config={"response_mime_type": "application/json"},
+        )).strip()
         
         if text.startswith("```"):
             text = text.split("```", 2)[1]
             text = text.lstrip("json").strip()
             
         result = json.loads(text)
-        return result
-        
+        operations = result.get("operations", [])
+        storyboard, changed = storyboard_patch.apply(current_storyboard, operations)
+        return {
+            "explanation": result.get("explanation", ""),
+            "storyboard": storyboard,
+            "operations": operations,
+            "changed_scenes": changed,
+        }
+
+    except storyboard_patch.PatchError as e:
+        print(f"Chat Service rejected edit: {e}")
+        return {
+            "explanation": f"I couldn't apply that edit ({e}).",
+            "storyboard": current_storyboard,
+            "operations": [],
+            "changed_scenes": [],
+        }
     except Exception as e:
         print(f"Chat Service Error: {e}")
         return {
             "explanation": "I encountered an error trying to process that edit.",
-            "storyboard": current_storyboard
+            "storyboard": current_storyboard,
+            "operations": [],
+            "changed_scenes": [],
         }
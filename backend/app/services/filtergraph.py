@@ -0,0 +1,247 @@
+import os
+import textwrap
+from typing import Dict, Any, List, Optional, Tuple
+
+from . import media_probe, motion, geometry, captions
+from ..utils import ffmpeg_utils
+
+# Compiles a storyboard into ONE ffmpeg invocation (trim, scale, crop, drawtext,
+# concat, amix). Python only builds the graph; ffmpeg does all the pixel work.
+
+FPS = 24
+AUDIO_RATE = 44100
+# Optional TTF for drawtext; otherwise fontconfig resolves CAPTION_FONT
+CAPTION_FONTFILE = os.getenv("CAPTION_FONTFILE")
+CAPTION_FONT = os.getenv("CAPTION_FONT", "Arial")
+# Roughly matches MoviePy's caption box (80% of width at fontsize 60)
+CAPTION_WRAP_CHARS = 28
+
+
+def _escape_value(value: str) -> str:
+    """
+    Escapes a filter option value: one level for the option parser (\\ ' :),
+    then single-quoted so the graph parser leaves , ; [ ] alone.
+    """
+    for ch in ("\\", "'", ":"):
+        value = value.replace(ch, "\\" + ch)
+    return f"'{value}'"
+
+
+def _font_option() -> str:
+    if CAPTION_FONTFILE:
+        return f"fontfile={_escape_value(CAPTION_FONTFILE)}"
+    return f"font={_escape_value(CAPTION_FONT)}"
+
+
+def _drawtext(text_path: str, fontsize: int, color: str, y: str, box: bool) -> str:
+    """
+    drawtext reading from a file: avoids escaping arbitrary caption text
+    through two parser levels, and expansion=none keeps '%' literal.
+    """
+    opts = [
+        f"textfile={_escape_value(text_path)}",
+        "expansion=none",
+        _font_option(),
+        f"fontsize={fontsize}",
+        f"fontcolor={color}",
+        "x=(w-text_w)/2",
+        f"y={y}",
+    ]
+    if box:
+        opts += ["box=1", "boxcolor=black@0.6", "boxborderw=20"]
+    return "drawtext=" + ":".join(opts)
+
+
+def _write_text(work_dir: str, name: str, text: str, wrap: bool = True) -> str:
+    path = os.path.join(work_dir, f"{name}.txt")
+    if wrap:
+        text = "\n".join(textwrap.wrap(text, CAPTION_WRAP_CHARS)) or text
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return path
+
+
+def _fit_chain(
+    target_w: int,
+    target_h: int,
+    fit: str = geometry.FIT_COVER,
+    info: Optional[Dict[str, Any]] = None,
+    fps: float = FPS,
+) -> str:
+    """
+    Maps the input onto the frame (same plan as the MoviePy path): with probe info,
+    crop in source space then one scale (+ pad for contain); otherwise let ffmpeg
+    work out the cover/contain scale.
+    """
+    if info and info.get("display_width") and info.get("display_height"):
+        plan = geometry.plan(info["display_width"], info["display_height"], target_w, target_h, fit)
+        chain = geometry.ffmpeg_chain(plan)
+    elif fit == geometry.FIT_CONTAIN:
+        chain = (
+            f"scale={target_w}:{target_h}:force_original_aspect_ratio=decrease,"
+            f"pad={target_w}:{target_h}:(ow-iw)/2:(oh-ih)/2:black"
+        )
+    else:
+        chain = f"scale={target_w}:{target_h}:force_original_aspect_ratio=increase,crop={target_w}:{target_h}"
+    return f"{chain},setsar=1,fps={fps},format=yuv420p"
+
+
+def _motion(scene, duration: float, target_w: int, target_h: int, fps: float = FPS) -> str:
+    """",zoompan=..." for scenes with a zoom/pan effect, else empty."""
+    effect = motion.effect_for(scene)
+    if not effect:
+        return ""
+    return "," + motion.zoompan_filter(effect, duration, fps, target_w, target_h)
+
+
+def _silence(duration: float) -> str:
+    return f"anullsrc=r={AUDIO_RATE}:cl=stereo,atrim=duration={duration:.3f}"
+
+
+def compile_storyboard(
+    scenes: List[Any],
+    output_path: str,
+    work_dir: str,
+    target_w: int = 1080,
+    target_h: int = 1920,
+    tts_paths: Optional[Dict[int, str]] = None,
+    music_path: Optional[str] = None,
+    music_volume: float = 0.15,
+    fps: float = FPS,
+    encoder_params: Optional[List[str]] = None,
+) -> Optional[Tuple[List[str], float]]:
+    """
+    Builds the ffmpeg argv that renders the whole reel in a single process.
+    - scenes: validated Scene models
+    - work_dir: where caption text files are written (must outlive the ffmpeg run)
+    - tts_paths: scene index -> voiceover audio file (already generated)
+    - music_path: optional background track, looped under the mix
+    - fps / encoder_params: output frame rate and extra video encoder flags (e.g. -crf for previews)
+    Returns (argv, output duration in seconds), or None if no scene could be compiled.
+    """
+    tts_paths = tts_paths or {}
+    inputs: List[str] = []
+    filters: List[str] = []
+    concat_pads: List[str] = []
+    total_duration = 0.0
+    n_inputs = 0
+    # Caption/label sizes follow the output's short side, like the sprite path
+    caption_size = captions.scaled_style(captions.CAPTION_STYLE, target_w, target_h)["fontsize"]
+    label_size = captions.scaled_style(captions.PLACEHOLDER_STYLE, target_w, target_h)["fontsize"]
+    caption_y = f"h-{round(target_h * captions.CAPTION_BOTTOM_FRACTION)}"
+
+    def add_input(*args: str) -> int:
+        nonlocal n_inputs
+        inputs.extend(args)
+        n_inputs += 1
+        return n_inputs - 1
+
+    for i, scene in enumerate(scenes):
+        input_type = scene.input_type
+        file_path = scene.file_path
+        caption = scene.caption
+        start, end, duration = scene.start, scene.end, scene.duration
+
+        v_label, a_label = f"v{i}", f"a{i}"
+
+        # 1) Base video + audio
+        if input_type == "ai_broll":
+            keyword = scene.b_roll_keyword or "B-Roll"
+            label_path = _write_text(work_dir, f"broll_{i}", f"B-ROLL\n{keyword}", wrap=False)
+            filters.append(
+                f"color=c=0x1e1e1e:s={target_w}x{target_h}:d={duration:.3f}:r={fps},format=yuv420p,"
+                f"{_drawtext(label_path, label_size, 'yellow', '(h-text_h)/2', box=False)}[{v_label}_base]"
+            )
+            filters.append(f"{_silence(duration)}[{a_label}_base]")
+
+        elif input_type == "user_clip":
+            if not file_path or not os.path.exists(file_path):
+                print(f"Error: Clip not found {file_path}")
+                continue
+            info = media_probe.probe(file_path)
+            if not info:
+                print(f"Error loading clip {file_path}")
+                continue
+            duration = min(end, info["duration"]) - start
+            if duration <= 0:
+                print(f"Error: cut starts past the end of {file_path}")
+                continue
+
+            idx = add_input("-ss", f"{start:.3f}", "-t", f"{duration:.3f}", "-i", file_path)
+            filters.append(
+                f"[{idx}:v]{_fit_chain(target_w, target_h, scene.fit, info, fps)}"
+                f"{_motion(scene, duration, target_w, target_h, fps)},"
+                f"setpts=PTS-STARTPTS[{v_label}_base]"
+            )
+            if info["has_audio"]:
+                filters.append(
+                    f"[{idx}:a]aresample={AUDIO_RATE},aformat=channel_layouts=stereo,"
+                    f"asetpts=PTS-STARTPTS[{a_label}_base]"
+                )
+            else:
+                filters.append(f"{_silence(duration)}[{a_label}_base]")
+
+        elif input_type == "user_image":
+            if not file_path or not os.path.exists(file_path):
+                print(f"Error loading image {file_path}")
+                continue
+            idx = add_input("-loop", "1", "-framerate", str(fps), "-t", f"{duration:.3f}", "-i", file_path)
+            fit_chain = _fit_chain(target_w, target_h, scene.fit, media_probe.probe(file_path), fps)
+            filters.append(
+                f"[{idx}:v]{fit_chain}{_motion(scene, duration, target_w, target_h, fps)}[{v_label}_base]"
+            )
+            filters.append(f"{_silence(duration)}[{a_label}_base]")
+
+        else:
+            continue
+
+        # 2) Caption
+        if caption:
+            caption_path = _write_text(work_dir, f"caption_{i}", caption)
+            filters.append(
+                f"[{v_label}_base]{_drawtext(caption_path, caption_size, 'white', caption_y, box=True)}[{v_label}]"
+            )
+        else:
+            filters.append(f"[{v_label}_base]null[{v_label}]")
+
+        # 3) Voiceover: user audio ducked to 30% under the TTS track
+        if i in tts_paths:
+            tts_idx = add_input("-i", tts_paths[i])
+            filters.append(
+                f"[{a_label}_base]volume=0.3[{a_label}_duck];"
+                f"[{tts_idx}:a]aresample={AUDIO_RATE},aformat=channel_layouts=stereo[{a_label}_tts];"
+                f"[{a_label}_duck][{a_label}_tts]amix=inputs=2:duration=first:normalize=0[{a_label}]"
+            )
+        else:
+            filters.append(f"[{a_label}_base]anull[{a_label}]")
+
+        concat_pads.append(f"[{v_label}][{a_label}]")
+        total_duration += duration
+
+    if not concat_pads:
+        return None
+
+    filters.append(f"{''.join(concat_pads)}concat=n={len(concat_pads)}:v=1:a=1[vout][aout]")
+    audio_out = "[aout]"
+
+    # 4) Background music
+    if music_path:
+        music_idx = add_input("-stream_loop", "-1", "-i", music_path)
+        filters.append(
+            f"[{music_idx}:a]volume={music_volume}[bg];"
+            f"[aout][bg]amix=inputs=2:duration=first:normalize=0[amix]"
+        )
+        audio_out = "[amix]"
+
+    argv = [
+        ffmpeg_utils.ffmpeg_exe(), "-y",
+        *inputs,
+        "-filter_complex", ";".join(filters),
+        "-map", "[vout]", "-map", audio_out,
+        "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", "-r", str(fps),
+        *(encoder_params or []),
+        "-c:a", "aac", "-b:a", "192k",
+        "-movflags", "+faststart",
+        output_path,
+    ]
+    return argv, total_duration
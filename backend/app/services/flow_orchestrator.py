@@ -1,10 +1,157 @@
-from typing import List, Dict, Any
+import os
 import asyncio
+from typing import List, Dict, Any, Optional, Set, Callable, Awaitable
 
-from .gemini_client import analyze_media_with_gemini
+from . import storyboard_cache, generated_assets, broll_service, geometry, storage
+from .gemini_client import analyze_media_with_gemini, MODEL_NAME, PROMPT_VERSION
 from .veo_client import generate_broll_with_veo
 from .nano_banana_client import apply_vfx_with_nanobanana
 
+# AI B-roll generation runs concurrently (bounded), with a timeout per task.
+# Each distinct prompt is generated once: duplicates within a storyboard share a
+# task, and the persistent generated-asset cache dedups across storyboards.
+BROLL_CONCURRENCY = int(os.getenv("BROLL_CONCURRENCY", "3"))
+BROLL_TASK_TIMEOUT = float(os.getenv("BROLL_TASK_TIMEOUT", "300"))
+# Forces one provider for every ai_broll scene; empty = per scene. "stub" (local
+# stand-in clips, for development) is only used when set here, never per scene
+BROLL_PROVIDER = os.getenv("BROLL_PROVIDER", "").lower()
+# Return the plan while B-roll is still generating; the render worker renders the
+# other scenes first and picks the generated clips up as they land
+BROLL_OVERLAP_RENDER = os.getenv("BROLL_OVERLAP_RENDER", "true").lower() == "true"
+
+# (provider, prompt, duration, style) -> path of the generated clip, or None
+Generator = Callable[[str, str, int, str], Awaitable[Optional[str]]]
+
+_semaphore: Optional[asyncio.Semaphore] = None
+# Strong references so background generations aren't garbage-collected mid-flight
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(BROLL_CONCURRENCY)
+    return _semaphore
+
+
+def _provider_for(scene: Dict[str, Any]) -> Optional[str]:
+    if BROLL_PROVIDER == "stub":
+        return "stub"
+    provider = BROLL_PROVIDER or (scene.get("provider") or "").lower()
+    if "veo" in provider:
+        return "veo"
+    if "nano" in provider:
+        return "nano"
+    return None
+
+
+async def _call_provider(provider: str, prompt: str, duration: int, style: str) -> Optional[str]:
+    output_dir = generated_assets.GENERATED_DIR
+    if provider == "veo":
+        return await generate_broll_with_veo(prompt=prompt, duration_seconds=duration, output_dir=output_dir)
+    if provider == "stub":
+        from .stub_broll_client import generate_broll_stub
+        return await generate_broll_stub(prompt=prompt, duration_seconds=duration, output_dir=output_dir)
+    # Nano usually processes an existing clip, but if used for generation:
+    # logical placeholder for now. If input was user_clip + vfx, logic would differ.
+    return await apply_vfx_with_nanobanana(
+        input_path="", # Placeholder if strict generation, or pass a source
+        style=style,
+        output_dir=output_dir,
+    )
+
+
+async def _generate_asset(
+    key: str, provider: str, prompt: str, duration: int, style: str, generate: Generator = _call_provider
+) -> Optional[str]:
+    path, error = None, None
+    async with _get_semaphore():
+        print(f"[Orchestrator] Generating {provider} asset: {prompt!r}")
+        try:
+            path = await asyncio.wait_for(generate(provider, prompt, duration, style), BROLL_TASK_TIMEOUT)
+        except asyncio.TimeoutError:
+            error = f"timed out after {BROLL_TASK_TIMEOUT:.0f}s"
+        except Exception as e:
+            error = str(e)
+
+    if path:
+        print(f"[Orchestrator] Generated {prompt!r} at {path}")
+        await asyncio.to_thread(generated_assets.mark_ready, key, path)
+    else:
+        error = error or "provider returned nothing"
+        print(f"[Orchestrator] Generation skipped/failed for {prompt!r}: {error}")
+        await asyncio.to_thread(generated_assets.mark_failed, key, error)
+    return path
+
+
+async def _start_broll(
+    scenes: List[Dict[str, Any]],
+    style: str,
+    aspect_ratio: Optional[str] = None,
+    generate: Generator = _call_provider,
+) -> List[asyncio.Task]:
+    """
+    Tags every ai_broll scene with its asset_key and starts generation for keys
+    nobody has (or is) generating. Returns the started tasks.
+    Stock clips are picked (and pre-cropped) for the reel's `aspect_ratio`.
+    `generate(provider, prompt, duration, style)` produces the clip (tests inject a stub).
+    """
+    out_size = geometry.output_size(aspect_ratio)
+    tasks: Dict[str, asyncio.Task] = {}
+    for scene in scenes:
+        if scene.get("input_type") != "ai_broll":
+            continue
+        provider = _provider_for(scene)
+        if not provider:
+            # No generative provider: use the best match from the local stock library, if any
+            keyword = scene.get("b_roll_keyword") or scene.get("prompt") or ""
+            path = await asyncio.to_thread(
+                broll_service.get_broll_path, keyword, float(scene.get("duration", 3.0)), out_size
+            )
+            if os.path.isabs(path):
+                scene["file_path"] = path
+            continue
+        prompt = scene.get("prompt") or scene.get("b_roll_keyword") or ""
+        duration = max(1, int(float(scene.get("duration", 3.0))))
+        key = generated_assets.asset_key(provider, prompt, duration=duration, style=style if provider == "nano" else "")
+        scene["asset_key"] = key
+
+        if key in tasks:
+            continue
+        if await asyncio.to_thread(generated_assets.claim, key, provider, prompt):
+            tasks[key] = asyncio.create_task(_generate_asset(key, provider, prompt, duration, style, generate))
+    return list(tasks.values())
+
+
+def _keep_running(tasks: List[asyncio.Task]):
+    for task in tasks:
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+
+async def refresh_broll(storyboard: Dict[str, Any], scene_indices: List[int]):
+    """
+    After a chat edit: starts B-roll for the given ai_broll scenes that lost (or
+    never had) their clip, in the background like an overlapped plan.
+    """
+    scenes = storyboard.get("scenes", [])
+    stale = [
+        scenes[i] for i in scene_indices
+        if scenes[i].get("input_type") == "ai_broll" and not scenes[i].get("asset_key") and not scenes[i].get("file_path")
+    ]
+    if not stale:
+        return
+    _keep_running(await _start_broll(stale, storyboard.get("style", ""), storyboard.get("aspect_ratio")))
+    await asyncio.to_thread(_attach_ready_assets, stale)
+
+
+def _attach_ready_assets(scenes: List[Dict[str, Any]]):
+    for scene in scenes:
+        key = scene.get("asset_key")
+        path = generated_assets.ready_path(key) if key else None
+        if path:
+            scene["file_path"] = path
+
 
 async def plan_storyboard(
     media_paths: List[str],
@@ -13,56 +160,62 @@ async def plan_storyboard(
     aspect_ratio: str = "9:16",
     use_music: bool = False,
     use_voiceover: bool = False,
+    force_replan: bool = False,
+    media_names: Optional[Dict[str, str]] = None,
 ) -> Dict[str, Any]:
     """
     Main orchestration entry for planning the reel.
-    1. Call Gemini to get the storyboard.
-    2. Check for 'ai_broll' scenes and trigger generation.
-    3. Return final storyboard with file paths ready for renderer.
+    1. Get the storyboard (cached plan for the same media + parameters, else Gemini).
+    2. Start generation for 'ai_broll' scenes (concurrent, deduplicated).
+    3. Return final storyboard; scenes still generating carry an asset_key the renderer waits on.
+    `media_names` ({path: name}, see storage.display_names) is how the user's files
+    are named to the model; it's kept on the storyboard for chat edits.
     """
-    # 1. Get the plan from Gemini
-    storyboard = await analyze_media_with_gemini(
-        media_paths=media_paths,
+    media_names = media_names or await asyncio.to_thread(storage.display_names, media_paths)
+    cache_key = await asyncio.to_thread(
+        storyboard_cache.cache_key,
+        media_paths,
         style=style,
-        target_duration_seconds=duration_seconds,
+        duration_seconds=duration_seconds,
         aspect_ratio=aspect_ratio,
+        use_music=use_music,
+        use_voiceover=use_voiceover,
+        model=MODEL_NAME,
+        prompt_version=PROMPT_VERSION,
     )
+    storyboard = None
+    if not force_replan:
+        storyboard = await asyncio.to_thread(storyboard_cache.get, cache_key, media_paths)
+        if storyboard is not None:
+            print(f"[Orchestrator] Reusing cached storyboard {cache_key[:12]}")
+
+    # 1. Get the plan from Gemini
+    if storyboard is None:
+        storyboard = await analyze_media_with_gemini(
+            media_paths=media_paths,
+            style=style,
+            target_duration_seconds=duration_seconds,
+            aspect_ratio=aspect_ratio,
+            media_names=media_names,
+        )
+        # Fallback plans mean Gemini was unavailable; the next attempt should ask again
+        if storyboard.get("scenes") and not storyboard.get("fallback"):
+            await asyncio.to_thread(storyboard_cache.put, cache_key, storyboard, media_paths)
 
     scenes = storyboard.get("scenes", [])
-    
-    # 2. Process AI generation tasks
-    # We run them sequentially for now to be safe, but asyncio.gather is better for speed.
-    for i, scene in enumerate(scenes):
-        input_type = scene.get("input_type")
-        provider = scene.get("provider", "").lower()
-        prompt = scene.get("prompt", "")
-        duration = float(scene.get("duration", 3.0))
-        
-        if input_type == "ai_broll":
-            generated_path = None
-            
-            if "veo" in provider:
-                print(f"[Orchestrator] Generating Veo B-roll for scene {i+1}...")
-                generated_path = await generate_broll_with_veo(
-                    prompt=prompt,
-                    duration_seconds=int(duration)
-                )
-            
-            elif "nano" in provider:
-                 print(f"[Orchestrator] Generating Nano Banana VFX for scene {i+1}...")
-                 # Nano usually processes an existing clip, but if used for generation:
-                 # logical placeholder for now. If input was user_clip + vfx, logic would differ.
-                 generated_path = await apply_vfx_with_nanobanana(
-                     input_path="", # Placeholder if strict generation, or pass a source
-                     style=style 
-                 )
-            
-            if generated_path:
-                print(f"[Orchestrator] Scene {i+1} generated at {generated_path}")
-                scene["file_path"] = generated_path
-            else:
-                print(f"[Orchestrator] Scene {i+1} generation skipped/failed.")
+
+    # 2. Process AI generation tasks (also on cache hits: assets may have expired or failed)
+    tasks = await _start_broll(scenes, style, aspect_ratio)
+    if tasks:
+        if BROLL_OVERLAP_RENDER:
+            _keep_running(tasks)
+        else:
+            await asyncio.gather(*tasks)
+    await asyncio.to_thread(_attach_ready_assets, scenes)
 
     storyboard["use_music"] = use_music
     storyboard["use_voiceover"] = use_voiceover
+    # The renderer sizes the output from this preset
+    storyboard["aspect_ratio"] = aspect_ratio
+    storyboard["media_names"] = media_names
     return storyboard
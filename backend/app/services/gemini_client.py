@@ -1,15 +1,12 @@
 import os
 import json
-import time
 import asyncio
-import concurrent.futures
-import subprocess
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import google.generativeai as genai
-from moviepy.editor import VideoFileClip
 
-# Note: In production, ensure moviepy doesn't crash if ffmpeg is missing.
-# We wrap duration checks in try/except.
+from . import media_probe, proxy_cache, gemini_file_cache, ai_client, storage
+
+# Durations come from the shared ffprobe cache (no VideoFileClip / frame decode).
 
 GOOG_API_KEY = os.getenv("GOOGLE_API_KEY")
 
@@ -25,23 +22,22 @@ else:
 
 # Selected for Video Analysis (Speed + VQA capabilities):
 MODEL_NAME = "gemini-2.0-flash"
+# Bump whenever the planning prompt or its output format changes (invalidates cached storyboards)
+PROMPT_VERSION = 1
 
 
 def _get_media_info(path: str) -> str:
     """Helper to get duration string or image label."""
     filename = os.path.basename(path)
-    if path.lower().endswith(('.jpg', '.jpeg', '.png', '.webp')):
+    if path.lower().endswith(media_probe.IMAGE_EXTENSIONS):
         return f"{filename} [Type: Image]"
     
-    # Try to scan video duration
-    try:
-        clip = VideoFileClip(path)
-        duration = clip.duration
-        clip.close()
-        return f"{filename} [Type: Video, Duration: {duration:.1f}s]"
-    except Exception as e:
-        print(f"Error reading duration for {path}: {e}")
+    # Cached ffprobe lookup
+    duration = media_probe.duration(path)
+    if duration is None:
+        print(f"Error reading duration for {path}")
         return f"{filename} [Type: Video, Duration: Unknown]"
+    return f"{filename} [Type: Video, Duration: {duration:.1f}s]"
 
 def _create_fallback_storyboard(media_paths: List[str], style: str, target_duration: int) -> Dict[str, Any]:
     """Generates a dynamic multi-cut storyboard without AI."""
@@ -53,12 +49,7 @@ def _create_fallback_storyboard(media_paths: List[str], style: str, target_durat
     main_video = media_paths[0]
     duration = 5.0
     
-    try:
-        clip = VideoFileClip(main_video)
-        duration = clip.duration
-        clip.close()
-    except:
-        pass
+    duration = media_probe.duration(main_video) or duration
 
     # If video is long enough, cut it into 3 parts
     if duration > 15:
@@ -110,70 +101,25 @@ def _create_fallback_storyboard(media_paths: List[str], style: str, target_durat
         "style": style,
         "target_duration": target_duration,
         "scenes": scenes,
+        "fallback": True,
         "note": "Generated via Smart Fallback (API Error)"
     }
 
-def _compress_video_for_analysis(input_path: str) -> str:
-    """
-    Compresses video to 360p low bitrate for faster global upload & analysis.
-    Returns path to compressed temp file.
-    """
-    if not input_path.lower().endswith((".mp4", ".mov", ".avi", ".mkv")):
-        return input_path # Skip images
-        
-    try:
-        temp_dir = os.path.dirname(input_path)
-        filename = os.path.basename(input_path)
-        output_path = os.path.join(temp_dir, f"temp_lowres_{filename}")
-        
-        # Check if already exists from previous run
-        if os.path.exists(output_path):
-            return output_path
+def _is_uploadable(path: str) -> bool:
+    return path.lower().endswith(('.mp4', '.mov', '.avi', '.jpg', '.jpeg', '.png', '.webp', '.heic', '.heif'))
 
-        # FFmpeg command: Scale to 360p height, max 1000k bitrate, ultra fast preset
-        # This reduces a 100MB file to ~5MB in seconds.
-        import imageio_ffmpeg
-        ffmpeg_exe = imageio_ffmpeg.get_ffmpeg_exe()
-        
-        cmd = [
-            ffmpeg_exe, "-y",
-            "-i", input_path,
-            "-vf", "scale=-2:360", # Maintain aspect ratio, height 360
-            "-b:v", "700k", # Low bitrate
-            "-preset", "ultrafast",
-            "-c:a", "copy", # Copy audio (fast)
-            output_path
-        ]
-        
-        # Suppress output unless error
-        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        
-        print(f"[Compress] Reduced {filename} for analysis -> {output_path}")
-        return output_path
-    
-    except Exception as e:
-        print(f"[Compress] Failed to compress {input_path}, using original. Error: {e}")
-        return input_path
 
-def _upload_single_file(path: str):
-    """Blocking upload function to be run in a thread."""
+async def _upload_single_file(item: Tuple[str, str]):
+    """Uploads one file (SDK calls on the shared AI executor). `item` is (source path, path to upload)."""
+    path, upload_path = item
     try:
-        if not path.lower().endswith(('.mp4', '.mov', '.avi', '.jpg', '.jpeg', '.png', '.webp')):
+        if not _is_uploadable(path):
             return None
-        
-        # OPTIMIZATION: Compress before upload
-        upload_path = _compress_video_for_analysis(path)
-            
-        print(f"Starting upload: {os.path.basename(upload_path)}...")
-        file_ref = genai.upload_file(path=upload_path)
-        
-        # Wait for processing
-        while file_ref.state.name == "PROCESSING":
-            time.sleep(1) # Check more frequently
-            file_ref = genai.get_file(file_ref.name)
-            
-        print(f"Ready: {os.path.basename(upload_path)}")
-        return file_ref
+
+        # Reuses the remote file if this exact media was uploaded and hasn't expired
+        file_cache = await asyncio.to_thread(gemini_file_cache.get_file_cache)
+        key = await asyncio.to_thread(proxy_cache.cache_key, path)
+        return await file_cache.get_or_upload(upload_path, key=key)
     except Exception as e:
         print(f"Upload failed for {path}: {e}")
         return None
@@ -184,27 +130,27 @@ async def analyze_media_with_gemini(
     style: str,
     target_duration_seconds: int,
     aspect_ratio: str = "9:16",
+    media_names: Optional[Dict[str, str]] = None,
 ) -> Dict[str, Any]:
     """
     Calls Gemini using parallel file uploads.
+    `media_names` ({path: unique name}) is how files are named to the model,
+    normally the client's original filenames; scene file_paths are mapped back.
     """
     if not GOOG_API_KEY:
         return _create_fallback_storyboard(media_paths, style, target_duration_seconds)
 
-    # 1. Parallel Uploads via ThreadPool
-    print(f"analyze_media: Uploading {len(media_paths)} files in parallel (max 5 concurrent)...")
+    # 1. Parallel Uploads on the shared AI executor (bounded process-wide)
+    print(f"analyze_media: Uploading {len(media_paths)} files in parallel (max {ai_client.AI_MAX_CONCURRENCY} concurrent)...")
     uploaded_files = []
     
     try:
-        # Run synchronous uploads in threads with limited concurrency
-        loop = asyncio.get_running_loop()
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-            tasks = [
-                loop.run_in_executor(executor, _upload_single_file, path)
-                for path in media_paths
-            ]
-            results = await asyncio.gather(*tasks)
-            
+        # OPTIMIZATION: Upload the cached low-res proxies (usually already encoded in the
+        # background). Awaited here so AI executor threads never sit waiting on an encode.
+        upload_paths = await asyncio.gather(*(proxy_cache.get_proxy_async(p) for p in media_paths))
+        results = await ai_client.gather_each(
+            _upload_single_file, list(zip(media_paths, upload_paths)), timeout=ai_client.AI_UPLOAD_TIMEOUT
+        )
         uploaded_files = [f for f in results if f is not None]
         
         print(f"Uploads complete. {len(uploaded_files)} files ready for analysis.")
@@ -214,6 +160,8 @@ async def analyze_media_with_gemini(
         return _create_fallback_storyboard(media_paths, style, target_duration_seconds)
 
     # 2. Construct Prompt
+    # Files are named as the user knows them, not by their blob (hash) names
+    names = media_names or storage.display_names(media_paths)
     # We pass the file handles directly in the list
     
     duration_instruction = f"Target Length: {target_duration_seconds} sec."
@@ -260,15 +208,13 @@ If user says "Imagine a world of AI", you can insert a scene:
 {{ "input_type": "ai_broll", "b_roll_keyword": "futuristic ai robot", "duration": 2.5, "caption": "Imagine AI", ... }}
 
 Mapping attempts:
-{json.dumps([os.path.basename(p) for p in media_paths])}
+{json.dumps([names[p] for p in media_paths], ensure_ascii=False)}
 """
 
     content_payload = uploaded_files + [prompt_text]
 
     try:
-        model = genai.GenerativeModel(MODEL_NAME)
-        response = model.generate_content(content_payload)
-        text = response.text.strip()
+        text = (await ai_client.generate(MODEL_NAME, content_payload)).strip()
 
         # [DEBUG] Log raw response
         log_path = os.path.join(os.path.dirname(__file__), "..", "..", "gemini_debug.log")
@@ -286,11 +232,18 @@ Mapping attempts:
             
         storyboard = json.loads(text)
         
-        # Mapping basename back to full path
+        # Mapping names back to full paths (the model may also echo a blob name)
         filename_map = {os.path.basename(p): p for p in media_paths}
+        filename_map.update({names[p]: p for p in media_paths})
         
         for scene in storyboard.get("scenes", []):
             fp = scene.get("file_path", "")
+            if scene.get("input_type") == "ai_broll":
+                # file_path carries the B-roll keyword here, never a user file
+                scene.pop("file_path", None)
+                if fp and not scene.get("b_roll_keyword"):
+                    scene["b_roll_keyword"] = fp
+                continue
             if fp in filename_map:
                 scene["file_path"] = filename_map[fp]
             else:
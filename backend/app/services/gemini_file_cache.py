@@ -0,0 +1,146 @@
+import os
+import time
+import asyncio
+import sqlite3
+import threading
+from typing import Any, Optional
+
+from . import storage, ai_client
+
+# Persistent map: media content key -> Gemini file name + expiry.
+# Identical media uploaded again (same clip, next /analyze call) reuses the remote
+# file instead of paying upload + server-side processing again.
+#
+# The upload API is injected (`client`): anything with upload_file(path=...) and
+# get_file(name) works, so the cache runs against a local stand-in in tests.
+# The default client is the google.generativeai module itself. Every client call
+# goes through ai_client (rate limit + shared executor); waiting for server-side
+# processing happens on the event loop.
+
+GEMINI_FILE_CACHE_DB = os.getenv("GEMINI_FILE_CACHE_DB", os.path.join(storage.STATE_DIR, "gemini_files.db"))
+# Gemini keeps uploaded files for 48h; assume slightly less when the API doesn't say
+DEFAULT_TTL_SECONDS = 47 * 3600
+# Don't hand out a reference that expires before the request can use it
+EXPIRY_MARGIN_SECONDS = float(os.getenv("GEMINI_FILE_EXPIRY_MARGIN", "3600"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS gemini_files (
+    key TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+def _expiry_of(file_ref: Any, now: float) -> float:
+    expiration = getattr(file_ref, "expiration_time", None)
+    if expiration is not None and hasattr(expiration, "timestamp"):
+        return expiration.timestamp()
+    return now + DEFAULT_TTL_SECONDS
+
+
+class GeminiFileCache:
+    def __init__(self, client: Any = None, db_path: str = GEMINI_FILE_CACHE_DB):
+        if client is None:
+            import google.generativeai as genai
+            client = genai
+        self.client = client
+        self.db_path = db_path
+        conn = self._connect()
+        try:
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _lookup(self, key: str) -> Optional[str]:
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT name FROM gemini_files WHERE key = ? AND expires_at > ?",
+                (key, time.time() + EXPIRY_MARGIN_SECONDS),
+            ).fetchone()
+        finally:
+            conn.close()
+        return row["name"] if row else None
+
+    def _remember(self, key: str, file_ref: Any):
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO gemini_files (key, name, expires_at, created_at) VALUES (?, ?, ?, ?)",
+                (key, file_ref.name, _expiry_of(file_ref, now), now),
+            )
+        finally:
+            conn.close()
+
+    def forget(self, key: str):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM gemini_files WHERE key = ?", (key,))
+        finally:
+            conn.close()
+
+    async def _get_file(self, name: str) -> Any:
+        return await ai_client.run_blocking(self.client.get_file, name)
+
+    async def _wait_until_processed(self, file_ref: Any) -> Any:
+        name = file_ref.name
+        return await ai_client.wait_with_backoff(
+            lambda: self._get_file(name),
+            lambda ref: ref.state.name == "PROCESSING",
+            file_ref,
+            timeout=ai_client.AI_UPLOAD_TIMEOUT,
+        )
+
+    async def _reuse(self, key: str) -> Optional[Any]:
+        """Returns the live remote file for `key`, or None if it's gone/failed."""
+        name = await asyncio.to_thread(self._lookup, key)
+        if not name:
+            return None
+        try:
+            file_ref = await self._wait_until_processed(await self._get_file(name))
+        except Exception as e:
+            print(f"[GeminiFiles] Cached file {name} unavailable, re-uploading: {e}")
+            await asyncio.to_thread(self.forget, key)
+            return None
+        if file_ref.state.name != "ACTIVE":
+            await asyncio.to_thread(self.forget, key)
+            return None
+        return file_ref
+
+    async def get_or_upload(self, path: str, key: str) -> Any:
+        """
+        Returns the remote file for `path` once processed (ACTIVE, or FAILED as the
+        API reports it), uploading only if `key` has no unexpired ACTIVE reference.
+        """
+        file_ref = await self._reuse(key)
+        if file_ref is not None:
+            print(f"[GeminiFiles] Reusing {file_ref.name} for {os.path.basename(path)}")
+            return file_ref
+
+        print(f"Starting upload: {os.path.basename(path)}...")
+        file_ref = await self._wait_until_processed(await ai_client.run_blocking(self.client.upload_file, path=path))
+        if file_ref.state.name == "ACTIVE":
+            await asyncio.to_thread(self._remember, key, file_ref)
+        print(f"Ready: {os.path.basename(path)}")
+        return file_ref
+
+
+_default: Optional[GeminiFileCache] = None
+_default_lock = threading.Lock()
+
+
+def get_file_cache() -> GeminiFileCache:
+    """Process-wide cache using the real Gemini client."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = GeminiFileCache()
+        return _default
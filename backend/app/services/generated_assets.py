@@ -0,0 +1,146 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, Any, Optional
+
+from . import storage
+
+# Persistent cache of AI-generated assets (B-roll, VFX), keyed by provider + prompt
+# + parameters. The same prompt within one storyboard, or across storyboards, is
+# generated once. Rows also carry the generation status, so a render worker (another
+# process) can wait for an asset that the API process is still generating.
+
+GENERATED_ASSETS_DB = os.getenv("GENERATED_ASSETS_DB", os.path.join(storage.STATE_DIR, "generated_assets.db"))
+GENERATED_DIR = os.path.join(storage.BASE_MEDIA_DIR, "generated")
+os.makedirs(GENERATED_DIR, exist_ok=True)
+
+# A pending row older than this is treated as abandoned (its generator died)
+PENDING_STALE_SECONDS = float(os.getenv("BROLL_PENDING_STALE_SECONDS", "900"))
+WAIT_POLL_SECONDS = 0.5
+
+PENDING = "pending"
+READY = "ready"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS generated_assets (
+    key TEXT PRIMARY KEY,
+    provider TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    status TEXT NOT NULL,
+    path TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    global _schema_ready
+    conn = sqlite3.connect(GENERATED_ASSETS_DB, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    if not _schema_ready:
+        with _schema_lock:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            _schema_ready = True
+    return conn
+
+
+def asset_key(provider: str, prompt: str, **params) -> str:
+    """Prompts are compared case- and whitespace-insensitively."""
+    normalized = " ".join(prompt.lower().split())
+    raw = f"{provider}\0{normalized}\0{sorted(params.items())!r}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get(key: str) -> Optional[Dict[str, Any]]:
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT * FROM generated_assets WHERE key = ?", (key,)).fetchone()
+    finally:
+        conn.close()
+    return dict(row) if row else None
+
+
+def claim(key: str, provider: str, prompt: str) -> bool:
+    """
+    Marks `key` as being generated by the caller. Returns False if it's already
+    ready (file still on disk) or another generator is working on it.
+    Failed and stale entries are reclaimed.
+    """
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT status, path, updated_at FROM generated_assets WHERE key = ?", (key,)).fetchone()
+        if row:
+            if row["status"] == READY and row["path"] and os.path.exists(row["path"]):
+                conn.execute("COMMIT")
+                return False
+            if row["status"] == PENDING and row["updated_at"] > now - PENDING_STALE_SECONDS:
+                conn.execute("COMMIT")
+                return False
+        conn.execute(
+            "INSERT OR REPLACE INTO generated_assets (key, provider, prompt, status, path, error, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, NULL, NULL, ?, ?)",
+            (key, provider, prompt, PENDING, now, now),
+        )
+        conn.execute("COMMIT")
+        return True
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def _finish(key: str, status: str, path: Optional[str] = None, error: Optional[str] = None):
+    conn = _connect()
+    try:
+        conn.execute(
+            "UPDATE generated_assets SET status = ?, path = ?, error = ?, updated_at = ? WHERE key = ?",
+            (status, path, error, time.time(), key),
+        )
+    finally:
+        conn.close()
+
+
+def mark_ready(key: str, path: str):
+    _finish(key, READY, path=path)
+
+
+def mark_failed(key: str, error: str):
+    _finish(key, FAILED, error=error)
+
+
+def ready_path(key: str) -> Optional[str]:
+    """Path of a finished asset that still exists, else None."""
+    entry = get(key)
+    if entry and entry["status"] == READY and entry["path"] and os.path.exists(entry["path"]):
+        return entry["path"]
+    return None
+
+
+def wait_ready(key: str, timeout: float) -> Optional[str]:
+    """
+    Blocks until `key` is ready (returns its path), failed/missing (None),
+    or `timeout` seconds pass (None). Used by render workers.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        entry = get(key)
+        if not entry or entry["status"] == FAILED:
+            return None
+        if entry["status"] == READY:
+            return entry["path"] if entry["path"] and os.path.exists(entry["path"]) else None
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        time.sleep(min(WAIT_POLL_SECONDS, remaining))
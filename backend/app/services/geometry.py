@@ -0,0 +1,138 @@
+import os
+import math
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from ..models import storyboard as storyboard_model
+from ..models.storyboard import DEFAULT_ASPECT_RATIO, FIT_COVER, FIT_CONTAIN
+
+# Output geometry: deliverable presets (aspect ratio x resolution ladder) and a
+# per-scene plan mapping the source frame onto the output in ONE resampling pass
+# (crop in source coordinates, then a single resize), instead of
+# resize-by-height, maybe resize-by-width, then crop.
+
+# Preset names are defined with the storyboard model; here they get their numbers
+# ("9:16" -> (9, 16), "720p" -> 720 pixels on the short side)
+ASPECT_RATIOS: Dict[str, Tuple[int, int]] = {
+    name: tuple(int(part) for part in name.split(":")) for name in storyboard_model.ASPECT_RATIOS
+}
+RESOLUTIONS: Dict[str, int] = {name: int(name[:-1]) for name in storyboard_model.RESOLUTIONS}
+DEFAULT_RESOLUTION = os.getenv("RENDER_RESOLUTION", "1080p")
+
+
+def _even(value: float) -> int:
+    """yuv420p needs even dimensions."""
+    return max(2, int(round(value / 2)) * 2)
+
+
+def output_size(aspect_ratio: Optional[str] = None, resolution: Optional[str] = None) -> Tuple[int, int]:
+    """(width, height) for a preset; unknown values fall back to 9:16 / RENDER_RESOLUTION."""
+    ratio_w, ratio_h = ASPECT_RATIOS.get(aspect_ratio or "", ASPECT_RATIOS[DEFAULT_ASPECT_RATIO])
+    short = RESOLUTIONS.get(resolution or "", RESOLUTIONS.get(DEFAULT_RESOLUTION, 1080))
+    if ratio_w <= ratio_h:
+        return short, _even(short * ratio_h / ratio_w)
+    return _even(short * ratio_w / ratio_h), short
+
+
+@dataclass(frozen=True)
+class Geometry:
+    """
+    How one source maps onto the output:
+    source region (crop_*) -> resized to (scaled_w, scaled_h) -> placed at (pad_x, pad_y).
+    Cover plans have no padding; contain plans use the whole source.
+    """
+    src_w: int
+    src_h: int
+    out_w: int
+    out_h: int
+    crop_x: int
+    crop_y: int
+    crop_w: int
+    crop_h: int
+    scaled_w: int
+    scaled_h: int
+    pad_x: int
+    pad_y: int
+
+    @property
+    def is_identity(self) -> bool:
+        return (self.src_w, self.src_h) == (self.out_w, self.out_h) and (self.crop_w, self.crop_h) == (self.src_w, self.src_h)
+
+    @property
+    def is_padded(self) -> bool:
+        return (self.scaled_w, self.scaled_h) != (self.out_w, self.out_h)
+
+    def matrix(self) -> np.ndarray:
+        """2x3 affine mapping source pixels to output pixels (for warps that fold in other transforms)."""
+        sx = self.scaled_w / self.crop_w
+        sy = self.scaled_h / self.crop_h
+        return np.array(
+            [[sx, 0.0, self.pad_x - self.crop_x * sx], [0.0, sy, self.pad_y - self.crop_y * sy]],
+            dtype=np.float32,
+        )
+
+
+def plan(src_w: int, src_h: int, out_w: int, out_h: int, fit: str = FIT_COVER) -> Geometry:
+    """Single scale + crop (cover) or scale + pad (contain) for a source of display size src_w x src_h."""
+    if fit == FIT_CONTAIN:
+        scale = min(out_w / src_w, out_h / src_h)
+        scaled_w = min(out_w, _even(src_w * scale))
+        scaled_h = min(out_h, _even(src_h * scale))
+        return Geometry(
+            src_w, src_h, out_w, out_h,
+            0, 0, src_w, src_h,
+            scaled_w, scaled_h,
+            (out_w - scaled_w) // 2, (out_h - scaled_h) // 2,
+        )
+
+    scale = max(out_w / src_w, out_h / src_h)
+    # Largest centered source window with the output's aspect ratio
+    crop_w = min(src_w, max(1, int(math.floor(out_w / scale + 1e-6))))
+    crop_h = min(src_h, max(1, int(math.floor(out_h / scale + 1e-6))))
+    return Geometry(
+        src_w, src_h, out_w, out_h,
+        (src_w - crop_w) // 2, (src_h - crop_h) // 2, crop_w, crop_h,
+        out_w, out_h,
+        0, 0,
+    )
+
+
+def apply_to_frame(frame: np.ndarray, geometry: Geometry, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Crop (a view, no copy) + one resize; padded plans are drawn into a black canvas."""
+    if geometry.is_identity:
+        return frame
+    g = geometry
+    region = frame[g.crop_y:g.crop_y + g.crop_h, g.crop_x:g.crop_x + g.crop_w]
+    shrinking = g.scaled_w < g.crop_w
+    interpolation = cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR
+    if not g.is_padded:
+        return cv2.resize(region, (g.out_w, g.out_h), dst=out, interpolation=interpolation)
+    if out is None:
+        out = np.zeros((g.out_h, g.out_w, 3), dtype=np.uint8)
+    out[g.pad_y:g.pad_y + g.scaled_h, g.pad_x:g.pad_x + g.scaled_w] = cv2.resize(
+        region, (g.scaled_w, g.scaled_h), interpolation=interpolation
+    )
+    return out
+
+
+def apply_to_clip(clip, geometry: Geometry):
+    """MoviePy clip resampled to the output by `geometry` (one pass per frame)."""
+    if geometry.is_identity:
+        return clip
+    out = np.zeros((geometry.out_h, geometry.out_w, 3), dtype=np.uint8) if geometry.is_padded else None
+    return clip.fl_image(lambda frame: apply_to_frame(frame, geometry, out))
+
+
+def ffmpeg_chain(geometry: Geometry) -> str:
+    """The same mapping as an ffmpeg filter chain: crop in source space, then one scale (+ pad)."""
+    g = geometry
+    chain = []
+    if (g.crop_w, g.crop_h) != (g.src_w, g.src_h):
+        chain.append(f"crop={g.crop_w}:{g.crop_h}:{g.crop_x}:{g.crop_y}")
+    chain.append(f"scale={g.scaled_w}:{g.scaled_h}")
+    if g.is_padded:
+        chain.append(f"pad={g.out_w}:{g.out_h}:{g.pad_x}:{g.pad_y}:black")
+    return ",".join(chain)
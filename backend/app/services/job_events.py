@@ -0,0 +1,112 @@
+import os
+import json
+import time
+import asyncio
+import threading
+import weakref
+from typing import AsyncIterator, Callable, Dict
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+
+from . import job_registry, renderer
+
+# Server-Sent Events for job progress: one long-lived connection per job replaces
+# repeated GET /status polling. The registry is checked in-process (a local SQLite
+# read), and only changes are pushed to the client.
+
+SSE_CHECK_INTERVAL = float(os.getenv("SSE_CHECK_INTERVAL", "0.5"))
+# Comment line sent when nothing changed, so proxies don't drop the idle connection
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+# Hard cap on a single stream; clients reconnect (EventSource does this automatically)
+SSE_MAX_SECONDS = float(os.getenv("SSE_MAX_SECONDS", "1800"))
+SSE_MAX_CONNECTIONS_PER_JOB = int(os.getenv("SSE_MAX_CONNECTIONS_PER_JOB", "3"))
+
+# Open streams per job; checked and taken in one step under _lock, released when a stream ends
+_connections: Dict[str, int] = {}
+_lock = threading.Lock()
+
+
+class TooManyConnections(Exception):
+    pass
+
+
+def _format_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_job_events(job_id: str, request: Request) -> AsyncIterator[str]:
+    """
+    Returns the SSE stream for `job_id`:
+    - `status` whenever state or progress changes (same payload as GET /status)
+    - a `: heartbeat` comment when idle
+    - `timeout` when SSE_MAX_SECONDS is reached (the client reopens the stream)
+    - `not_found` if the job isn't in the registry
+    The stream ends after a terminal state, `timeout`, `not_found` or when the
+    client disconnects. Callers reject unknown jobs before opening a stream.
+    Raises TooManyConnections if the job already has its share of streams.
+    """
+    with _lock:
+        if _connections.get(job_id, 0) >= SSE_MAX_CONNECTIONS_PER_JOB:
+            raise TooManyConnections(job_id)
+        # Counted now, not when the stream starts: requests arriving together can't
+        # all pass the check before any of them is counted
+        _connections[job_id] = _connections.get(job_id, 0) + 1
+    release = _releaser(job_id)
+    frames = _frames(job_id, request, release)
+    # A stream that is never iterated never reaches its finally; free its slot when it's collected
+    weakref.finalize(frames, release)
+    return frames
+
+
+def _releaser(job_id: str) -> Callable[[], None]:
+    """Gives one stream's slot back, once, however often it's called."""
+    released = False
+
+    def release():
+        nonlocal released
+        with _lock:
+            if released:
+                return
+            released = True
+            _connections[job_id] -= 1
+            if not _connections[job_id]:
+                del _connections[job_id]
+
+    return release
+
+
+async def _frames(job_id: str, request: Request, release: Callable[[], None]) -> AsyncIterator[str]:
+    started = time.monotonic()
+    last_sent = started
+    last_key = object()  # forces the first event
+    try:
+        # Tell EventSource how long to wait before reconnecting
+        yield f"retry: {int(SSE_HEARTBEAT_SECONDS * 1000)}\n\n"
+        while True:
+            if await request.is_disconnected():
+                return
+
+            state = await asyncio.to_thread(job_registry.get, job_id)
+            if state is None:
+                yield _format_event("not_found", {"job_id": job_id})
+                return
+            key = (state["status"], state["progress"], state["updated_at"])
+            if key != last_key:
+                last_key = key
+                last_sent = time.monotonic()
+                status = await renderer.get_job_status(job_id)
+                yield _format_event("status", jsonable_encoder(status))
+                if status.status in job_registry.TERMINAL_STATES:
+                    return
+            elif time.monotonic() - last_sent >= SSE_HEARTBEAT_SECONDS:
+                last_sent = time.monotonic()
+                yield ": heartbeat\n\n"
+
+            if time.monotonic() - started >= SSE_MAX_SECONDS:
+                yield _format_event("timeout", {"job_id": job_id})
+                return
+
+            await asyncio.sleep(SSE_CHECK_INTERVAL)
+    finally:
+        release()
@@ -0,0 +1,427 @@
+import os
+import sys
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import multiprocessing
+from typing import Dict, Any, Optional, List, Tuple
+
+from . import storage, job_registry, resources
+
+# Persistent render queue backed by SQLite.
+# The API process only enqueues; renders run in separate worker processes,
+# so the web workers stay responsive and renders are capped at the node's capacity.
+
+QUEUE_DB_PATH = os.getenv("JOB_QUEUE_DB", os.path.join(storage.STATE_DIR, "jobs.db"))
+# Render worker processes started alongside the API (0 = run `python -m app.worker` separately)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "2"))
+# A running job whose worker hasn't heartbeated for this long is requeued
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "120"))
+POLL_INTERVAL = 1.0
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    storyboard TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (status, priority DESC, created_at);
+"""
+# Columns added after the table first shipped: existing databases get them on connect
+_ADDED_COLUMNS = {
+    # Estimated peak RSS of the render (admission control)
+    "rss_estimate": "INTEGER",
+}
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    """One short-lived connection per call; SQLite handles cross-process locking."""
+    global _schema_ready
+    conn = sqlite3.connect(QUEUE_DB_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    if not _schema_ready:
+        with _schema_lock:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for name, decl in _ADDED_COLUMNS.items():
+                if name not in existing:
+                    try:
+                        conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {decl}")
+                    except sqlite3.OperationalError:
+                        pass  # Another process added it first
+            _schema_ready = True
+    return conn
+
+
+def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    job = dict(row)
+    job.pop("storyboard", None)
+    return job
+
+
+def enqueue(storyboard: Dict[str, Any], job_id: str, priority: int = 0) -> Dict[str, Any]:
+    """
+    Adds a render job. Higher priority runs first; ties run in submission order.
+    The storyboard's "quality" (preview / final) and its estimated peak memory
+    are recorded for job status and admission control.
+    """
+    now = time.time()
+    quality = storyboard.get("quality") or job_registry.QUALITY_FINAL
+    rss_estimate = _estimate_rss(storyboard)
+    job_registry.create(job_id, job_registry.QUEUED, quality=quality, rss_estimate=rss_estimate)
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT INTO jobs (job_id, storyboard, priority, status, max_attempts, created_at, updated_at, rss_estimate) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, json.dumps(storyboard), priority, QUEUED, JOB_MAX_ATTEMPTS, now, now, rss_estimate),
+        )
+    finally:
+        conn.close()
+    job_registry.set_state(job_id, job_registry.QUEUED)
+    print(f"[Queue] Job {job_id} queued (priority {priority})")
+    return get_job(job_id)
+
+
+def _estimate_rss(storyboard: Dict[str, Any]) -> Optional[int]:
+    from . import renderer
+
+    try:
+        return renderer.estimate_rss(storyboard)
+    except Exception as e:
+        print(f"[Queue] Could not estimate memory for storyboard: {e}")
+        return None
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+    return _row_to_dict(row) if row else None
+
+
+def get_storyboard(job_id: str) -> Optional[Dict[str, Any]]:
+    """The storyboard a job was submitted with (None if the job is unknown)."""
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT storyboard FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+    return json.loads(row["storyboard"]) if row else None
+
+
+def queue_position(job_id: str) -> Optional[int]:
+    """Number of queued jobs that will be claimed before this one (None if not queued)."""
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT priority, created_at FROM jobs WHERE job_id = ? AND status = ?", (job_id, QUEUED)
+        ).fetchone()
+        if not row:
+            return None
+        ahead = conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = ? AND (priority > ? OR (priority = ? AND created_at < ?))",
+            (QUEUED, row["priority"], row["priority"], row["created_at"]),
+        ).fetchone()[0]
+    finally:
+        conn.close()
+    return ahead
+
+
+def cancel(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Cancels a job. Queued jobs are cancelled immediately; running jobs are
+    flagged and their render process is terminated by the owning worker.
+    """
+    conn = _connect()
+    try:
+        now = time.time()
+        cur = conn.execute(
+            "UPDATE jobs SET status = ?, updated_at = ? WHERE job_id = ? AND status = ?",
+            (CANCELLED, now, job_id, QUEUED),
+        )
+        if cur.rowcount:
+            job_registry.set_state(job_id, job_registry.CANCELLED, error="Cancelled by user")
+        conn.execute(
+            "UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE job_id = ? AND status = ?",
+            (now, job_id, RUNNING),
+        )
+    finally:
+        conn.close()
+    return get_job(job_id)
+
+
+def _running_rss(conn: sqlite3.Connection) -> Tuple[int, int]:
+    """(running jobs, sum of their rss estimates) across every worker process on this node."""
+    row = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(rss_estimate), 0) FROM jobs WHERE status = ?", (RUNNING,)
+    ).fetchone()
+    return row[0], row[1]
+
+
+def committed_rss() -> int:
+    """Estimated RSS reserved by the renders currently running (all workers)."""
+    conn = _connect()
+    try:
+        return _running_rss(conn)[1]
+    finally:
+        conn.close()
+
+
+def claim_next(worker_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Atomically moves the highest-priority queued job to running and returns it.
+    Admission control: a job whose memory estimate exceeds the node's headroom
+    (budget minus the estimates of all running jobs, read in the same
+    transaction) stays queued, and so does everything behind it, so big renders
+    aren't starved by a stream of small ones. With nothing running the job is
+    always admitted, so one estimated above the whole budget still runs (alone).
+    """
+    global _waiting_job
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE status = ? ORDER BY priority DESC, created_at LIMIT 1", (QUEUED,)
+        ).fetchone()
+        if not row:
+            conn.execute("COMMIT")
+            return None
+        running, committed = _running_rss(conn)
+        max_rss = resources.headroom(committed) if running else None
+        if max_rss is not None and (row["rss_estimate"] or 0) > max_rss:
+            conn.execute("COMMIT")
+            if _waiting_job != row["job_id"]:
+                _waiting_job = row["job_id"]
+                print(
+                    f"[Queue] Job {row['job_id']} waiting for memory: needs ~{row['rss_estimate'] // resources.MB} MB, "
+                    f"{max_rss // resources.MB} MB free"
+                )
+            return None
+        now = time.time()
+        conn.execute(
+            "UPDATE jobs SET status = ?, attempts = attempts + 1, worker = ?, updated_at = ? WHERE job_id = ?",
+            (RUNNING, worker_id, now, row["job_id"]),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    # The job as claimed (the row was read before the update)
+    job = dict(row, status=RUNNING, attempts=row["attempts"] + 1, worker=worker_id, updated_at=now)
+    job["storyboard"] = json.loads(job["storyboard"])
+    return job
+
+
+def heartbeat(job_id: str) -> bool:
+    """Refreshes a running job's timestamp. Returns True if cancellation was requested."""
+    conn = _connect()
+    try:
+        conn.execute("UPDATE jobs SET updated_at = ? WHERE job_id = ?", (time.time(), job_id))
+        row = conn.execute("SELECT cancel_requested FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+    return bool(row and row["cancel_requested"])
+
+
+def _finish(job_id: str, status: str, error: Optional[str] = None):
+    conn = _connect()
+    try:
+        conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ?",
+            (status, error, time.time(), job_id),
+        )
+    finally:
+        conn.close()
+
+
+def mark_completed(job_id: str):
+    _finish(job_id, COMPLETED)
+
+
+def mark_cancelled(job_id: str):
+    _finish(job_id, CANCELLED, "Cancelled by user")
+    job_registry.set_state(job_id, job_registry.CANCELLED, error="Cancelled by user")
+
+
+def mark_failed(job_id: str, error: str):
+    """
+    Requeues the job if it has attempts left, otherwise marks it failed.
+    The registry only sees FAILED (terminal: clients stop watching) once no attempts remain.
+    """
+    # Prefer the renderer's own error over the process exit code
+    state = job_registry.get(job_id)
+    error = (state and state["error"]) or error
+    job = get_job(job_id)
+    if job and job["attempts"] < job["max_attempts"]:
+        print(f"[Queue] Job {job_id} failed (attempt {job['attempts']}), retrying: {error}")
+        _finish(job_id, QUEUED, error)
+        job_registry.set_state(job_id, job_registry.QUEUED, error=error)
+    else:
+        print(f"[Queue] Job {job_id} failed permanently: {error}")
+        _finish(job_id, FAILED, error)
+        job_registry.set_state(job_id, job_registry.FAILED, error=error)
+
+
+def requeue_stale(timeout: float = JOB_STALE_SECONDS) -> List[str]:
+    """
+    Returns running jobs whose worker died (no heartbeat) to the queue, or fails
+    them once they've used all their attempts (e.g. a render that keeps getting
+    OOM-killed must not take a worker slot forever).
+    """
+    conn = _connect()
+    requeued, failed = [], []
+    try:
+        cutoff = time.time() - timeout
+        rows = conn.execute(
+            "SELECT job_id, attempts, max_attempts FROM jobs WHERE status = ? AND updated_at < ?", (RUNNING, cutoff)
+        ).fetchall()
+        for row in rows:
+            retry = row["attempts"] < row["max_attempts"]
+            cur = conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ? AND status = ?",
+                (QUEUED if retry else FAILED, "Worker lost", time.time(), row["job_id"], RUNNING),
+            )
+            if cur.rowcount:
+                (requeued if retry else failed).append(row["job_id"])
+    finally:
+        conn.close()
+    for job_id in requeued:
+        job_registry.set_state(job_id, job_registry.QUEUED, error="Worker lost")
+        print(f"[Queue] Requeued stale job {job_id}")
+    for job_id in failed:
+        job_registry.set_state(job_id, job_registry.FAILED, error="Worker lost (no attempts left)")
+        print(f"[Queue] Stale job {job_id} failed permanently")
+    return requeued
+
+
+# ---------------------------------------------------------------------------
+# Worker
+# ---------------------------------------------------------------------------
+
+# Job last reported as waiting for memory (logged once, not on every poll)
+_waiting_job: Optional[str] = None
+
+
+def _render_entry(storyboard: Dict[str, Any], job_id: str):
+    """Runs in the render child process; exit code tells the worker how it went."""
+    from . import renderer
+
+    output_path = renderer.render_from_storyboard_sync(storyboard, job_id)
+    sys.exit(0 if output_path else 1)
+
+
+def _run_job(job: Dict[str, Any]):
+    """
+    Runs the render process, sampling its memory, ffmpeg processes and temp disk
+    into the job registry. However the render ends (done, failed, crashed,
+    cancelled), processes it left behind and its temp files are removed.
+    """
+    job_id = job["job_id"]
+    ctx = multiprocessing.get_context("spawn")
+    proc = ctx.Process(target=_render_entry, args=(job["storyboard"], job_id), name=f"render-{job_id}")
+    proc.start()
+
+    cancelled = False
+    processes: Dict[int, str] = {}
+    try:
+        while proc.is_alive():
+            proc.join(POLL_INTERVAL)
+            if not proc.is_alive():
+                break
+            usage = resources.sample(proc.pid, job_id)
+            processes = usage.pop("processes") or processes
+            job_registry.report_resources(job_id, **usage)
+            if heartbeat(job_id):
+                print(f"[Queue] Cancelling running job {job_id}")
+                proc.terminate()
+                proc.join()
+                cancelled = True
+    finally:
+        if proc.is_alive():
+            proc.kill()
+            proc.join()
+        resources.cleanup(job_id, processes)
+        # Nothing left running; peaks stay recorded (None = not measurable on this platform)
+        idle = 0 if processes else None
+        job_registry.report_resources(job_id, rss_bytes=idle, open_readers=idle, temp_disk_bytes=0)
+
+    if cancelled:
+        mark_cancelled(job_id)
+    elif proc.exitcode == 0:
+        mark_completed(job_id)
+    else:
+        mark_failed(job_id, f"Render process exited with code {proc.exitcode}")
+
+
+def run_worker(stop_event: threading.Event, worker_id: Optional[str] = None):
+    """
+    Claims and runs jobs until `stop_event` is set.
+    Each render runs in its own process so it can be cancelled and can't take the worker down.
+    """
+    worker_id = worker_id or f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    print(f"[Queue] Worker {worker_id} started")
+    while not stop_event.is_set():
+        try:
+            requeue_stale()
+            job = claim_next(worker_id)
+        except sqlite3.Error as e:
+            print(f"[Queue] Worker {worker_id} DB error: {e}")
+            job = None
+
+        if not job:
+            stop_event.wait(POLL_INTERVAL)
+            continue
+
+        print(f"[Queue] Worker {worker_id} running job {job['job_id']} (attempt {job['attempts'] + 1})")
+        try:
+            _run_job(job)
+        except Exception as e:
+            mark_failed(job["job_id"], str(e))
+    print(f"[Queue] Worker {worker_id} stopped")
+
+
+_worker_threads: List[threading.Thread] = []
+_stop_event = threading.Event()
+
+
+def start_workers(count: int = JOB_WORKERS):
+    """Starts `count` worker loops in background threads (each render is still its own process)."""
+    _stop_event.clear()
+    for i in range(count):
+        t = threading.Thread(target=run_worker, args=(_stop_event,), name=f"render-worker-{i}", daemon=True)
+        t.start()
+        _worker_threads.append(t)
+
+
+def stop_workers():
+    _stop_event.set()
+    for t in _worker_threads:
+        t.join(timeout=5)
+    _worker_threads.clear()
@@ -0,0 +1,231 @@
+import os
+import time
+import sqlite3
+import threading
+from typing import Dict, Any, Optional
+
+from . import storage
+from ..models.storyboard import QUALITY_PREVIEW, QUALITY_FINAL
+
+# Job state + progress, shared by the API, the queue workers and the render processes.
+# Lives in the same SQLite file as the queue; every process opens its own connections.
+
+REGISTRY_DB_PATH = os.getenv("JOB_REGISTRY_DB", os.path.join(storage.STATE_DIR, "jobs.db"))
+# Progress writes are throttled to this interval per job (the last update always lands)
+PROGRESS_MIN_INTERVAL = 0.5
+
+QUEUED = "queued"
+PLANNING = "planning"
+RENDERING = "rendering"
+ENCODING = "encoding"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+TERMINAL_STATES = (COMPLETED, FAILED, CANCELLED)
+
+# Render quality tiers (defined with the storyboard model)
+QUALITIES = (QUALITY_PREVIEW, QUALITY_FINAL)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS job_state (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    error TEXT,
+    output_url TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+"""
+# Columns added after the table first shipped: existing databases get them on connect
+_ADDED_COLUMNS = {
+    "quality": "TEXT",
+    # Resource accounting (see resources.py): estimate at submit, then current + peak while running
+    "rss_estimate_bytes": "INTEGER",
+    "rss_bytes": "INTEGER",
+    "rss_peak_bytes": "INTEGER",
+    "open_readers": "INTEGER",
+    "open_readers_peak": "INTEGER",
+    "temp_disk_bytes": "INTEGER",
+    "temp_disk_peak_bytes": "INTEGER",
+}
+RESOURCE_FIELDS = tuple(name for name in _ADDED_COLUMNS if name != "quality")
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+_last_progress_write: Dict[str, float] = {}
+
+
+def _connect() -> sqlite3.Connection:
+    global _schema_ready
+    conn = sqlite3.connect(REGISTRY_DB_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    if not _schema_ready:
+        with _schema_lock:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(job_state)")}
+            for name, decl in _ADDED_COLUMNS.items():
+                if name not in existing:
+                    try:
+                        conn.execute(f"ALTER TABLE job_state ADD COLUMN {name} {decl}")
+                    except sqlite3.OperationalError:
+                        pass  # Another process added it first
+            _schema_ready = True
+    return conn
+
+
+def create(job_id: str, status: str = QUEUED, quality: Optional[str] = None, rss_estimate: Optional[int] = None):
+    """Registers a job (no-op if it already exists, apart from recording `quality` / `rss_estimate`)."""
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT OR IGNORE INTO job_state (job_id, status, created_at, updated_at) VALUES (?, ?, ?, ?)",
+            (job_id, status, now, now),
+        )
+        if quality:
+            conn.execute("UPDATE job_state SET quality = ? WHERE job_id = ?", (quality, job_id))
+        if rss_estimate is not None:
+            conn.execute("UPDATE job_state SET rss_estimate_bytes = ? WHERE job_id = ?", (rss_estimate, job_id))
+    finally:
+        conn.close()
+
+
+def set_state(job_id: str, status: str, error: Optional[str] = None, output_url: Optional[str] = None):
+    """
+    Moves a job to `status`.
+    - started_at is stamped the first time it leaves the queue
+    - finished_at is stamped on completed/failed/cancelled
+    - progress resets when requeued and is 1.0 on completion
+    """
+    now = time.time()
+    create(job_id, status)
+    conn = _connect()
+    try:
+        conn.execute(
+            """
+            UPDATE job_state SET
+                status = ?,
+                updated_at = ?,
+                error = COALESCE(?, CASE WHEN ? IN (?, ?) THEN NULL ELSE error END),
+                output_url = COALESCE(?, output_url),
+                progress = CASE WHEN ? = ? THEN 1.0 WHEN ? = ? THEN 0.0 ELSE progress END,
+                started_at = CASE WHEN started_at IS NULL AND ? IN (?, ?) THEN ? ELSE started_at END,
+                finished_at = CASE WHEN ? IN (?, ?, ?) THEN ? ELSE NULL END
+            WHERE job_id = ?
+            """,
+            (
+                status, now,
+                error, status, RENDERING, COMPLETED,
+                output_url,
+                status, COMPLETED, status, QUEUED,
+                status, RENDERING, ENCODING, now,
+                status, COMPLETED, FAILED, CANCELLED, now,
+                job_id,
+            ),
+        )
+    finally:
+        conn.close()
+    _last_progress_write.pop(job_id, None)
+
+
+def record_error(job_id: str, error: str):
+    """Stores a job's latest error without changing its state (the queue decides retry vs. failed)."""
+    conn = _connect()
+    try:
+        conn.execute("UPDATE job_state SET error = ?, updated_at = ? WHERE job_id = ?", (error, time.time(), job_id))
+    finally:
+        conn.close()
+
+
+def report_progress(job_id: str, progress: float, status: Optional[str] = None):
+    """Records encode progress (0..1). Cheap to call per frame: writes are throttled."""
+    now = time.time()
+    progress = max(0.0, min(1.0, progress))
+    last = _last_progress_write.get(job_id, 0.0)
+    if status is None and progress < 1.0 and now - last < PROGRESS_MIN_INTERVAL:
+        return
+    _last_progress_write[job_id] = now
+
+    conn = _connect()
+    try:
+        conn.execute(
+            "UPDATE job_state SET progress = ?, status = COALESCE(?, status), updated_at = ? WHERE job_id = ?",
+            (progress, status, now, job_id),
+        )
+    finally:
+        conn.close()
+
+
+def get(job_id: str) -> Optional[Dict[str, Any]]:
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT * FROM job_state WHERE job_id = ?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+    return dict(row) if row else None
+
+
+def report_resources(job_id: str, rss_bytes: Optional[int], open_readers: Optional[int], temp_disk_bytes: Optional[int]):
+    """Records a usage sample (None = not measurable here); peaks only ever grow."""
+    conn = _connect()
+    try:
+        conn.execute(
+            """
+            UPDATE job_state SET
+                rss_bytes = ?,
+                rss_peak_bytes = MAX(COALESCE(rss_peak_bytes, 0), COALESCE(?, 0)),
+                open_readers = ?,
+                open_readers_peak = MAX(COALESCE(open_readers_peak, 0), COALESCE(?, 0)),
+                temp_disk_bytes = ?,
+                temp_disk_peak_bytes = MAX(COALESCE(temp_disk_peak_bytes, 0), COALESCE(?, 0))
+            WHERE job_id = ?
+            """,
+            (rss_bytes, rss_bytes, open_readers, open_readers, temp_disk_bytes, temp_disk_bytes, job_id),
+        )
+    finally:
+        conn.close()
+
+
+def resource_stats(limit: int = 100) -> Dict[str, Any]:
+    """
+    Job counts by status, current usage of running renders, and peak usage over
+    the last `limit` finished renders (max / mean, and how far peaks ran over
+    their estimates) for instance sizing.
+    """
+    conn = _connect()
+    try:
+        counts = {
+            row["status"]: row["n"]
+            for row in conn.execute("SELECT status, COUNT(*) AS n FROM job_state GROUP BY status")
+        }
+        running = conn.execute(
+            f"SELECT job_id, status, {', '.join(RESOURCE_FIELDS)} FROM job_state WHERE status IN (?, ?)",
+            (RENDERING, ENCODING),
+        ).fetchall()
+        rows = conn.execute(
+            "SELECT rss_estimate_bytes, rss_peak_bytes, open_readers_peak, temp_disk_peak_bytes FROM job_state "
+            "WHERE status IN (?, ?, ?) AND rss_peak_bytes > 0 ORDER BY finished_at DESC LIMIT ?",
+            (*TERMINAL_STATES, limit),
+        ).fetchall()
+    finally:
+        conn.close()
+
+    def peak_stats(name: str) -> Dict[str, Any]:
+        values = [row[name] for row in rows if row[name] is not None]
+        return {"max": max(values, default=None), "mean": sum(values) / len(values) if values else None}
+
+    ratios = [row["rss_peak_bytes"] / row["rss_estimate_bytes"] for row in rows if row["rss_estimate_bytes"]]
+    return {
+        "jobs": counts,
+        "running": [dict(row) for row in running],
+        "sampled_renders": len(rows),
+        "rss_peak_bytes": peak_stats("rss_peak_bytes"),
+        "open_readers_peak": peak_stats("open_readers_peak"),
+        "temp_disk_peak_bytes": peak_stats("temp_disk_peak_bytes"),
+        "rss_peak_over_estimate_max": max(ratios, default=None),
+    }
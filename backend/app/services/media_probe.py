@@ -0,0 +1,117 @@
+import os
+import json
+import bisect
+import hashlib
+import threading
+from typing import Dict, Any, Optional, List
+
+from . import storage
+from ..utils import ffmpeg_utils
+
+# Shared media-metadata cache: one lightweight ffprobe per file instead of opening
+# a VideoFileClip (reader process + first-frame decode) just to read .duration.
+# Results live in memory and on disk, so the API process and the render worker
+# processes all hit the same cache.
+
+PROBE_CACHE_DIR = os.path.join(storage.CACHE_DIR, "probe_cache")
+os.makedirs(PROBE_CACHE_DIR, exist_ok=True)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".heic", ".heif", ".avif")
+# Bump when probe() returns new fields, so older cache entries aren't read
+PROBE_FORMAT_VERSION = 2
+
+_memory: Dict[str, Dict[str, Any]] = {}
+_lock = threading.Lock()
+
+
+def _cache_key(path: str) -> str:
+    """Content hash for blobs; path + size + mtime for anything else (no full read)."""
+    if storage.is_blob_path(path):
+        return storage.content_hash(path)
+    st = os.stat(path)
+    raw = f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}"
+    return "p" + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _load(key: str) -> Optional[Dict[str, Any]]:
+    with _lock:
+        info = _memory.get(key)
+    if info is not None:
+        return info
+    cache_path = os.path.join(PROBE_CACHE_DIR, f"{key}.v{PROBE_FORMAT_VERSION}.json")
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        return None
+    with _lock:
+        _memory[key] = info
+    return info
+
+
+def _store(key: str, info: Dict[str, Any]):
+    with _lock:
+        _memory[key] = info
+    cache_path = os.path.join(PROBE_CACHE_DIR, f"{key}.v{PROBE_FORMAT_VERSION}.json")
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(info, f)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        print(f"[Probe] Could not persist cache entry {key}: {e}")
+
+
+def probe(path: str) -> Optional[Dict[str, Any]]:
+    """
+    Cached metadata for a media file:
+    duration, width/height (coded), display_width/display_height (after rotation),
+    fps, rotation, video_codec, audio_codec, profile, level, has_b_frames,
+    field_order, has_audio, pix_fmt, is_image.
+    Returns None if the file is missing or unreadable.
+    """
+    if not path or not os.path.exists(path):
+        return None
+    key = _cache_key(path)
+    info = _load(key)
+    if info is not None:
+        return dict(info)
+
+    info = ffmpeg_utils.probe_streams(path)
+    if not info:
+        return None
+
+    rotated = info["rotation"] in (90, 270)
+    info["display_width"] = info["height"] if rotated else info["width"]
+    info["display_height"] = info["width"] if rotated else info["height"]
+    info["is_image"] = path.lower().endswith(IMAGE_EXTENSIONS)
+    _store(key, info)
+    return dict(info)
+
+
+def duration(path: str) -> Optional[float]:
+    info = probe(path)
+    return info["duration"] if info else None
+
+
+def keyframes(path: str) -> List[float]:
+    """Keyframe index (seconds), built on first use and cached with the probe."""
+    info = probe(path)
+    if not info or info["is_image"]:
+        return []
+    if "keyframes" not in info:
+        key = _cache_key(path)
+        info["keyframes"] = ffmpeg_utils.list_keyframes(path)
+        _store(key, info)
+    return info["keyframes"]
+
+
+def keyframe_near(path: str, t: float, tolerance: float) -> Optional[float]:
+    """Closest keyframe to `t` within +/- tolerance, or None."""
+    index = keyframes(path)
+    if not index:
+        return None
+    i = bisect.bisect_left(index, t)
+    candidates = [index[j] for j in (i - 1, i) if 0 <= j < len(index)]
+    best = min(candidates, key=lambda k: abs(k - t))
+    return best if abs(best - t) <= tolerance else None
@@ -0,0 +1,95 @@
+import os
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Zoom / pan ("Ken Burns") effects.
+# - MoviePy path: one cv2.warpAffine per frame into a reused output buffer
+#   (scale + translate in a single resampling pass, no intermediate resized frame)
+# - ffmpeg paths (filtergraph backend, still segments): the same motion as a zoompan filter
+# Both follow the same curves, so a scene looks the same whichever path renders it.
+# Given a geometry plan, the warp also does the source -> output mapping, so a moving
+# scene is still resampled exactly once.
+
+MOTION_EFFECTS = ("slow_zoom_in", "slow_zoom_out", "ken_burns")
+# Extra zoom at the end of the move (0.12 = 112%)
+MOTION_ZOOM = float(os.getenv("MOTION_ZOOM", "0.12"))
+
+
+def effect_for(scene) -> Optional[str]:
+    """Motion effect for a Scene; hook and punch scenes zoom in unless told otherwise."""
+    effect = scene.effect
+    if effect in MOTION_EFFECTS:
+        return effect
+    if effect in (None, "") and scene.role in ("hook", "punch"):
+        return "slow_zoom_in"
+    return None
+
+
+def _curve(effect: str, progress: float, amount: float) -> Tuple[float, float]:
+    """(scale, horizontal pan position 0..1) at `progress` through the scene."""
+    if effect == "slow_zoom_out":
+        return 1.0 + amount * (1.0 - progress), 0.5
+    if effect == "ken_burns":
+        # Drift left to right while easing in from half the zoom
+        return 1.0 + amount * (0.5 + 0.5 * progress), progress
+    return 1.0 + amount * progress, 0.5
+
+
+def _warp_matrix(scale: float, pan: float, w: int, h: int) -> np.ndarray:
+    """Maps the visible source window (w/scale x h/scale, panned) onto the full frame."""
+    x0 = (w - w / scale) * pan
+    y0 = (h - h / scale) / 2
+    return np.array([[scale, 0.0, -x0 * scale], [0.0, scale, -y0 * scale]], dtype=np.float32)
+
+
+def _compose(outer: np.ndarray, inner: np.ndarray) -> np.ndarray:
+    """2x3 affine: apply `inner`, then `outer`."""
+    linear = outer[:, :2] @ inner[:, :2]
+    offset = outer[:, :2] @ inner[:, 2] + outer[:, 2]
+    return np.hstack([linear, offset[:, None]]).astype(np.float32)
+
+
+def apply_motion(clip, effect: str, geometry=None, amount: float = MOTION_ZOOM):
+    """
+    Returns `clip` with the zoom/pan applied per frame. With a geometry.Geometry,
+    the output is that plan's size and the mapping is folded into the same warp.
+    """
+    if geometry is not None:
+        w, h = geometry.out_w, geometry.out_h
+        base = geometry.matrix()
+        # Padding stays black; cover plans never sample outside the source
+        border = cv2.BORDER_CONSTANT if geometry.is_padded else cv2.BORDER_REPLICATE
+    else:
+        w, h = clip.w, clip.h
+        base = np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]], dtype=np.float32)
+        border = cv2.BORDER_REPLICATE
+    duration = clip.duration or 1.0
+    out = np.empty((h, w, 3), dtype=np.uint8)
+
+    def warp(get_frame, t):
+        frame = get_frame(t)
+        scale, pan = _curve(effect, min(1.0, max(0.0, t / duration)), amount)
+        matrix = _compose(_warp_matrix(scale, pan, w, h), base)
+        # Frames are consumed before the next one is requested, so one buffer suffices
+        cv2.warpAffine(frame, matrix, (w, h), dst=out, flags=cv2.INTER_LINEAR, borderMode=border)
+        return out
+
+    return clip.fl(warp, apply_to=[])
+
+
+def zoompan_filter(effect: str, duration: float, fps: float, w: int, h: int, amount: float = MOTION_ZOOM) -> str:
+    """The same motion as an ffmpeg zoompan filter (input must already be w x h at `fps`)."""
+    frames = max(1, round(duration * fps))
+    progress = f"min(on/{frames},1)"
+    if effect == "slow_zoom_out":
+        zoom, pan = f"1+{amount}*(1-{progress})", "0.5"
+    elif effect == "ken_burns":
+        zoom, pan = f"1+{amount}*(0.5+0.5*{progress})", progress
+    else:
+        zoom, pan = f"1+{amount}*{progress}", "0.5"
+    return (
+        f"zoompan=z='{zoom}':x='(iw-iw/zoom)*{pan}':y='(ih-ih/zoom)/2'"
+        f":d=1:s={w}x{h}:fps={fps}"
+    )
@@ -0,0 +1,199 @@
+import os
+import time
+import uuid
+import hashlib
+import threading
+import asyncio
+import subprocess
+import concurrent.futures
+from typing import Dict, List, Optional
+
+from . import storage
+
+# Low-res proxies: what we upload to Gemini instead of the original, and what
+# preview renders decode.
+# - Keyed by source content hash + encode parameters, so a different file with the
+#   same name never gets a stale proxy and a settings change re-encodes
+# - Stored in their own directory with a size cap and LRU eviction; proxies used
+#   recently enough that a render may still be reading them are never evicted
+# - Generated in the background as soon as an upload lands; concurrent requests
+#   for the same source wait on the one in-flight encode
+# - Encodes only ever occupy this module's own executor; async callers await them
+#   (get_proxy_async) instead of parking a thread of another pool on the result
+
+PROXY_DIR = os.path.join(storage.CACHE_DIR, "proxy_cache")
+os.makedirs(PROXY_DIR, exist_ok=True)
+
+# Short edge of a proxy (sources smaller than this aren't upscaled). At least the
+# preview frame's long edge (640 for 360p previews), so a preview crops any
+# aspect ratio out of a proxy without upscaling; the bitrate caps the file size
+PROXY_SHORT_EDGE = int(os.getenv("PROXY_SHORT_EDGE", "640"))
+PROXY_BITRATE = os.getenv("PROXY_BITRATE", "700k")
+PROXY_PRESET = os.getenv("PROXY_PRESET", "ultrafast")
+PROXY_CACHE_MAX_BYTES = int(os.getenv("PROXY_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+PROXY_WORKERS = int(os.getenv("PROXY_WORKERS", "2"))
+# A proxy used within this long may still be read by a render (the longest a
+# render is expected to take): eviction leaves it alone
+PROXY_IN_USE_SECONDS = float(os.getenv("PROXY_IN_USE_SECONDS", "3600"))
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv")
+
+_executor = concurrent.futures.ThreadPoolExecutor(max_workers=PROXY_WORKERS, thread_name_prefix="proxy")
+_inflight: Dict[str, concurrent.futures.Future] = {}
+_lock = threading.Lock()
+
+
+def _params_tag() -> str:
+    params = f"s={PROXY_SHORT_EDGE};b={PROXY_BITRATE};p={PROXY_PRESET}"
+    return hashlib.sha1(params.encode("utf-8")).hexdigest()[:12]
+
+
+def proxy_path_for(input_path: str) -> str:
+    return os.path.join(PROXY_DIR, f"{storage.content_hash(input_path)}_{_params_tag()}.mp4")
+
+
+def _encode(input_path: str, output_path: str) -> str:
+    """Runs the proxy encode into a temp file and renames it into place."""
+    import imageio_ffmpeg
+    ffmpeg_exe = imageio_ffmpeg.get_ffmpeg_exe()
+
+    temp_path = f"{output_path}.{uuid.uuid4().hex}.tmp.mp4"
+    cmd = [
+        ffmpeg_exe, "-y",
+        "-i", input_path,
+        # Short edge to PROXY_SHORT_EDGE (or kept if smaller), aspect ratio kept
+        "-vf", f"scale='if(gt(iw,ih),-2,min({PROXY_SHORT_EDGE},iw))':'if(gt(iw,ih),min({PROXY_SHORT_EDGE},ih),-2)',setsar=1",
+        "-b:v", PROXY_BITRATE, # Low bitrate
+        "-preset", PROXY_PRESET,
+        "-c:a", "copy", # Copy audio (fast)
+        temp_path
+    ]
+    try:
+        # Suppress output unless error
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    print(f"[Proxy] Encoded {os.path.basename(input_path)} -> {os.path.basename(output_path)}")
+    _evict()
+    return output_path
+
+
+def _evict():
+    """
+    Drops least-recently-used proxies until the directory fits PROXY_CACHE_MAX_BYTES,
+    skipping any used within PROXY_IN_USE_SECONDS (a render may be reading it).
+    """
+    in_use_after = time.time() - PROXY_IN_USE_SECONDS
+    entries = []
+    total = 0
+    for name in os.listdir(PROXY_DIR):
+        if name.endswith(".tmp.mp4"):
+            continue
+        path = os.path.join(PROXY_DIR, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+        total += st.st_size
+
+    entries.sort()
+    for mtime, size, path in entries:
+        if total <= PROXY_CACHE_MAX_BYTES:
+            break
+        if mtime > in_use_after:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+            print(f"[Proxy] Evicted {os.path.basename(path)}")
+        except OSError:
+            pass
+
+
+def _submit(input_path: str) -> concurrent.futures.Future:
+    """Returns the encode future for `input_path`, reusing a hit or an in-flight encode."""
+    output_path = proxy_path_for(input_path)
+    with _lock:
+        future = _inflight.get(output_path)
+        if future is not None:
+            return future
+
+        if os.path.exists(output_path):
+            # Mark as recently used for LRU
+            os.utime(output_path)
+            future = concurrent.futures.Future()
+            future.set_result(output_path)
+            return future
+
+        future = _executor.submit(_encode, input_path, output_path)
+        _inflight[output_path] = future
+
+    def _done(_):
+        with _lock:
+            _inflight.pop(output_path, None)
+    future.add_done_callback(_done)
+    return future
+
+
+def cache_key(input_path: str) -> str:
+    """Identity of what gets uploaded for `input_path`: the proxy for videos, the file itself otherwise."""
+    if is_video(input_path):
+        return os.path.splitext(os.path.basename(proxy_path_for(input_path)))[0]
+    return storage.content_hash(input_path)
+
+
+def is_video(path: str) -> bool:
+    return path.lower().endswith(VIDEO_EXTENSIONS)
+
+
+def prefetch(paths: List[str]):
+    """Starts proxy encodes in the background (call right after an upload lands)."""
+    for path in paths:
+        if is_video(path) and os.path.exists(path):
+            _submit(path)
+
+
+def ready_proxy(input_path: str) -> Optional[str]:
+    """
+    The proxy for a video if it's already encoded (marked as used), else None.
+    Never encodes or waits: for render processes, which exit when the render does.
+    """
+    if not is_video(input_path):
+        return None
+    output_path = proxy_path_for(input_path)
+    try:
+        os.utime(output_path)
+    except OSError:
+        return None
+    return output_path
+
+
+def get_proxy(input_path: str) -> str:
+    """
+    Returns the analysis proxy for a video, encoding it (or waiting on the
+    in-flight encode) if needed. Images and failures fall back to the original.
+    """
+    if not is_video(input_path):
+        return input_path # Skip images
+    try:
+        return _submit(input_path).result()
+    except Exception as e:
+        print(f"[Proxy] Failed to build proxy for {input_path}, using original. Error: {e}")
+        return input_path
+
+
+async def get_proxy_async(input_path: str) -> str:
+    """get_proxy for the event loop: awaits the encode without holding a thread."""
+    if not is_video(input_path):
+        return input_path
+    try:
+        # Hashing the source is blocking file I/O; the encode runs on the proxy executor
+        future = await asyncio.to_thread(_submit, input_path)
+        return await asyncio.wrap_future(future)
+    except Exception as e:
+        print(f"[Proxy] Failed to build proxy for {input_path}, using original. Error: {e}")
+        return input_path
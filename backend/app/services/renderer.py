@@ -1,26 +1,36 @@
 import os
 import uuid
+import shutil
 import asyncio
-from typing import Dict, Any, List
+import tempfile
+import functools
+import dataclasses
+import multiprocessing
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple, Union
 # from moviepy.config import change_settings
 
 # Configure ImageMagick manually for Windows
 # change_settings({"IMAGEMAGICK_BINARY": r"C:\Program Files\ImageMagick-7.1.2-Q16-HDRI\magick.exe"})
 
 from moviepy.editor import (
-    VideoFileClip,
     ImageClip,
     ColorClip,
     concatenate_videoclips,
-    CompositeVideoClip,
-    TextClip,
     AudioFileClip,
     CompositeAudioClip,
 )
+from moviepy.audio.AudioClip import AudioArrayClip
 import moviepy.audio.fx.all as afx
+import numpy as np
+from PIL import Image, ImageOps
+from proglog import ProgressBarLogger
 
-from . import storage
-from ..models.job import JobResponse
+from . import storage, proxy_cache, segment_cache, source_pool, resources, broll_service, filtergraph, job_queue, job_registry, media_probe, generated_assets, captions, motion, geometry
+from ..models.job import JobResponse, JobResources
+from ..models.storyboard import Scene, Storyboard
+from ..utils import ffmpeg_utils
 
 try:
     from gTTS import gTTS
@@ -29,61 +39,271 @@ except ImportError:
     HAS_GTTS = False
     print("Warning: gTTS not found. AI Voiceovers will be disabled.")
 
+try:
+    # HEIC stills (iPhone photos); AVIF is read by Pillow itself
+    from pillow_heif import register_heif_opener
+    register_heif_opener()
+except ImportError:
+    pass
+
 OUTPUT_DIR = storage.OUTPUT_DIR
 
-def _build_clip_from_scene(scene: Dict[str, Any]):
+# Default output frame (9:16 vertical at RENDER_RESOLUTION); storyboards may pick
+# another aspect_ratio / resolution preset
+TARGET_W, TARGET_H = geometry.output_size()
+
+# "moviepy" (Python frame loop) or "ffmpeg" (whole reel as one native filter_complex)
+RENDER_BACKEND = os.getenv("RENDER_BACKEND", "moviepy").lower()
+
+# Stream-copy fast path: scenes that need no pixel changes are cut at keyframes
+# and joined with the concat demuxer instead of being decoded by MoviePy.
+STREAM_COPY_ENABLED = os.getenv("RENDER_STREAM_COPY", "true").lower() == "true"
+# How far (seconds) a copied cut may move to land on a keyframe. A copied scene
+# starts at that keyframe, so its start shifts by up to this much; scenes with no
+# keyframe this close are composited at their exact start instead
+KEYFRAME_TOLERANCE = float(os.getenv("RENDER_KEYFRAME_TOLERANCE", "0.1"))
+
+# Parallel mode: each scene is rendered to its own segment in a process pool,
+# then the segments are joined losslessly. 1 = serial, 0 = one worker per core.
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "1")) or (os.cpu_count() or 1)
+# Intermediate segment encoding (must match what stream-copied scenes carry)
+SEGMENT_CODEC = os.getenv("RENDER_SEGMENT_CODEC", "libx264")
+SEGMENT_PRESET = os.getenv("RENDER_SEGMENT_PRESET", "ultrafast")
+RENDER_FPS = 24
+
+# Encoder -> codec name ffprobe reports, so copied scenes match composited ones
+_CODEC_NAMES = {"libx264": "h264", "libx265": "hevc"}
+COPYABLE_CODECS = (_CODEC_NAMES.get(SEGMENT_CODEC, SEGMENT_CODEC),)
+# ffprobe H.264 profile -> (x264 profile, x264 options that make it signal that
+# profile; x264 writes the lowest profile its enabled tools need)
+_X264_PROFILES = {
+    "Constrained Baseline": ("baseline", "cabac=0:8x8dct=0"),
+    "Baseline": ("baseline", "cabac=0:8x8dct=0"),
+    "Main": ("main", "cabac=1:8x8dct=0"),
+    "High": ("high", "cabac=1:8x8dct=1"),
+}
+
+
+class StreamSignature(NamedTuple):
+    """
+    Stream parameters that must be identical for segments to be joined with
+    `-c copy`: the output MP4 carries one set of decoder parameters (avcC), so
+    profile, level and B-frame reordering have to agree, not just codec and size.
+    """
+    codec: str
+    width: int
+    height: int
+    fps: float
+    pix_fmt: str
+    profile: str
+    level: int
+    has_b_frames: int
+
+
+# Preview tier (storyboard "quality": "preview"): rendered from the analysis
+# proxies at low resolution / frame rate, for fast iteration; finalize re-renders
+# the approved storyboard at full quality
+PREVIEW_RESOLUTION = os.getenv("PREVIEW_RESOLUTION", "360p")
+PREVIEW_FPS = int(os.getenv("PREVIEW_FPS", "12"))
+PREVIEW_CRF = int(os.getenv("PREVIEW_CRF", "32"))
+
+# How long a render waits for an AI B-roll clip that is still being generated
+# before falling back to the placeholder card
+BROLL_WAIT_SECONDS = float(os.getenv("RENDER_BROLL_WAIT", "300"))
+
+_segment_pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+
+
+@dataclasses.dataclass(frozen=True)
+class OutputSettings:
+    """What a render produces (picklable, so segment workers get it whole)."""
+    width: int
+    height: int
+    fps: float
+    preset: str
+    crf: Optional[int] = None
+    quality: str = job_registry.QUALITY_FINAL
+    voiceover: bool = False
+    # Set when composited segments are joined with stream-copied ones: encode
+    # them with the copied streams' parameters
+    match: Optional[StreamSignature] = None
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.width, self.height
+
+    def encoder_params(self) -> List[str]:
+        params = ["-crf", str(self.crf)] if self.crf is not None else []
+        if self.match:
+            profile, options = _X264_PROFILES[self.match.profile]
+            if self.match.has_b_frames:
+                # ffprobe's reorder depth: 1 = B-frames, 2 = B-frames with pyramid
+                options += f":bframes=3:b-pyramid={'normal' if self.match.has_b_frames > 1 else 'none'}"
+            else:
+                options += ":bframes=0"
+            params += [
+                "-profile:v", profile,
+                "-level:v", f"{self.match.level / 10:.1f}",
+                "-x264-params", options,
+            ]
+        return params
+
+
+def output_settings(storyboard: Storyboard) -> OutputSettings:
+    """Frame size (aspect_ratio / resolution preset), frame rate and encoder settings for a storyboard."""
+    if storyboard.quality == job_registry.QUALITY_PREVIEW:
+        w, h = geometry.output_size(storyboard.aspect_ratio, PREVIEW_RESOLUTION)
+        return OutputSettings(
+            w, h, PREVIEW_FPS, "ultrafast", PREVIEW_CRF, job_registry.QUALITY_PREVIEW, storyboard.use_voiceover
+        )
+    w, h = geometry.output_size(storyboard.aspect_ratio, storyboard.resolution)
+    return OutputSettings(w, h, RENDER_FPS, SEGMENT_PRESET, voiceover=storyboard.use_voiceover)
+
+
+def estimate_rss(storyboard: Union[Storyboard, Dict[str, Any]]) -> int:
+    """Peak memory estimate for rendering `storyboard` (admission control; probes are cached)."""
+    if not isinstance(storyboard, Storyboard):
+        storyboard = Storyboard.model_validate(storyboard)
+    videos, images = {}, {}
+    for scene in storyboard.scenes:
+        info = media_probe.probe(scene.file_path) if scene.input_type != "ai_broll" else None
+        if info:
+            size = (info["display_width"], info["display_height"])
+            (images if info["is_image"] else videos)[scene.file_path] = size
+    # Pending B-roll clips are small generated videos at most the output size
+    settings = output_settings(storyboard)
+    pending = sum(1 for scene in storyboard.scenes if scene.input_type == "ai_broll")
+    sizes = list(videos.values()) + [settings.size] * pending
+    return resources.estimate_rss(sizes, list(images.values()), settings.size, RENDER_WORKERS)
+
+
+def _preview_source(scene: Scene, settings: OutputSettings) -> Scene:
     """
-    Helper to build a single MoviePy clip from a scene dict.
+    Video scenes read the low-res proxy when it's already encoded (same timeline,
+    far cheaper to decode); otherwise the original (the API started the proxy
+    encode when the preview was queued). Proxies smaller than the frame aren't used.
+    """
+    if scene.input_type != "user_clip" or not scene.file_path or not proxy_cache.is_video(scene.file_path):
+        return scene
+    if proxy_cache.PROXY_SHORT_EDGE < max(settings.size):
+        return scene
+    proxy = proxy_cache.ready_proxy(scene.file_path)
+    return scene.model_copy(update={"file_path": proxy}) if proxy else scene
+
+
+def _awaits_generated_asset(scene: Scene) -> bool:
+    """True for ai_broll scenes whose generated clip isn't ready yet."""
+    key = scene.asset_key
+    return scene.input_type == "ai_broll" and bool(key) and not generated_assets.ready_path(key)
+
+
+def _resolve_generated_asset(scene: Scene) -> Scene:
+    """
+    ai_broll scenes with a generated clip render as that clip (waiting up to
+    BROLL_WAIT_SECONDS if it's still generating), or as the stock library clip
+    picked at planning; otherwise as the placeholder card. Any other file_path
+    (e.g. the user's own footage) is never used for B-roll.
+    """
+    if scene.input_type != "ai_broll":
+        return scene
+    key = scene.asset_key
+    path = generated_assets.wait_ready(key, BROLL_WAIT_SECONDS) if key else None
+    if not path and broll_service.is_library_path(scene.file_path):
+        path = scene.file_path
+    if not path:
+        if key:
+            print(f"[Renderer] B-roll {key[:12]} not available, using placeholder")
+        return scene
+    # The first `duration` seconds of the generated clip (trimmed to its length when built)
+    return scene.model_copy(update={"input_type": "user_clip", "file_path": path, "start": 0.0, "end": scene.duration})
+
+
+@functools.lru_cache(maxsize=8)
+def _cached_still(path: str, mtime_ns: int, target_w: int, target_h: int, fit: str) -> np.ndarray:
+    with Image.open(path) as img:
+        # JPEG: let the decoder downscale (DCT scaling) while staying >= the output size
+        img.draft("RGB", (max(target_w, target_h),) * 2)
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        g = geometry.plan(img.width, img.height, target_w, target_h, fit)
+        # Crop box and resize in one resampling pass
+        box = (g.crop_x, g.crop_y, g.crop_x + g.crop_w, g.crop_y + g.crop_h)
+        img = img.resize((g.scaled_w, g.scaled_h), Image.LANCZOS, box=box)
+        if g.is_padded:
+            canvas = Image.new("RGB", (target_w, target_h))
+            canvas.paste(img, (g.pad_x, g.pad_y))
+            img = canvas
+        frame = np.array(img)
+    # Shared between clips: anything drawing on it must copy first
+    frame.flags.writeable = False
+    return frame
+
+
+def _still_frame(path: str, target_w: int = TARGET_W, target_h: int = TARGET_H, fit: str = geometry.FIT_COVER) -> np.ndarray:
+    """
+    Decodes and maps a still image onto the output frame once (cover-crop or
+    contain-pad), into a frame buffer reused for every frame of the scene.
+    """
+    return _cached_still(path, os.stat(path).st_mtime_ns, target_w, target_h, fit)
+
+
+def _is_plain_still(scene: Scene, voiceover: bool) -> bool:
+    """Still image that ffmpeg can encode from one prepared frame (motion and caption included)."""
+    if scene.input_type != "user_image":
+        return False
+    # Voiceover audio is mixed in by the MoviePy path
+    return not (voiceover and scene.caption and HAS_GTTS)
+
+
+def _build_clip_from_scene(
+    scene: Scene,
+    sources: source_pool.SourcePool,
+    out_size: Tuple[int, int] = (TARGET_W, TARGET_H),
+    use_voiceover: bool = False,
+    work_dir: str = OUTPUT_DIR,
+):
+    """
+    Helper to build a single MoviePy clip from a scene, at `out_size`.
+    Clips are cut from `sources`, which owns every reader the clip uses (don't close the clip itself).
+    Voiceover audio is written to `work_dir`.
     Runs synchronously (CPU bound).
     """
-    input_type = scene.get("input_type")
-    file_path = scene.get("file_path")
-    effect = scene.get("effect", "")
-    caption = scene.get("caption", "")
-    role = scene.get("role", "")
-    start = float(scene.get("start", 0.0))
-    end = float(scene.get("end", 0.0))
-    duration = float(scene.get("duration", 3.0))
-    use_voiceover = scene.get("use_voiceover", False)
+    input_type = scene.input_type
+    file_path = scene.file_path
+    caption = scene.caption
+    start, end, duration = scene.start, scene.end, scene.duration
     
-    # Default to 9:16 vertical
-    target_w, target_h = 1080, 1920 
+    target_w, target_h = out_size
+    fit = scene.fit
 
     # 1) Base Clip Creation
     base_clip = None
     
     if input_type == "ai_broll":
-        keyword = scene.get("b_roll_keyword", "B-Roll")
-        base_clip = ColorClip(size=(target_w, target_h), color=(30, 30, 30), duration=duration)
+        keyword = scene.b_roll_keyword or "B-Roll"
+        # One static frame (cached label sprite on a solid card)
         try:
-            # Simple text overlay for B-Roll placeholder
-            # Note: TextClip requires ImageMagick. If missing, this might fail.
-            txt = TextClip(f"B-ROLL\n{keyword}", fontsize=70, color='yellow', font='Arial-Bold', method='caption', size=(target_w - 100, None))
-            txt = txt.set_pos('center').set_duration(duration)
-            base_clip = CompositeVideoClip([base_clip, txt])
+            card = captions.placeholder_frame(f"B-ROLL\n{keyword}", target_w, target_h)
+            base_clip = ImageClip(card).set_duration(duration)
         except Exception as e:
-            print(f"B-Roll Text failed (likely missing ImageMagick): {e}")
-            # Continue with just the color clip
+            print(f"B-Roll label failed: {e}")
+            base_clip = ColorClip(size=(target_w, target_h), color=(30, 30, 30), duration=duration)
 
     elif input_type == "user_clip":
          try:
-            if not os.path.exists(file_path):
+            if not file_path or not os.path.exists(file_path):
                 print(f"Error: Clip not found {file_path}")
                 return None
             
-            base_clip = VideoFileClip(file_path)
-            # Trim
-            if end > start:
-                base_clip = base_clip.subclip(start, end)
-            else:
-                base_clip = base_clip.subclip(0, min(base_clip.duration, duration))
+            # Trim (start < end holds for validated clip scenes) on the file's shared reader
+            base_clip = sources.subclip(file_path, start, end)
          except Exception as e:
             print(f"Error loading clip {file_path}: {e}")
             return None
     
     elif input_type == "user_image":
         try:
-            base_clip = ImageClip(file_path).set_duration(duration)
+            # Already mapped onto the target frame, so step 2 is a no-op
+            base_clip = ImageClip(_still_frame(file_path, target_w, target_h, fit)).set_duration(duration)
         except Exception as e:
             print(f"Error loading image {file_path}: {e}")
             return None
@@ -91,61 +311,28 @@ def _build_clip_from_scene(scene: Dict[str, Any]):
     if not base_clip:
         return None
 
-    # 2) Resize & Crop (Vertical 9:16)
-    # Logic: Resize so height matches target_h, then center crop width.
-    ratio = target_h / base_clip.h
-    base_clip = base_clip.resize(height=target_h)
-    
-    if base_clip.w < target_w:
-        # If still too narrow, resize by width
-        base_clip = base_clip.resize(width=target_w)
-    
-    # Center Crop
-    if base_clip.w > target_w:
-        x_center = base_clip.w / 2
-        base_clip = base_clip.crop(x1=x_center - target_w/2, width=target_w)
-    elif base_clip.h > target_h:
-        y_center = base_clip.h / 2
-        base_clip = base_clip.crop(y1=y_center - target_h/2, height=target_h)
-
-
-    # 3) Effects
-    if effect == "slow_zoom_in" or role in ("hook", "punch"):
-        # Very simple zoom (resize) would require applying to every frame, slow in MoviePy.
-        # Skipping for MVP performance unless specifically requested.
-        pass
+    # 2) + 3) Map onto the output frame (cover-crop or contain-pad) and apply
+    # zoom/pan: one resampling pass per frame either way
+    plan = geometry.plan(base_clip.w, base_clip.h, target_w, target_h, fit)
+    motion_effect = motion.effect_for(scene)
+    if motion_effect:
+        base_clip = motion.apply_motion(base_clip, motion_effect, plan)
+    else:
+        base_clip = geometry.apply_to_clip(base_clip, plan)
 
     # 4) Caption Overlay
     clip_with_caption = base_clip
     if caption:
         try:
-            # Check if we can create a simple TextClip to verify ImageMagick
-            # If this fails, we skip the caption
-            txt = TextClip(
-                caption,
-                fontsize=60,
-                color="white",
-                font="Arial", 
-                method="caption",
-                size=(int(target_w * 0.8), None),
-            )
-            txt = txt.set_duration(base_clip.duration)
-            txt = txt.set_position(("center", target_h - 280))
-            
-            # Simple Box
-            txt_bg = txt.on_color(
-                size=(txt.w + 40, txt.h + 20),
-                color=(0, 0, 0),
-                col_opacity=0.6,
-            )
-            clip_with_caption = CompositeVideoClip([base_clip, txt_bg])
+            # Cached sprite blended into its own rectangle of each frame
+            clip_with_caption = captions.overlay_caption(base_clip, caption, target_w, target_h)
         except Exception as e:
-            print(f"Caption failed (likely missing ImageMagick): {e}")
+            print(f"Caption failed: {e}")
             clip_with_caption = base_clip
 
     # 5) Voiceover
     if use_voiceover and caption and HAS_GTTS:
-        tts_audio = _generate_tts_audio(caption, clip_with_caption.duration)
+        tts_audio = sources.adopt(_generate_tts_audio(caption, clip_with_caption.duration, work_dir))
         if tts_audio:
             original_audio = clip_with_caption.audio
             if original_audio:
@@ -158,11 +345,22 @@ def _build_clip_from_scene(scene: Dict[str, Any]):
     return clip_with_caption
 
 
-def _generate_tts_audio(text: str, duration: float) -> AudioFileClip:
+def _generate_tts_file(text: str, output_dir: str = OUTPUT_DIR) -> Optional[str]:
     try:
-        temp_audio = os.path.join(OUTPUT_DIR, f"tts_{uuid.uuid4()}.mp3")
+        temp_audio = os.path.join(output_dir, f"tts_{uuid.uuid4()}.mp3")
         tts = gTTS(text=text, lang='en')
         tts.save(temp_audio)
+        return temp_audio
+    except Exception as e:
+        print(f"TTS Error: {e}")
+        return None
+
+
+def _generate_tts_audio(text: str, duration: float, output_dir: str = OUTPUT_DIR) -> AudioFileClip:
+    temp_audio = _generate_tts_file(text, output_dir)
+    if not temp_audio:
+        return None
+    try:
         audio = AudioFileClip(temp_audio)
         # Ensure it doesn't exceed clip duration significantly
         return audio
@@ -170,93 +368,576 @@ def _generate_tts_audio(text: str, duration: float) -> AudioFileClip:
         print(f"TTS Error: {e}")
         return None
 
-def render_from_storyboard_sync(storyboard: Dict[str, Any], job_id: str = None):
+def _find_music_path() -> Optional[str]:
+    """Returns assets/music/bg_music.mp3, or any mp3 in assets/music, or None."""
+    music_dir = os.path.join(os.path.dirname(__file__), "..", "..", "assets", "music")
+    music_path = os.path.join(music_dir, "bg_music.mp3")
+    if os.path.exists(music_path):
+        return music_path
+    if os.path.exists(music_dir):
+        files = [f for f in os.listdir(music_dir) if f.endswith(".mp3")]
+        if files:
+            return os.path.join(music_dir, files[0])
+    return None
+
+
+def _copy_window(scene: Scene, out_size: Tuple[int, int]) -> Tuple[Optional[Tuple[float, float]], Optional[StreamSignature]]:
+    """
+    Checks whether a scene can be cut without touching pixels.
+    Returns ((keyframe_start, duration), stream_signature) or (None, None).
+    """
+    if scene.input_type != "user_clip" or scene.caption:
+        return None, None
+    if scene.effect not in (None, "", "none") or motion.effect_for(scene):
+        return None, None
+
+    file_path = scene.file_path
+    if not file_path or not os.path.exists(file_path):
+        return None, None
+
+    info = media_probe.probe(file_path)
+    if not info or info["video_codec"] not in COPYABLE_CODECS:
+        return None, None
+    # Must already be the output frame, upright, with audio to concat against
+    if (info["width"], info["height"]) != out_size or info["rotation"]:
+        return None, None
+    if info["pix_fmt"] != "yuv420p" or not info["has_audio"]:
+        return None, None
+    # Progressive only, and a profile composited segments can be encoded to match
+    if info.get("field_order") not in (None, "progressive", "unknown"):
+        return None, None
+    if SEGMENT_CODEC != "libx264" or info.get("profile") not in _X264_PROFILES or not info.get("level"):
+        return None, None
+
+    # Same trimming as _build_clip_from_scene
+    start, duration = scene.start, scene.end - scene.start
+
+    if start > 0:
+        keyframe = media_probe.keyframe_near(file_path, start, KEYFRAME_TOLERANCE)
+        if keyframe is None:
+            return None, None
+        start = keyframe
+
+    duration = min(duration, info["duration"] - start)
+    if duration <= 0:
+        return None, None
+
+    signature = StreamSignature(
+        info["video_codec"], info["width"], info["height"], round(info["fps"], 3), info["pix_fmt"],
+        info["profile"], info["level"], info["has_b_frames"],
+    )
+    return (start, duration), signature
+
+
+def _plan_stream_copy(scenes: List[Scene], out_size: Tuple[int, int]) -> Tuple[List[Optional[Tuple[float, float]]], Optional[StreamSignature]]:
+    """
+    Sorts scenes into "copyable" and "needs compositing".
+    The concat demuxer needs identical stream parameters, so only scenes sharing
+    the most common signature are copied; the rest are composited to match it
+    (frame rate, profile, level and B-frames; see OutputSettings.match).
+    Returns one window (or None) per scene and the chosen signature.
+    """
+    candidates = [_copy_window(scene, out_size) for scene in scenes]
+
+    counts: Dict[StreamSignature, int] = {}
+    for window, sig in candidates:
+        if sig:
+            counts[sig] = counts.get(sig, 0) + 1
+    if not counts:
+        return [None] * len(scenes), None
+
+    signature = max(counts, key=counts.get)
+    windows = [window if sig == signature else None for window, sig in candidates]
+    return windows, signature
+
+
+def _write_segment(clip, output_path: str, settings: OutputSettings, work_dir: str, threads: int = 4):
+    """Encodes a composited clip as an intermediate segment matching the copied streams."""
+    if clip.audio is None:
+        # Every segment needs an audio track for the concat demuxer
+        silence = AudioArrayClip(np.zeros((int(clip.duration * 44100) + 1, 2)), fps=44100)
+        clip = clip.set_audio(silence)
+
+    clip.write_videofile(
+        output_path,
+        fps=settings.fps,
+        codec=SEGMENT_CODEC,
+        audio_codec="aac",
+        audio_fps=44100,
+        preset=settings.preset,
+        threads=threads,
+        ffmpeg_params=["-pix_fmt", "yuv420p", *settings.encoder_params()],
+        temp_audiofile=os.path.join(work_dir, f"{os.path.basename(output_path)}.m4a"),
+        logger=None
+    )
+
+
+def _render_still_segment(
+    index: int,
+    scene: Scene,
+    seg_path: str,
+    work_dir: str,
+    threads: int,
+    settings: OutputSettings,
+) -> bool:
+    """Encodes an image scene straight from one prepared frame (no per-frame Python work)."""
+    duration = scene.duration
+    motion_effect = motion.effect_for(scene)
+    out_w, out_h = settings.size
+    vf, overlay = None, None
+    try:
+        frame = _still_frame(scene.file_path, out_w, out_h, scene.fit)
+        if motion_effect:
+            # The still moves; the caption is overlaid on top and stays put
+            vf = motion.zoompan_filter(motion_effect, duration, settings.fps, out_w, out_h)
+            if scene.caption:
+                overlay = captions.caption_placement(scene.caption, out_w, out_h)
+        elif scene.caption:
+            frame = captions.burn_caption(frame, scene.caption)
+        still_path = os.path.join(work_dir, f"still_{index:03d}.png")
+        Image.fromarray(frame).save(still_path, compress_level=1)
+    except Exception as e:
+        print(f"Error loading image {scene.file_path}: {e}")
+        return False
+    return ffmpeg_utils.encode_still(
+        still_path, duration, settings.fps, seg_path, SEGMENT_CODEC, settings.preset, threads,
+        vf=vf, overlay=overlay, encoder_params=settings.encoder_params(),
+    )
+
+
+def _render_scene_segment(
+    index: int,
+    scene: Scene,
+    window: Optional[Tuple[float, float]],
+    work_dir: str,
+    threads: int,
+    settings: OutputSettings,
+    sources: Optional[source_pool.SourcePool] = None,
+) -> Optional[str]:
+    """
+    Renders one scene to an MPEG-TS segment per `settings`: stream copy when `window`
+    is set, MoviePy otherwise. Top-level so it can run in a worker process.
+    `sources`: the render's shared readers (serial path); a private pool otherwise.
+    """
+    seg_path = os.path.join(work_dir, f"seg_{index:03d}.ts")
+    own_sources = sources is None
+    sources = sources or source_pool.SourcePool([scene])
+    try:
+        if window:
+            start, duration = window
+            if ffmpeg_utils.stream_copy_cut(scene.file_path, start, duration, seg_path):
+                return seg_path
+            print(f"[Renderer] Stream copy failed for scene {index+1}, compositing instead")
+
+        if _is_plain_still(scene, settings.voiceover) and _render_still_segment(index, scene, seg_path, work_dir, threads, settings):
+            return seg_path
+
+        clip = _build_clip_from_scene(scene, sources, settings.size, settings.voiceover, work_dir)
+        if not clip:
+            return None
+        _write_segment(clip, seg_path, settings, work_dir, threads)
+        return seg_path
+    finally:
+        if own_sources:
+            sources.close()
+        else:
+            sources.release(scene.file_path)
+
+
+def _get_segment_pool() -> concurrent.futures.ProcessPoolExecutor:
+    """Process-wide pool, created on first use. Spawned so workers don't inherit server threads."""
+    global _segment_pool
+    if _segment_pool is None:
+        _segment_pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=RENDER_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _segment_pool
+
+
+def _reset_segment_pool():
+    global _segment_pool
+    if _segment_pool is not None:
+        _segment_pool.shutdown(wait=False, cancel_futures=True)
+        _segment_pool = None
+
+
+def _cached_segment(
+    index: int,
+    scene: Scene,
+    window: Optional[Tuple[float, float]],
+    settings: OutputSettings,
+    work_dir: str,
+) -> Tuple[Optional[str], Optional[str]]:
+    """(cache key, segment path if an identical scene was rendered before)."""
+    if not segment_cache.SEGMENT_CACHE_ENABLED:
+        return None, None
+    key = segment_cache.segment_key(scene, window, settings)
+    seg_path = os.path.join(work_dir, f"seg_{index:03d}.ts")
+    return key, seg_path if segment_cache.fetch(key, seg_path) else None
+
+
+def _render_segments(
+    scenes: List[Scene],
+    windows: List[Optional[Tuple[float, float]]],
+    settings: OutputSettings,
+    job_id: str,
+    output_path: str,
+    use_music: bool,
+    deferred: Optional[set] = None,
+) -> bool:
+    """
+    Renders each scene to a segment (in the process pool when RENDER_WORKERS > 1),
+    then joins them with the concat demuxer. Returns False if no scene produced output.
+    Scenes in `deferred` (B-roll still generating) are rendered last, so the
+    rest of the reel renders while their clips are produced.
+    Scenes rendered before with identical content and settings come from the
+    segment cache; only changed scenes are encoded.
+    """
+    deferred = deferred or set()
+    # Cuts from one file in start order, so a shared reader only seeks forward
+    order = source_pool.forward_order(scenes, [i for i in range(len(scenes)) if i not in deferred]) + sorted(deferred)
+    work_dir = tempfile.mkdtemp(prefix=f"{job_id}_", dir=OUTPUT_DIR)
+    results: List[Optional[str]] = [None] * len(scenes)
+    keys: Dict[int, str] = {}
+    reused = 0
+    try:
+        if RENDER_WORKERS > 1 and len(scenes) > 1:
+            # Split the cores between concurrent encoders
+            threads = max(1, (os.cpu_count() or 1) // RENDER_WORKERS)
+            pool = _get_segment_pool()
+            try:
+                futures = {}
+                for i in order:
+                    # Blocks on the generated clip while earlier segments keep encoding
+                    scene = _resolve_generated_asset(scenes[i]) if i in deferred else scenes[i]
+                    key, results[i] = _cached_segment(i, scene, windows[i], settings, work_dir)
+                    if results[i]:
+                        reused += 1
+                        continue
+                    keys[i] = key
+                    futures[i] = pool.submit(
+                        _render_scene_segment, i, scene, windows[i], work_dir, threads, settings
+                    )
+                for done, _ in enumerate(concurrent.futures.as_completed(futures.values()), reused + 1):
+                    job_registry.report_progress(job_id, 0.9 * done / len(scenes))
+                for i, future in futures.items():
+                    results[i] = future.result()
+            except BrokenProcessPool:
+                _reset_segment_pool()
+                raise
+        else:
+            # One reader per source for the whole render, closed after its last cut
+            with source_pool.SourcePool(scenes) as sources:
+                for done, i in enumerate(order, 1):
+                    scene = _resolve_generated_asset(scenes[i]) if i in deferred else scenes[i]
+                    key, results[i] = _cached_segment(i, scene, windows[i], settings, work_dir)
+                    if results[i]:
+                        reused += 1
+                        sources.release(scene.file_path)
+                    else:
+                        keys[i] = key
+                        results[i] = _render_scene_segment(i, scene, windows[i], work_dir, 4, settings, sources)
+                    job_registry.report_progress(job_id, 0.9 * done / len(scenes))
+
+        if reused:
+            print(f"[Renderer] Reused {reused}/{len(scenes)} cached scene segments")
+        stored = [(key, results[i]) for i, key in keys.items() if key and results[i]]
+        for key, seg_path in stored:
+            segment_cache.store(key, seg_path)
+        if stored:
+            segment_cache.evict()
+
+        segment_paths = [p for p in results if p]
+        if not segment_paths:
+            print("[Renderer] No clips generated.")
+            return False
+
+        music_path = _find_music_path() if use_music else None
+        joined_path = os.path.join(work_dir, "joined.mp4") if music_path else output_path
+
+        print(f"[Renderer] Joining {len(segment_paths)} segments to {output_path}...")
+        job_registry.report_progress(job_id, 0.9, status=job_registry.ENCODING)
+        if not ffmpeg_utils.concat_segments(segment_paths, joined_path):
+            raise RuntimeError("concat failed")
+
+        if music_path and not ffmpeg_utils.mix_background_music(joined_path, music_path, output_path):
+            raise RuntimeError("music mix failed")
+        return True
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _render_with_filtergraph(
+    scenes: List[Scene],
+    job_id: str,
+    output_path: str,
+    use_music: bool,
+    settings: OutputSettings,
+) -> bool:
     """
-    Synchronous rendering function to be called in BackgroundTasks.
+    Renders the whole reel in one ffmpeg process; Python only builds the graph.
+    Returns False if no scene could be compiled.
+    """
+    work_dir = tempfile.mkdtemp(prefix=f"{job_id}_", dir=OUTPUT_DIR)
+    try:
+        tts_paths = {}
+        if settings.voiceover and HAS_GTTS:
+            for i, scene in enumerate(scenes):
+                if scene.caption:
+                    tts_path = _generate_tts_file(scene.caption, work_dir)
+                    if tts_path:
+                        tts_paths[i] = tts_path
+
+        compiled = filtergraph.compile_storyboard(
+            scenes,
+            output_path,
+            work_dir,
+            target_w=settings.width,
+            target_h=settings.height,
+            fps=settings.fps,
+            encoder_params=settings.encoder_params(),
+            tts_paths=tts_paths,
+            music_path=_find_music_path() if use_music else None,
+        )
+        if not compiled:
+            print("[Renderer] No clips generated.")
+            return False
+        cmd, total_duration = compiled
+
+        print(f"[Renderer] Writing video to {output_path} (ffmpeg filtergraph)...")
+        job_registry.report_progress(job_id, 0.0, status=job_registry.ENCODING)
+        on_progress = lambda p: job_registry.report_progress(job_id, p)
+        if not ffmpeg_utils.run_ffmpeg_command(cmd, on_progress, total_duration):
+            raise RuntimeError("ffmpeg filtergraph render failed")
+        return True
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+class _EncodeProgressLogger(ProgressBarLogger):
+    """Forwards MoviePy's frame counter (the 't' bar) to the job registry."""
+
+    def __init__(self, job_id: str):
+        super().__init__()
+        self.job_id = job_id
+
+    def bars_callback(self, bar, attr, value, old_value=None):
+        if bar == "t" and attr == "index":
+            total = self.bars[bar].get("total") or 0
+            if total:
+                job_registry.report_progress(self.job_id, value / total)
+
+
+def _render_with_moviepy(scenes: List[Scene], job_id: str, output_path: str, use_music: bool, settings: OutputSettings) -> bool:
+    """
+    Original single-pass MoviePy render: build every clip, concatenate, encode once.
+    Each source file is opened once for all of its cuts; every reader and temp
+    file is released when this returns or raises.
+    Returns False if no clip could be built.
+    """
+    work_dir = tempfile.mkdtemp(prefix=f"{job_id}_", dir=OUTPUT_DIR)
+    try:
+        with source_pool.SourcePool(scenes) as sources:
+            clips = []
+
+            # 1. Build Clips
+            for scene in scenes:
+                clip = _build_clip_from_scene(scene, sources, settings.size, settings.voiceover, work_dir)
+                if clip:
+                    clips.append(clip)
+
+            if not clips:
+                print("[Renderer] No clips generated.")
+                return False
+
+            # 2. Concatenate
+            final_clip = concatenate_videoclips(clips, method="compose")
+
+            # 3. Add Music (Simplified)
+            if use_music:
+                music_path = _find_music_path()
+                if music_path:
+                    bg_music = sources.adopt(AudioFileClip(music_path))
+                    # Loop
+                    if bg_music.duration < final_clip.duration:
+                        bg_music = afx.audio_loop(bg_music, duration=final_clip.duration)
+                    else:
+                        bg_music = bg_music.subclip(0, final_clip.duration)
+
+                    bg_music = bg_music.volumex(0.15) # Background level
+
+                    if final_clip.audio:
+                        final_clip.audio = CompositeAudioClip([final_clip.audio, bg_music])
+                    else:
+                        final_clip.audio = bg_music
+
+            # 4. Write File (The slow part)
+            print(f"[Renderer] Writing video to {output_path}...")
+            job_registry.report_progress(job_id, 0.0, status=job_registry.ENCODING)
+            final_clip.write_videofile(
+                output_path,
+                fps=settings.fps, # 24fps is faster than 30 and cinematic (previews go lower)
+                codec="libx264",
+                audio_codec="aac",
+                preset="ultrafast", # Fastest encoding
+                threads=4,
+                ffmpeg_params=settings.encoder_params(),
+                temp_audiofile=os.path.join(work_dir, "audio.m4a"),
+                logger=_EncodeProgressLogger(job_id) # Progress to the registry, no console noise
+            )
+            return True
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def render_from_storyboard_sync(storyboard: Union[Storyboard, Dict[str, Any]], job_id: str = None) -> Optional[str]:
+    """
+    Synchronous rendering function, run by the job queue's render workers.
+    Queued storyboards arrive as JSON and are re-validated into the (immutable) model.
+    Records state/progress in the job registry and writes the output atomically
+    (temp name, then rename), so a half-written file is never served as complete.
+    Returns the output path, or None if the render failed.
     """
     if not job_id:
         job_id = str(uuid.uuid4())
-        
-    print(f"[Renderer] Starting Job {job_id}")
+    if not isinstance(storyboard, Storyboard):
+        storyboard = Storyboard.model_validate(storyboard)
+
+    # Deliverable preset (9:16 / 1:1 / 4:5 / 16:9 at 720p or 1080p), or the preview tier
+    settings = output_settings(storyboard)
+    preview = settings.quality == job_registry.QUALITY_PREVIEW
+
+    print(f"[Renderer] Starting Job {job_id} ({settings.quality} {settings.width}x{settings.height}@{settings.fps:g})")
     output_filename = f"{job_id}.mp4"
     output_path = os.path.join(OUTPUT_DIR, output_filename)
+    # Same directory so the final rename is atomic
+    temp_path = os.path.join(OUTPUT_DIR, f"{job_id}.part.mp4")
     
-    scenes = storyboard.get("scenes", [])
-    clips = []
-    
-    use_voiceover = storyboard.get("use_voiceover", False)
-    use_music = storyboard.get("use_music", False)
-    
-    # 1. Build Clips
-    for scene in scenes:
-        scene["use_voiceover"] = use_voiceover
-        clip = _build_clip_from_scene(scene)
-        if clip:
-            clips.append(clip)
-            
-    if not clips:
-        print("[Renderer] No clips generated.")
-        return
-        
+    scenes = list(storyboard.scenes)
+    use_music = storyboard.use_music
+
+    job_registry.set_state(job_id, job_registry.RENDERING)
     try:
-        # 2. Concatenate
-        final_clip = concatenate_videoclips(clips, method="compose")
-        
-        # 3. Add Music (Simplified)
-        if use_music:
-             music_path = os.path.join(os.path.dirname(__file__), "..", "..", "assets", "music", "bg_music.mp3")
-             if not os.path.exists(music_path):
-                 # Try finding any mp3 in assets/music
-                 music_dir = os.path.join(os.path.dirname(__file__), "..", "..", "assets", "music")
-                 if os.path.exists(music_dir):
-                     files = [f for f in os.listdir(music_dir) if f.endswith(".mp3")]
-                     if files:
-                         music_path = os.path.join(music_dir, files[0])
-            
-             if os.path.exists(music_path):
-                bg_music = AudioFileClip(music_path)
-                # Loop
-                if bg_music.duration < final_clip.duration:
-                    bg_music = afx.audio_loop(bg_music, duration=final_clip.duration)
-                else:
-                    bg_music = bg_music.subclip(0, final_clip.duration)
-                
-                bg_music = bg_music.volumex(0.15) # Background level
-                
-                if final_clip.audio:
-                    final_clip.audio = CompositeAudioClip([final_clip.audio, bg_music])
-                else:
-                    final_clip.audio = bg_music
-
-        # 4. Write File (The slow part)
-        print(f"[Renderer] Writing video to {output_path}...")
-        final_clip.write_videofile(
-            output_path,
-            fps=24, # 24fps is faster than 30 and cinematic
-            codec="libx264",
-            audio_codec="aac",
-            preset="ultrafast", # Fastest encoding
-            threads=4,
-            logger=None # Reduce console noise
-        )
-        
-        final_clip.close()
-        for c in clips:
-            c.close()
-            
-        print(f"[Renderer] Job {job_id} Completed. saved to {output_path}")
+        # AI B-roll still generating: the segment path renders everything else first;
+        # single-pass paths need every clip before they start
+        deferred = set()
+        if RENDER_BACKEND != "ffmpeg":
+            deferred = {i for i, scene in enumerate(scenes) if _awaits_generated_asset(scene)}
+        scenes = [scene if i in deferred else _resolve_generated_asset(scene) for i, scene in enumerate(scenes)]
+        if preview:
+            scenes = [scene if i in deferred else _preview_source(scene, settings) for i, scene in enumerate(scenes)]
+
+        if RENDER_BACKEND == "ffmpeg":
+            rendered = _render_with_filtergraph(scenes, job_id, temp_path, use_music, settings)
+        else:
+            # Segment path: used when any scene can be stream-copied, or in parallel mode
+            windows, signature = [None] * len(scenes), None
+            # Previews encode everything at their own frame rate
+            if STREAM_COPY_ENABLED and not preview:
+                windows, signature = _plan_stream_copy(scenes, settings.size)
+                if signature:
+                    copied = sum(1 for w in windows if w)
+                    print(f"[Renderer] Stream-copying {copied}/{len(scenes)} scenes")
+                    # Composited scenes must match the copied streams (frame rate, profile, level, B-frames)
+                    settings = dataclasses.replace(settings, fps=signature.fps, match=signature)
+
+            # Stills encode fastest as their own looped-frame segments; with the segment
+            # cache on, every render goes through segments so edits re-encode only what changed
+            if (signature or RENDER_WORKERS > 1 or deferred or segment_cache.SEGMENT_CACHE_ENABLED
+                    or any(_is_plain_still(s, settings.voiceover) for s in scenes)):
+                rendered = _render_segments(scenes, windows, settings, job_id, temp_path, use_music, deferred)
+            else:
+                rendered = _render_with_moviepy(scenes, job_id, temp_path, use_music, settings)
+
+        if not rendered:
+            raise RuntimeError("No clips generated")
+        os.replace(temp_path, output_path)
 
     except Exception as e:
         print(f"[Renderer] Job {job_id} Failed: {e}")
+        # Not terminal yet: the queue retries or marks it failed
+        job_registry.record_error(job_id, str(e))
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return None
+
+    job_registry.set_state(job_id, job_registry.COMPLETED, output_url=f"/media/output/{output_filename}")
+    print(f"[Renderer] Job {job_id} Completed. saved to {output_path}")
+    return output_path
+
+
+_STATUS_MESSAGES = {
+    job_registry.QUEUED: "Waiting for a render worker...",
+    job_registry.PLANNING: "Planning storyboard...",
+    job_registry.RENDERING: "Rendering...",
+    job_registry.ENCODING: "Encoding...",
+    job_registry.COMPLETED: "Render complete",
+    job_registry.FAILED: "Render failed",
+    job_registry.CANCELLED: "Render cancelled",
+}
+
+
+def _poll_after(status: str, queue_position: Optional[int]) -> Optional[float]:
+    """Back-off hint for clients: slow while waiting, faster while encoding."""
+    if status in job_registry.TERMINAL_STATES:
+        return None
+    if status == job_registry.QUEUED:
+        return min(30.0, 5.0 + 2.0 * (queue_position or 0))
+    if status == job_registry.ENCODING:
+        return 1.0
+    return 2.0
+
+
+def _job_resources(state: Dict[str, Any]) -> Optional[JobResources]:
+    values = {name: state.get(name) for name in job_registry.RESOURCE_FIELDS}
+    if all(value is None for value in values.values()):
+        return None
+    return JobResources(**values)
+
 
-# Async wrapper if needed, but router uses sync with BackgroundTasks
 async def get_job_status(job_id: str) -> JobResponse:
+    # SQLite reads (with a busy timeout) run off the event loop
+    state = await asyncio.to_thread(job_registry.get, job_id)
     output_path = os.path.join(OUTPUT_DIR, f"{job_id}.mp4")
-    if os.path.exists(output_path):
-        return JobResponse(
-            job_id=job_id,
-            status="completed", # Frontend checks for this
-            output_url=f"/media/output/{job_id}.mp4",
-            message="Render complete"
-        )
-    return JobResponse(job_id=job_id, status="processing", message="Rendering...")
+
+    if state is None:
+        # Outputs rendered before the registry existed
+        if os.path.exists(output_path):
+            return JobResponse(
+                job_id=job_id,
+                status="completed", # Frontend checks for this
+                output_url=f"/media/output/{job_id}.mp4",
+                message="Render complete"
+            )
+        return JobResponse(job_id=job_id, status="processing", message="Rendering...", poll_after=2.0)
+
+    status = state["status"]
+    position = await asyncio.to_thread(job_queue.queue_position, job_id) if status == job_registry.QUEUED else None
+    message = _STATUS_MESSAGES.get(status, status)
+    quality = state.get("quality") or job_registry.QUALITY_FINAL
+    if status == job_registry.COMPLETED and quality == job_registry.QUALITY_PREVIEW:
+        message = "Preview ready"
+    elif status == job_registry.FAILED and state["error"]:
+        message = state["error"]
+    elif status == job_registry.QUEUED and state["error"]:
+        message = f"Retrying after error: {state['error']}"
+    elif position:
+        message = f"Queued ({position} jobs ahead)"
+
+    return JobResponse(
+        job_id=job_id,
+        status=status,
+        output_url=state["output_url"] if status == job_registry.COMPLETED else None,
+        message=message,
+        progress=state["progress"],
+        error=state["error"],
+        created_at=state["created_at"],
+        updated_at=state["updated_at"],
+        started_at=state["started_at"],
+        finished_at=state["finished_at"],
+        queue_position=position,
+        poll_after=_poll_after(status, position),
+        quality=quality,
+        resources=_job_resources(state),
+    )
@@ -0,0 +1,261 @@
+import os
+import glob
+import shutil
+import signal
+from typing import Dict, Any, List, Optional, Tuple
+
+from . import storage
+
+# Per-job resource accounting and admission control for render workers.
+# - Before a job runs: an RSS estimate from its sources and output frame
+# - While it runs: the render process tree (render process, segment workers and
+#   every ffmpeg reader/writer they start) is sampled from /proc for RSS, open
+#   ffmpeg processes and the size of the job's temp files
+# - Workers only claim the next job when the node has headroom for its estimate
+# - Whatever way a render ends, leftover processes and temp files are removed
+# Measurements need Linux /proc (Cloud Run, Docker); elsewhere they read as None
+# and admission never blocks.
+
+MB = 1024 * 1024
+
+# Memory renders on this node may use; default: the container's cgroup limit, else physical RAM
+RENDER_MEMORY_BUDGET = int(os.getenv("RENDER_MEMORY_BUDGET_MB", "0")) * MB or None
+# Kept free for the API process and the OS
+RENDER_MEMORY_RESERVE = int(os.getenv("RENDER_MEMORY_RESERVE_MB", "512")) * MB
+# Estimate inputs: one Python render process (interpreter, MoviePy, numpy), one
+# ffmpeg reader or writer process, frames held per reader and per output pipeline
+PROCESS_BASE_RSS = int(os.getenv("RENDER_PROCESS_RSS_MB", "250")) * MB
+FFMPEG_PROCESS_RSS = int(os.getenv("RENDER_FFMPEG_RSS_MB", "40")) * MB
+READER_FRAMES = 3
+OUTPUT_FRAMES = 8
+
+# Process names (/proc comm, truncated) of ffmpeg readers/writers, incl. imageio-ffmpeg builds
+_FFMPEG_NAMES = ("ffmpeg", "ffprobe")
+
+
+def _frame_bytes(size: Tuple[int, int]) -> int:
+    return int(size[0]) * int(size[1]) * 3
+
+
+def estimate_rss(
+    video_sizes: List[Tuple[int, int]],
+    image_sizes: List[Tuple[int, int]],
+    out_size: Tuple[int, int],
+    workers: int = 1,
+) -> int:
+    """
+    Upper-bound peak RSS of a render:
+    - serial (workers == 1): one process with a reader per distinct video source
+      and a decoded frame per still, plus the output pipeline and its encoder
+    - parallel: `workers` segment processes, each with the largest source open,
+      plus the coordinating render process
+    """
+    reader = lambda size: FFMPEG_PROCESS_RSS + READER_FRAMES * _frame_bytes(size)
+    output = FFMPEG_PROCESS_RSS + OUTPUT_FRAMES * _frame_bytes(out_size)
+    stills = sum(_frame_bytes(size) for size in image_sizes)
+    if workers <= 1:
+        return PROCESS_BASE_RSS + sum(reader(size) for size in video_sizes) + stills + output
+    largest = max((reader(size) for size in video_sizes), default=0)
+    return PROCESS_BASE_RSS + workers * (PROCESS_BASE_RSS + largest + output) + stills
+
+
+# ---------------------------------------------------------------------------
+# Node memory
+# ---------------------------------------------------------------------------
+
+def _read_int(path: str) -> Optional[int]:
+    try:
+        with open(path) as f:
+            value = f.read().strip()
+    except OSError:
+        return None
+    return int(value) if value.isdigit() else None
+
+
+def _meminfo(field: str) -> Optional[int]:
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _cgroup_limit() -> Optional[int]:
+    # cgroup v2, then v1 (v1 reports a huge number when unlimited)
+    limit = _read_int("/sys/fs/cgroup/memory.max") or _read_int("/sys/fs/cgroup/memory/memory.limit_in_bytes")
+    total = _meminfo("MemTotal")
+    if limit and total and limit >= total:
+        return None
+    return limit
+
+
+def _cgroup_usage() -> Optional[int]:
+    return _read_int("/sys/fs/cgroup/memory.current") or _read_int("/sys/fs/cgroup/memory/memory.usage_in_bytes")
+
+
+def memory_budget() -> Optional[int]:
+    """Bytes renders may use on this node (after RENDER_MEMORY_RESERVE), or None if unknown."""
+    total = RENDER_MEMORY_BUDGET or _cgroup_limit() or _meminfo("MemTotal")
+    if not total:
+        return None
+    return max(0, total - RENDER_MEMORY_RESERVE)
+
+
+def memory_available() -> Optional[int]:
+    """Bytes free right now (container limit - usage when limited, else MemAvailable)."""
+    limit, usage = _cgroup_limit(), _cgroup_usage()
+    available = _meminfo("MemAvailable")
+    if limit and usage is not None:
+        container_free = max(0, limit - usage)
+        available = min(available, container_free) if available is not None else container_free
+    return available
+
+
+def headroom(committed: int) -> Optional[int]:
+    """
+    Memory a new render may take: the budget minus what running renders were
+    admitted with (`committed`), capped by what is actually free. None = unknown.
+    """
+    budget, available = memory_budget(), memory_available()
+    if budget is None:
+        return None
+    room = budget - committed
+    if available is not None:
+        room = min(room, available - RENDER_MEMORY_RESERVE)
+    return max(0, room)
+
+
+# ---------------------------------------------------------------------------
+# Process tree sampling
+# ---------------------------------------------------------------------------
+
+def _children() -> Dict[int, List[int]]:
+    children: Dict[int, List[int]] = {}
+    try:
+        pids = [int(p) for p in os.listdir("/proc") if p.isdigit()]
+    except OSError:
+        return children
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                # "pid (comm) state ppid ..."; comm may contain spaces and parens
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(pid)
+    return children
+
+
+def process_tree(pid: int) -> List[int]:
+    """`pid` and all of its descendants (empty without /proc)."""
+    children = _children()
+    if not children:
+        return []
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, []))
+    return tree
+
+
+def _comm(pid: int) -> Optional[str]:
+    """Program name of a live process (None once it has exited, zombies included)."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    head, _, tail = stat.rpartition(")")
+    if tail.split()[:1] == ["Z"]:
+        return None
+    return head.partition("(")[2]
+
+
+def _rss(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+
+def temp_paths(job_id: str) -> List[str]:
+    """A render's scratch files: its work dirs and the partial output."""
+    paths = glob.glob(os.path.join(glob.escape(storage.OUTPUT_DIR), f"{glob.escape(job_id)}_*"))
+    part = os.path.join(storage.OUTPUT_DIR, f"{job_id}.part.mp4")
+    if os.path.exists(part):
+        paths.append(part)
+    return paths
+
+
+def _disk_usage(path: str) -> int:
+    if not os.path.isdir(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def sample(pid: int, job_id: str) -> Dict[str, Any]:
+    """
+    Current usage of a render: rss_bytes (whole process tree), open_readers
+    (ffmpeg processes in it), temp_disk_bytes, and `processes` ({pid: name},
+    for cleanup). rss_bytes / open_readers are None without /proc.
+    """
+    tree = process_tree(pid)
+    processes = {p: _comm(p) for p in tree}
+    processes = {p: name for p, name in processes.items() if name}
+    return {
+        "rss_bytes": sum(_rss(p) for p in processes) if tree else None,
+        "open_readers": sum(1 for name in processes.values() if name.startswith(_FFMPEG_NAMES)) if tree else None,
+        "temp_disk_bytes": sum(_disk_usage(p) for p in temp_paths(job_id)),
+        "processes": processes,
+    }
+
+
+def cleanup(job_id: str, processes: Optional[Dict[int, str]] = None) -> Tuple[int, int]:
+    """
+    Runs after a render process has exited, however it ended: kills processes
+    it left behind (from the last sample; a pid only counts if it still runs
+    the same program) and deletes its temp files.
+    Returns (processes killed, temp bytes freed).
+    """
+    killed = 0
+    for pid, name in (processes or {}).items():
+        if _comm(pid) != name:
+            continue
+        try:
+            os.kill(pid, signal.SIGKILL)
+            killed += 1
+        except OSError:
+            pass
+
+    freed = 0
+    for path in temp_paths(job_id):
+        size = _disk_usage(path)
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+            freed += size
+        except OSError as e:
+            print(f"[Resources] Could not remove {path}: {e}")
+    if killed or freed:
+        print(f"[Resources] Job {job_id}: killed {killed} leftover processes, freed {freed // MB} MB of temp files")
+    return killed, freed
@@ -0,0 +1,116 @@
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import threading
+from typing import Any, Optional
+
+from . import storage
+
+# Rendered scene segments, keyed by everything that decides their bytes: the scene
+# dict (canonical JSON), the content hash of its source media and the output settings.
+# After a chat edit only the scenes whose key changed are re-encoded; the rest are
+# spliced back in from here by the concat demuxer.
+# - Entries are hardlinked into a render's work dir, so eviction never pulls a
+#   segment out from under a running concat
+# - Size-capped with LRU eviction (hits refresh the mtime), like the proxy cache
+
+SEGMENT_CACHE_DIR = os.path.join(storage.CACHE_DIR, "segment_cache")
+os.makedirs(SEGMENT_CACHE_DIR, exist_ok=True)
+
+# Off by default: with it on, every render goes through per-scene segments + concat
+# (worth it when storyboards are edited and re-rendered often)
+SEGMENT_CACHE_ENABLED = os.getenv("SEGMENT_CACHE", "false").lower() == "true"
+SEGMENT_CACHE_MAX_BYTES = int(os.getenv("SEGMENT_CACHE_MAX_BYTES", str(5 * 1024 * 1024 * 1024)))
+# Bump when the renderer's output for an unchanged scene changes
+SEGMENT_FORMAT_VERSION = 1
+
+_evict_lock = threading.Lock()
+
+
+def _source_id(path: str) -> str:
+    """Content hash of a scene's source; the path itself for placeholders and missing files."""
+    if path and os.path.isfile(path):
+        return storage.content_hash(path)
+    return path or ""
+
+
+def segment_key(scene, window: Optional[tuple], settings: Any) -> str:
+    """
+    Canonical hash of a (resolved) Scene, its source content and the output settings.
+    `settings` is anything with a stable repr (the renderer's OutputSettings).
+    """
+    canonical = scene.model_dump(mode="json", exclude={"file_path"})
+    canonical["source"] = _source_id(scene.file_path)
+    payload = json.dumps(
+        [SEGMENT_FORMAT_VERSION, canonical, list(window) if window else None, repr(settings)],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _path_for(key: str) -> str:
+    return os.path.join(SEGMENT_CACHE_DIR, f"{key}.ts")
+
+
+def _link_or_copy(src: str, dest: str):
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+def fetch(key: str, dest: str) -> bool:
+    """Places the cached segment at `dest` (hardlink, or copy across filesystems). False on a miss."""
+    path = _path_for(key)
+    try:
+        _link_or_copy(path, dest)
+    except OSError:
+        return False
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return True
+
+
+def store(key: str, segment_path: str):
+    """Adds a freshly rendered segment (the render keeps using its own copy)."""
+    path = _path_for(key)
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        _link_or_copy(segment_path, temp_path)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"[Segment Cache] Could not store {key[:12]}: {e}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def evict():
+    """Drops least-recently-used segments until the directory fits SEGMENT_CACHE_MAX_BYTES."""
+    with _evict_lock:
+        entries = []
+        total = 0
+        for name in os.listdir(SEGMENT_CACHE_DIR):
+            if name.endswith(".tmp"):
+                continue
+            path = os.path.join(SEGMENT_CACHE_DIR, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= SEGMENT_CACHE_MAX_BYTES:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
@@ -0,0 +1,98 @@
+from collections import Counter
+from typing import Any, Dict, Iterable, List
+
+from moviepy.editor import VideoFileClip
+
+# Per-render pool of opened sources. Storyboards often cut several scenes from
+# the same upload; a VideoFileClip per scene would start one ffmpeg reader (plus
+# an audio reader and their frame buffers) for each cut and keep them all alive
+# until the final write. Here each file is opened once and scenes get subclips
+# of the shared reader.
+# - Cuts are rendered per file in start order (forward_order), so the shared
+#   reader only ever seeks forward instead of restarting ffmpeg
+# - A file's reader is closed after its last cut (release), everything else when
+#   the pool closes; use it as a context manager so failed renders release too
+
+class SourcePool:
+    def __init__(self, scenes: Iterable[Any] = ()):
+        self._clips: Dict[str, VideoFileClip] = {}
+        # Remaining cuts per file; a reader is kept open until its count reaches 0
+        self._uses = Counter(s.file_path for s in scenes if s.input_type == "user_clip" and s.file_path)
+        self._adopted: List[Any] = []
+
+    def __enter__(self) -> "SourcePool":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def subclip(self, path: str, start: float, end: float):
+        """[start, end) of `path` (clamped to its length), sharing the file's one reader."""
+        clip = self._clips.get(path)
+        if clip is None:
+            clip = VideoFileClip(path)
+            self._clips[path] = clip
+        return clip.subclip(start, min(end, clip.duration))
+
+    def adopt(self, resource: Any) -> Any:
+        """Closes `resource` (anything with .close(), e.g. a TTS AudioFileClip) with the pool."""
+        if resource is not None:
+            self._adopted.append(resource)
+        return resource
+
+    def release(self, path: str):
+        """
+        Marks one scene of `path` as done (written, reused or stream-copied); the
+        reader closes after the file's last scene, or right away for a file the
+        pool wasn't told about (e.g. a generated B-roll clip).
+        """
+        if not path:
+            return
+        if path in self._uses:
+            self._uses[path] -= 1
+            if self._uses[path] > 0:
+                return
+            del self._uses[path]
+        clip = self._clips.pop(path, None)
+        if clip is not None:
+            _close(clip)
+
+    @property
+    def open_readers(self) -> int:
+        return len(self._clips)
+
+    def close(self):
+        """Closes every reader and adopted resource (safe to call more than once)."""
+        clips, self._clips = list(self._clips.values()), {}
+        adopted, self._adopted = self._adopted[::-1], []
+        for resource in adopted + clips:
+            _close(resource)
+
+
+def _close(resource: Any):
+    try:
+        resource.close()
+    except Exception as e:
+        print(f"[Source Pool] Close failed: {e}")
+
+
+def forward_order(scenes: List[Any], indices: Iterable[int]) -> List[int]:
+    """
+    `indices` reordered so cuts from the same file are adjacent and ascending by
+    start (each file placed where its first cut was); other scenes keep their place.
+    """
+    indices = list(indices)
+    first: Dict[str, int] = {}
+    for pos, i in enumerate(indices):
+        scene = scenes[i]
+        if scene.input_type == "user_clip" and scene.file_path:
+            first.setdefault(scene.file_path, pos)
+
+    def key(item):
+        pos, i = item
+        scene = scenes[i]
+        if scene.input_type == "user_clip" and scene.file_path:
+            return (first[scene.file_path], scene.start, pos)
+        return (pos, 0.0, pos)
+
+    return [i for _, i in sorted(enumerate(indices), key=key)]
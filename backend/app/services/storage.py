@@ -1,6 +1,14 @@
 import os
+import json
+import errno
+import asyncio
+import time
+import uuid
+import shutil
+import hashlib
+import threading
 from fastapi import UploadFile
-from typing import List
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
 
 # Cloud Run injects 'K_SERVICE' or 'GOOGLE_CLOUD_PROJECT'
 IS_CLOUD_RUN = os.getenv("K_SERVICE") is not None
@@ -10,52 +18,523 @@ BUCKET_NAME = f"{GOOGLE_CLOUD_PROJECT}.appspot.com" if GOOGLE_CLOUD_PROJECT else
 # Local Fallback or Cloud Run Temp
 if IS_CLOUD_RUN:
     BASE_MEDIA_DIR = "/tmp/media"
+    STATE_DIR = "/tmp/state"
+    CACHE_DIR = "/tmp/cache"
 else:
     BASE_MEDIA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "media"))
+    STATE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "state"))
+    CACHE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "cache"))
+# BASE_MEDIA_DIR is served publicly at /media (see main.py). Nothing private goes
+# under it: state (job/cache databases, in-progress uploads) lives in STATE_DIR,
+# derived media (probe results, proxies, segments, caption and crop renders) in CACHE_DIR
+BASE_MEDIA_DIR = os.getenv("MEDIA_DIR", BASE_MEDIA_DIR)
+STATE_DIR = os.getenv("STATE_DIR", STATE_DIR)
+CACHE_DIR = os.getenv("CACHE_DIR", CACHE_DIR)
 
 INPUT_DIR = os.path.join(BASE_MEDIA_DIR, "input")
 OUTPUT_DIR = os.path.join(BASE_MEDIA_DIR, "output")
+# Content-addressed uploads + per-request manifests
+BLOB_DIR = os.path.join(BASE_MEDIA_DIR, "blobs")
+MANIFEST_DIR = os.path.join(STATE_DIR, "manifests")
+# In-progress uploads (one directory per chunked upload_id)
+UPLOAD_DIR = os.path.join(STATE_DIR, "uploads")
 
+os.makedirs(STATE_DIR, exist_ok=True)
+os.makedirs(CACHE_DIR, exist_ok=True)
 os.makedirs(INPUT_DIR, exist_ok=True)
 os.makedirs(OUTPUT_DIR, exist_ok=True)
+os.makedirs(BLOB_DIR, exist_ok=True)
+os.makedirs(MANIFEST_DIR, exist_ok=True)
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# Uploads are streamed to disk in chunks of this size (never held whole in memory)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Part size for the resumable upload API (every part but the last must be exactly this)
+UPLOAD_PART_SIZE = int(os.getenv("UPLOAD_PART_SIZE", str(8 * 1024 * 1024)))
+MAX_UPLOAD_FILE_BYTES = int(os.getenv("MAX_UPLOAD_FILE_BYTES", str(1024 * 1024 * 1024)))
+MAX_UPLOAD_REQUEST_BYTES = int(os.getenv("MAX_UPLOAD_REQUEST_BYTES", str(2 * 1024 * 1024 * 1024)))
+# Unfinished chunked uploads older than this are purged
+UPLOAD_TTL_SECONDS = int(os.getenv("UPLOAD_TTL_SECONDS", str(24 * 3600)))
+# How long a complete call waits on one already running in another process
+UPLOAD_COMPLETE_WAIT_SECONDS = float(os.getenv("UPLOAD_COMPLETE_WAIT_SECONDS", "60"))
+# (abs path, size, mtime_ns) -> sha256, for files outside the blob store
+_hash_memo: Dict[Tuple[str, int, int], str] = {}
 
 # Helper function not strictly needed if we assume local filesystem usage in /tmp
 # But good for future GCS expansion. For now, we rely on the mount in main.py
 
 
-async def save_uploads(files: List[UploadFile]) -> List[str]:
+def _blob_path(digest: str, ext: str) -> str:
+    # Fan out on the first two hex chars to keep directories small
+    return os.path.join(BLOB_DIR, digest[:2], f"{digest}{ext}")
+
+
+def is_blob_path(path: str) -> bool:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return (
+        len(stem) == 64
+        and all(c in "0123456789abcdef" for c in stem)
+        and os.path.dirname(os.path.dirname(os.path.abspath(path))) == os.path.abspath(BLOB_DIR)
+    )
+
+
+def hash_file(path: str, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """sha256 of a file, read in chunks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def content_hash(path: str) -> str:
     """
-    Saves uploaded files.
-    - Local: ./media/input/filename
-    - Cloud: gs://bucket_name/input/filename (Returns signed URL or public URL? Or just temp local path?)
-    
-    Correction: For processing in Cloud Run, we usually need the file locally in the container /tmp
-    unless we rewrite Gemini/Renderer to read from GCS directly.
-    For this MVP deployment, we will save to /tmp in container (ephemeral)
-    because our Renderer uses local file paths.
+    Content hash for any media path, used as the cache key by downstream caches.
+    Free for blobs (the filename is the hash); other files are hashed once per (size, mtime).
     """
-    saved_paths = []
-    
-    if IS_CLOUD_RUN:
-        # Save to /tmp for processing (It's an in-memory tempfs on Cloud Run usually)
-        temp_dir = INPUT_DIR # Use the correct input directory
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        for f in files:
-            dest_path = os.path.join(temp_dir, f.filename)
-            with open(dest_path, "wb") as out:
-                out.write(await f.read())
-            saved_paths.append(dest_path)
-            
-        return saved_paths
+    if is_blob_path(path):
+        return os.path.splitext(os.path.basename(path))[0]
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    digest = _hash_memo.get(key)
+    if digest is None:
+        digest = hash_file(path)
+        _hash_memo[key] = digest
+    return digest
+
+
+class UploadError(Exception):
+    """Invalid upload request (maps to HTTP 400)."""
+
+
+class UploadTooLarge(UploadError):
+    """Upload exceeds MAX_UPLOAD_FILE_BYTES / MAX_UPLOAD_REQUEST_BYTES (maps to HTTP 413)."""
+
+
+class UploadNotFound(UploadError):
+    """Unknown or expired upload_id (maps to HTTP 404)."""
+
+
+class UploadBusy(UploadError):
+    """Another request is still completing this upload (maps to HTTP 409)."""
+
+
+# Container signatures -> the one extension a blob of that kind gets
+_MAGIC_EXTENSIONS = (
+    (0, b"\x1a\x45\xdf\xa3", ".mkv"),  # Matroska / WebM
+    (0, b"\xff\xd8\xff", ".jpg"),
+    (0, b"\x89PNG\r\n\x1a\n", ".png"),
+)
+_RIFF_EXTENSIONS = {b"AVI ": ".avi", b"WEBP": ".webp"}
+# ISO base media files ("ftyp" box) that are HEIF still images, by brand; every
+# other brand (.mp4 / .mov / .m4v / 3gp) is video
+_FTYP_IMAGE_BRANDS = {
+    b"heic": ".heic", b"heix": ".heic", b"heim": ".heic", b"heis": ".heic",
+    b"avif": ".avif", b"avis": ".avif",
+}
+# Generic HEIF brands: the compatible brands say whether it's HEIC or AVIF
+_FTYP_GENERIC_IMAGE_BRANDS = (b"mif1", b"msf1")
+# Fallback when the bytes aren't recognised: spellings of the same type collapse
+_EXTENSION_ALIASES = {".mov": ".mp4", ".m4v": ".mp4", ".jpeg": ".jpg", ".webm": ".mkv", ".heif": ".heic"}
+
+
+def _blob_ext(head: bytes, filename: str) -> str:
+    """
+    Extension for a blob, from its first bytes where possible (the client's
+    filename is only a hint), so identical bytes always map to one blob.
+    """
+    if head[4:8] == b"ftyp":
+        return _ftyp_ext(head)
+    for offset, magic, ext in _MAGIC_EXTENSIONS:
+        if head[offset:offset + len(magic)] == magic:
+            return ext
+    if head[:4] == b"RIFF" and head[8:12] in _RIFF_EXTENSIONS:
+        return _RIFF_EXTENSIONS[head[8:12]]
+    ext = os.path.splitext(filename or "")[1].lower()
+    return _EXTENSION_ALIASES.get(ext, ext)
+
+
+def _ftyp_ext(head: bytes) -> str:
+    major = head[8:12]
+    if major in _FTYP_IMAGE_BRANDS:
+        return _FTYP_IMAGE_BRANDS[major]
+    if major in _FTYP_GENERIC_IMAGE_BRANDS:
+        # Compatible brands: 4-byte entries after the major brand and minor version
+        box_end = min(len(head), int.from_bytes(head[0:4], "big"))
+        compatible = [head[i:i + 4] for i in range(16, box_end - 3, 4)]
+        return ".avif" if b"avif" in compatible else ".heic"
+    return ".mp4"
+
+
+def _read_head(path: str) -> bytes:
+    # Room for the ftyp box's compatible brands
+    with open(path, "rb") as f:
+        return f.read(64)
+
+
+def _commit_blob(temp_path: str, digest: str, filename: str, size: int) -> Dict[str, Any]:
+    """Moves a fully written temp file into the store under its hash (dropped if already stored)."""
+    dest_path = _blob_path(digest, _blob_ext(_read_head(temp_path), filename))
+
+    deduplicated = os.path.exists(dest_path)
+    if deduplicated:
+        os.remove(temp_path)
     else:
-        # Local Development
-        for f in files:
-            dest_path = os.path.join(INPUT_DIR, f.filename)
-            with open(dest_path, "wb") as out:
-                out.write(await f.read())
-            saved_paths.append(dest_path)
-        return saved_paths
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        _move_into_store(temp_path, dest_path)
+
+    return {"sha256": digest, "path": dest_path, "size": size, "deduplicated": deduplicated}
+
+
+def _move_into_store(temp_path: str, dest_path: str):
+    # Rename is atomic: concurrent uploads of the same file never see a partial blob
+    try:
+        os.replace(temp_path, dest_path)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        # STATE_DIR on another filesystem/mount: copy next to the blob, then rename
+        staging = f"{dest_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            shutil.copyfile(temp_path, staging)
+            os.replace(staging, dest_path)
+        finally:
+            if os.path.exists(staging):
+                os.remove(staging)
+        os.remove(temp_path)
+
+
+def _touch(path: str):
+    open(path, "w").close()
+
+
+def _write_chunk(out, h, chunk: bytes):
+    h.update(chunk)
+    out.write(chunk)
+
+
+async def _store_stream(f: UploadFile, budget: int) -> Dict[str, Any]:
+    """
+    Streams one upload to disk in UPLOAD_CHUNK_SIZE pieces, hashing as it goes.
+    `budget` is what's left of the per-request limit.
+    Disk writes and hashing run in a worker thread, never on the event loop.
+    """
+    limit = min(MAX_UPLOAD_FILE_BYTES, budget)
+    declared = getattr(f, "size", None)
+    if declared is not None and declared > limit:
+        raise UploadTooLarge(f"{f.filename} is {declared} bytes (limit {limit})")
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    temp_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}.tmp")
+    h = hashlib.sha256()
+    size = 0
+    try:
+        out = await asyncio.to_thread(open, temp_path, "wb")
+        try:
+            while True:
+                chunk = await f.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > limit:
+                    raise UploadTooLarge(f"{f.filename} exceeds {limit} bytes")
+                await asyncio.to_thread(_write_chunk, out, h, chunk)
+        finally:
+            await asyncio.to_thread(out.close)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return await asyncio.to_thread(_commit_blob, temp_path, h.hexdigest(), f.filename, size)
+
+
+def write_manifest(request_id: str, entries: List[Dict[str, Any]]) -> str:
+    """Records which blobs a request used, keyed by the client's original filenames."""
+    manifest_path = os.path.join(MANIFEST_DIR, f"{request_id}.json")
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump({"request_id": request_id, "files": entries}, f, indent=2)
+    return manifest_path
+
+
+def read_manifest(request_id: str) -> Optional[Dict[str, Any]]:
+    manifest_path = os.path.join(MANIFEST_DIR, f"{request_id}.json")
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def display_names(paths: List[str], request_id: Optional[str] = None) -> Dict[str, str]:
+    """
+    Readable, unique name per path for prompts: the client's original filename
+    from the request's manifest (blob names are just hashes), else the file name.
+    Repeated names get a " (2)", " (3)", ... suffix before the extension.
+    """
+    manifest = read_manifest(request_id) if request_id else None
+    originals = {e["path"]: e.get("original_name") for e in (manifest or {}).get("files", [])}
+    names: Dict[str, str] = {}
+    taken = set()
+    for path in paths:
+        if path in names:
+            continue
+        name = os.path.basename(originals.get(path) or path)
+        stem, ext = os.path.splitext(name)
+        n = 1
+        while name in taken:
+            n += 1
+            name = f"{stem} ({n}){ext}"
+        taken.add(name)
+        names[path] = name
+    return names
+
+
+async def save_uploads(
+    files: List[UploadFile],
+    request_id: Optional[str] = None,
+    upload_ids: Optional[List[str]] = None,
+) -> List[str]:
+    """
+    Saves uploaded files into the content-addressed store.
+    Files are streamed in chunks (bounded memory) and checked against the size limits.
+    `upload_ids` adds files that were already sent through the chunked upload API.
+    Note that Starlette has already spooled a multipart body to a temp file before
+    this runs: memory stays bounded, but the limits only apply once the whole
+    request has arrived and the file sits on disk twice meanwhile. Large files
+    should go through the chunked API, which checks sizes before any bytes are sent.
+    - Blobs: media/blobs/ab/<sha256><ext> (identical uploads are stored once,
+      so two users' `video.mp4` never overwrite each other)
+    - Manifest: state/manifests/<request_id>.json maps original names -> blobs
+      (private: outside the /media static mount)
+    Returns blob paths in upload order.
+
+    For processing in Cloud Run we need the files locally in the container /tmp
+    (our Renderer uses local file paths), so BASE_MEDIA_DIR lives there.
+    """
+    request_id = request_id or str(uuid.uuid4())
+    saved_paths = []
+    entries = []
+    budget = MAX_UPLOAD_REQUEST_BYTES
+
+    for f in files:
+        entry = await _store_stream(f, budget)
+        budget -= entry["size"]
+        entry["original_name"] = f.filename
+        if entry["deduplicated"]:
+            print(f"[Storage] {f.filename} already stored as {entry['sha256'][:12]}")
+        entries.append(entry)
+        saved_paths.append(entry["path"])
+
+    for upload_id in upload_ids or []:
+        meta = await asyncio.to_thread(get_upload, upload_id)
+        if meta.get("status") != "complete":
+            raise UploadError(f"Upload {upload_id} is not complete")
+        entries.append({
+            "sha256": meta["sha256"],
+            "path": meta["path"],
+            "size": meta["size"],
+            "deduplicated": meta["deduplicated"],
+            "original_name": meta["filename"],
+            "upload_id": upload_id,
+        })
+        saved_paths.append(meta["path"])
+
+    await asyncio.to_thread(write_manifest, request_id, entries)
+    return saved_paths
+
+
+# ---------------------------------------------------------------------------
+# Resumable chunked uploads: init -> PUT parts (any order, retryable) -> complete
+# Parts are written straight to their offset in one data file, so completing
+# an upload is a single hashing pass plus a rename (no reassembly copy).
+# ---------------------------------------------------------------------------
+
+def _upload_dir(upload_id: str) -> str:
+    if not upload_id or not all(c in "0123456789abcdef" for c in upload_id):
+        raise UploadNotFound(upload_id)
+    return os.path.join(UPLOAD_DIR, upload_id)
+
+
+def _write_meta(upload_id: str, meta: Dict[str, Any]):
+    meta_path = os.path.join(_upload_dir(upload_id), "meta.json")
+    temp_path = f"{meta_path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(temp_path, meta_path)
+
+
+def _purge_stale_uploads():
+    cutoff = time.time() - UPLOAD_TTL_SECONDS
+    for name in os.listdir(UPLOAD_DIR):
+        path = os.path.join(UPLOAD_DIR, name)
+        if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _received_parts(upload_id: str) -> List[int]:
+    parts_dir = os.path.join(_upload_dir(upload_id), "parts")
+    if not os.path.isdir(parts_dir):
+        return []
+    return sorted(int(name) for name in os.listdir(parts_dir) if name.isdigit())
+
+
+def init_upload(filename: str, size: int, sha256: Optional[str] = None) -> Dict[str, Any]:
+    """Starts a chunked upload. Rejects oversized files before any bytes are sent."""
+    if size <= 0:
+        raise UploadError("size must be positive")
+    if size > MAX_UPLOAD_FILE_BYTES:
+        raise UploadTooLarge(f"{filename} is {size} bytes (limit {MAX_UPLOAD_FILE_BYTES})")
+
+    _purge_stale_uploads()
+    upload_id = uuid.uuid4().hex
+    os.makedirs(os.path.join(_upload_dir(upload_id), "parts"))
+    # Pre-size the data file so parts can land at their offsets in any order
+    with open(os.path.join(_upload_dir(upload_id), "data"), "wb") as f:
+        f.truncate(size)
+
+    meta = {
+        "upload_id": upload_id,
+        "filename": filename,
+        "size": size,
+        "expected_sha256": sha256,
+        "part_size": UPLOAD_PART_SIZE,
+        "total_parts": -(-size // UPLOAD_PART_SIZE),
+        "status": "uploading",
+        "created_at": time.time(),
+    }
+    _write_meta(upload_id, meta)
+    return meta
+
+
+def get_upload(upload_id: str) -> Dict[str, Any]:
+    """Upload metadata plus which parts have arrived (clients resume from this)."""
+    meta_path = os.path.join(_upload_dir(upload_id), "meta.json")
+    if not os.path.exists(meta_path):
+        raise UploadNotFound(upload_id)
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta["status"] != "complete":
+        meta["received_parts"] = _received_parts(upload_id)
+    return meta
+
+
+async def write_upload_part(upload_id: str, part_number: int, chunks: AsyncIterator[bytes]) -> Dict[str, Any]:
+    """
+    Writes part `part_number` (1-based) from a byte stream at its offset.
+    Re-sending a part overwrites it, so a failed chunk can simply be retried.
+    File I/O and hashing run in a worker thread, never on the event loop.
+    """
+    meta = await asyncio.to_thread(get_upload, upload_id)
+    if meta["status"] == "complete":
+        raise UploadError(f"Upload {upload_id} is already complete")
+    if not 1 <= part_number <= meta["total_parts"]:
+        raise UploadError(f"part_number must be 1..{meta['total_parts']}")
+
+    offset = (part_number - 1) * meta["part_size"]
+    expected = min(meta["part_size"], meta["size"] - offset)
+    marker = os.path.join(_upload_dir(upload_id), "parts", str(part_number))
+    if os.path.exists(marker):
+        await asyncio.to_thread(os.remove, marker)
+
+    h = hashlib.sha256()
+    written = 0
+    try:
+        out = await asyncio.to_thread(open, os.path.join(_upload_dir(upload_id), "data"), "r+b")
+    except FileNotFoundError:
+        # Claimed by a complete call (see complete_upload)
+        raise UploadBusy(f"Upload {upload_id} is being completed")
+    try:
+        await asyncio.to_thread(out.seek, offset)
+        # Request bodies arrive in small pieces: hand them to the thread in UPLOAD_CHUNK_SIZE batches
+        pending = bytearray()
+        async for chunk in chunks:
+            written += len(chunk)
+            if written > expected:
+                raise UploadTooLarge(f"Part {part_number} exceeds {expected} bytes")
+            pending += chunk
+            if len(pending) >= UPLOAD_CHUNK_SIZE:
+                await asyncio.to_thread(_write_chunk, out, h, bytes(pending))
+                pending.clear()
+        if pending:
+            await asyncio.to_thread(_write_chunk, out, h, bytes(pending))
+    finally:
+        await asyncio.to_thread(out.close)
+
+    if written != expected:
+        raise UploadError(f"Part {part_number} is {written} bytes, expected {expected}")
+
+    await asyncio.to_thread(_touch, marker)
+    return {"upload_id": upload_id, "part_number": part_number, "size": written, "sha256": h.hexdigest()}
+
+
+# upload_id -> lock serialising complete calls within this process
+_complete_locks: Dict[str, threading.Lock] = {}
+_complete_locks_guard = threading.Lock()
+
+
+def _complete_lock(upload_id: str) -> threading.Lock:
+    with _complete_locks_guard:
+        return _complete_locks.setdefault(upload_id, threading.Lock())
+
+
+def _wait_for_completion(upload_id: str) -> Dict[str, Any]:
+    """Meta of an upload another process is completing, once it's done."""
+    data_path = os.path.join(_upload_dir(upload_id), "data")
+    deadline = time.monotonic() + UPLOAD_COMPLETE_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        meta = get_upload(upload_id)
+        if meta["status"] == "complete":
+            return meta
+        if os.path.exists(data_path):
+            # The other attempt failed (e.g. checksum) and put the data back
+            break
+        time.sleep(0.2)
+    raise UploadBusy(f"Upload {upload_id} is being completed by another request")
+
+
+def complete_upload(upload_id: str) -> Dict[str, Any]:
+    """
+    Verifies all parts arrived, hashes the data and moves it into the blob store.
+    Safe to call repeatedly or concurrently: every caller gets the completed meta.
+    """
+    lock = _complete_lock(upload_id)
+    with lock:
+        meta = get_upload(upload_id)
+        if meta["status"] == "complete":
+            return meta
+
+        missing = sorted(set(range(1, meta["total_parts"] + 1)) - set(meta["received_parts"]))
+        if missing:
+            raise UploadError(f"Missing parts: {missing[:20]}")
+
+        # Claim the data with an atomic rename, so only one process hashes and commits it
+        data_path = os.path.join(_upload_dir(upload_id), "data")
+        claimed_path = f"{data_path}.completing"
+        try:
+            os.rename(data_path, claimed_path)
+        except FileNotFoundError:
+            return _wait_for_completion(upload_id)
+
+        try:
+            digest = hash_file(claimed_path)
+            if meta.get("expected_sha256") and meta["expected_sha256"].lower() != digest:
+                raise UploadError(f"sha256 mismatch: expected {meta['expected_sha256']}, got {digest}")
+            entry = _commit_blob(claimed_path, digest, meta["filename"], meta["size"])
+        except BaseException:
+            # Parts can be re-sent and completed again
+            if os.path.exists(claimed_path):
+                os.rename(claimed_path, data_path)
+            raise
+        shutil.rmtree(os.path.join(_upload_dir(upload_id), "parts"), ignore_errors=True)
+
+        meta.pop("received_parts", None)
+        meta.update(status="complete", sha256=digest, path=entry["path"], deduplicated=entry["deduplicated"])
+        _write_meta(upload_id, meta)
+    with _complete_locks_guard:
+        if _complete_locks.get(upload_id) is lock:
+            del _complete_locks[upload_id]
+    return meta
 
 # NOTE: OUTPUT_DIR needs to be determined at runtime by renderer
 def get_output_dir():
@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, Any, Optional, List
+
+from . import storage
+
+# Planned storyboards keyed by what went into planning: the media content (in order),
+# the planning parameters and the prompt/model version. A repeat /analyze of the same
+# inputs (retry after a failed render, replayed traffic) skips Gemini entirely.
+#
+# Scene file paths are stored relative to the request's media list ("@media:<i>"),
+# so a hit resolves to the current request's paths even if the files live elsewhere.
+
+STORYBOARD_CACHE_DB = os.getenv("STORYBOARD_CACHE_DB", os.path.join(storage.STATE_DIR, "storyboards.db"))
+STORYBOARD_CACHE_TTL = float(os.getenv("STORYBOARD_CACHE_TTL", str(7 * 24 * 3600)))
+STORYBOARD_CACHE_MAX_ENTRIES = int(os.getenv("STORYBOARD_CACHE_MAX_ENTRIES", "500"))
+
+_MEDIA_REF = "@media:"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS storyboards (
+    key TEXT PRIMARY KEY,
+    storyboard TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_storyboards_used ON storyboards (last_used_at);
+"""
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    global _schema_ready
+    conn = sqlite3.connect(STORYBOARD_CACHE_DB, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    if not _schema_ready:
+        with _schema_lock:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            _schema_ready = True
+    return conn
+
+
+def cache_key(media_paths: List[str], **params) -> str:
+    """Key from the media content hashes (order matters) and the planning parameters."""
+    h = hashlib.sha256()
+    for path in media_paths:
+        h.update(storage.content_hash(path).encode("utf-8"))
+        h.update(b"\0")
+    h.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _to_refs(storyboard: Dict[str, Any], media_paths: List[str]) -> Dict[str, Any]:
+    index = {p: i for i, p in enumerate(media_paths)}
+    stored = json.loads(json.dumps(storyboard))
+    for scene in stored.get("scenes", []):
+        fp = scene.get("file_path")
+        if fp in index:
+            scene["file_path"] = f"{_MEDIA_REF}{index[fp]}"
+    return stored
+
+
+def _from_refs(stored: Dict[str, Any], media_paths: List[str]) -> Optional[Dict[str, Any]]:
+    """Resolves media refs; None if the entry points at files that no longer exist."""
+    for scene in stored.get("scenes", []):
+        fp = scene.get("file_path") or ""
+        if fp.startswith(_MEDIA_REF):
+            i = int(fp[len(_MEDIA_REF):])
+            if i >= len(media_paths):
+                return None
+            scene["file_path"] = media_paths[i]
+        elif os.path.isabs(fp) and not os.path.exists(fp):
+            # e.g. generated B-roll that has since been cleaned up
+            return None
+    return stored
+
+
+def get(key: str, media_paths: List[str]) -> Optional[Dict[str, Any]]:
+    """Cached storyboard for `key` with paths resolved against `media_paths`, or None."""
+    now = time.time()
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT storyboard FROM storyboards WHERE key = ? AND created_at > ?",
+            (key, now - STORYBOARD_CACHE_TTL),
+        ).fetchone()
+        if not row:
+            return None
+        storyboard = _from_refs(json.loads(row["storyboard"]), media_paths)
+        if storyboard is None:
+            conn.execute("DELETE FROM storyboards WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE storyboards SET last_used_at = ? WHERE key = ?", (now, key))
+    finally:
+        conn.close()
+    return storyboard
+
+
+def put(key: str, storyboard: Dict[str, Any], media_paths: List[str]):
+    """Stores a storyboard, then drops expired entries and the least recently used overflow."""
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO storyboards (key, storyboard, created_at, last_used_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(_to_refs(storyboard, media_paths)), now, now),
+        )
+        conn.execute("DELETE FROM storyboards WHERE created_at <= ?", (now - STORYBOARD_CACHE_TTL,))
+        conn.execute(
+            "DELETE FROM storyboards WHERE key NOT IN "
+            "(SELECT key FROM storyboards ORDER BY last_used_at DESC LIMIT ?)",
+            (STORYBOARD_CACHE_MAX_ENTRIES,),
+        )
+    finally:
+        conn.close()
@@ -0,0 +1,249 @@
+import os
+import copy
+import json
+from typing import Dict, Any, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from . import geometry, media_probe
+from ..models.storyboard import Storyboard
+
+# Compact storyboard view + JSON-Patch-style edits (RFC 6902 subset) for chat editing.
+# The model sees one line per scene (no file paths, no internal keys) and answers
+# with operations only; they are validated and applied here, all or nothing, so a
+# request can't silently rewrite scenes it didn't mention.
+#
+# Paths: /scenes/<i>, /scenes/-, /scenes/<i>/<field>, /<storyboard field>
+# Ops: replace, add, remove, move, copy
+
+INPUT_TYPES = ("user_clip", "user_image", "ai_broll")
+OPS = ("replace", "add", "remove", "move", "copy")
+
+_SOURCE_REF = "m"
+
+
+class PatchError(ValueError):
+    """An edit operation that is malformed or would produce an invalid storyboard."""
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+# Editable scene fields -> validator. "source" is a media ref (m0, m1, ...) standing in for file_path.
+SCENE_FIELDS = {
+    "input_type": lambda v: v in INPUT_TYPES,
+    "source": lambda v: isinstance(v, str),
+    "start": lambda v: _is_number(v) and v >= 0,
+    "end": lambda v: _is_number(v) and v >= 0,
+    "duration": lambda v: _is_number(v) and v > 0,
+    "role": lambda v: isinstance(v, str),
+    "caption": lambda v: isinstance(v, str),
+    "effect": lambda v: isinstance(v, str),
+    "b_roll_keyword": lambda v: isinstance(v, str),
+    "prompt": lambda v: isinstance(v, str),
+    "fit": lambda v: v in (geometry.FIT_COVER, geometry.FIT_CONTAIN),
+}
+STORYBOARD_FIELDS = {
+    "use_music": lambda v: isinstance(v, bool),
+    "use_voiceover": lambda v: isinstance(v, bool),
+    "aspect_ratio": lambda v: v in geometry.ASPECT_RATIOS,
+}
+# Changing these invalidates a generated B-roll clip
+_BROLL_INPUTS = ("input_type", "b_roll_keyword", "prompt", "duration")
+
+
+def _sources(storyboard: Dict[str, Any]) -> List[str]:
+    """Distinct user media paths in scene order (ref m<i> is index i)."""
+    paths: List[str] = []
+    for scene in storyboard.get("scenes", []):
+        path = scene.get("file_path")
+        if scene.get("input_type") in ("user_clip", "user_image") and path and path not in paths:
+            paths.append(path)
+    return paths
+
+
+def _compact_scene(scene: Dict[str, Any], sources: List[str]) -> Dict[str, Any]:
+    view = {k: scene[k] for k in SCENE_FIELDS if k in scene and scene[k] not in (None, "")}
+    if scene.get("input_type") in ("user_clip", "user_image") and scene.get("file_path") in sources:
+        view["source"] = f"{_SOURCE_REF}{sources.index(scene['file_path'])}"
+    return view
+
+
+def compact(storyboard: Dict[str, Any]) -> str:
+    """Prompt-sized view: settings, media refs and one JSON line per scene."""
+    sources = _sources(storyboard)
+    settings = {k: storyboard[k] for k in STORYBOARD_FIELDS if k in storyboard}
+    lines = [f"SETTINGS {json.dumps(settings, separators=(',', ':'))}"]
+    # Original filenames from planning (blob names are hashes); refs map back to paths
+    names = storyboard.get("media_names") or {}
+    for i, path in enumerate(sources):
+        name = names.get(path) or os.path.basename(path)
+        lines.append(f"MEDIA {_SOURCE_REF}{i} {json.dumps(name, ensure_ascii=False)}")
+    for i, scene in enumerate(storyboard.get("scenes", [])):
+        lines.append(f"{i} {json.dumps(_compact_scene(scene, sources), separators=(',', ':'), ensure_ascii=False)}")
+    return "\n".join(lines)
+
+
+def _parse_path(path: Any) -> List[str]:
+    if not isinstance(path, str) or not path.startswith("/"):
+        raise PatchError(f"Invalid path {path!r}")
+    return [part.replace("~1", "/").replace("~0", "~") for part in path[1:].split("/")]
+
+
+def _scene_index(token: str, length: int, allow_end: bool) -> int:
+    if allow_end and token == "-":
+        return length
+    if not token.isdigit():
+        raise PatchError(f"Invalid scene index {token!r}")
+    index = int(token)
+    if index > length or (index == length and not allow_end):
+        raise PatchError(f"Scene index {index} out of range")
+    return index
+
+
+def _check_field(fields: Dict[str, Any], name: str, value: Any):
+    if name not in fields:
+        raise PatchError(f"Unknown field {name!r}")
+    if not fields[name](value):
+        raise PatchError(f"Invalid value for {name}: {value!r}")
+
+
+def _scene_from_view(view: Any, sources: List[str]) -> Dict[str, Any]:
+    if not isinstance(view, dict):
+        raise PatchError("A scene must be an object")
+    scene: Dict[str, Any] = {}
+    for name, value in view.items():
+        _check_field(SCENE_FIELDS, name, value)
+        _set_scene_field(scene, name, value, sources)
+    return scene
+
+
+def _set_scene_field(scene: Dict[str, Any], name: str, value: Any, sources: List[str]):
+    if name == "source":
+        if not value.startswith(_SOURCE_REF) or not value[len(_SOURCE_REF):].isdigit():
+            raise PatchError(f"Unknown media {value!r}")
+        index = int(value[len(_SOURCE_REF):])
+        if index >= len(sources):
+            raise PatchError(f"Unknown media {value!r}")
+        scene["file_path"] = sources[index]
+        return
+    scene[name] = value
+    if name == "duration" and scene.get("input_type") == "user_clip":
+        # Clip length comes from the cut points
+        scene["end"] = float(scene.get("start", 0.0)) + value
+    if name in _BROLL_INPUTS:
+        # The generated clip no longer matches the scene
+        scene.pop("asset_key", None)
+        if scene.get("input_type") == "ai_broll":
+            scene.pop("file_path", None)
+
+
+def _is_image(path: str) -> bool:
+    return path.lower().endswith(media_probe.IMAGE_EXTENSIONS)
+
+
+def _validate_scene(index: int, scene: Dict[str, Any], storyboard: Dict[str, Any], edited: bool):
+    input_type = scene.get("input_type")
+    if input_type not in INPUT_TYPES:
+        raise PatchError(f"Scene {index} needs an input_type")
+    if input_type in ("user_clip", "user_image") and not scene.get("file_path"):
+        raise PatchError(f"Scene {index} needs a source")
+    if edited and input_type in ("user_clip", "user_image") and _is_image(scene["file_path"]) != (input_type == "user_image"):
+        # The renderer would try to cut an image or show a video as a still (untouched
+        # scenes are left as planned)
+        path = scene["file_path"]
+        name = (storyboard.get("media_names") or {}).get(path) or os.path.basename(path)
+        kind = "an image" if _is_image(path) else "a video"
+        raise PatchError(f"Scene {index} is a {input_type} but {name} is {kind}")
+    start, end = float(scene.get("start", 0.0)), float(scene.get("end", 0.0))
+    if end and end <= start:
+        raise PatchError(f"Scene {index} ends before it starts")
+
+
+def apply(storyboard: Dict[str, Any], operations: Any) -> Tuple[Dict[str, Any], List[int]]:
+    """
+    Applies `operations` to a copy of `storyboard`, all or nothing.
+    Returns (new storyboard, validated and normalized; indices of new or modified scenes in it).
+    Raises PatchError on the first invalid operation.
+    """
+    if not isinstance(operations, list):
+        raise PatchError("operations must be a list")
+    sources = _sources(storyboard)
+    result = copy.deepcopy(storyboard)
+    original = storyboard.get("scenes", [])
+    scenes = result.setdefault("scenes", [])
+    # Where each scene came from (None = added), moved in step with the scenes
+    origins: List[Optional[int]] = list(range(len(scenes)))
+
+    for n, op in enumerate(operations):
+        if not isinstance(op, dict) or op.get("op") not in OPS:
+            raise PatchError(f"Operation {n}: op must be one of {', '.join(OPS)}")
+        kind = op["op"]
+        parts = _parse_path(op.get("path"))
+
+        if parts[0] != "scenes":
+            # Storyboard setting
+            if len(parts) != 1 or kind not in ("replace", "add"):
+                raise PatchError(f"Operation {n}: only replace/add apply to {op.get('path')}")
+            _check_field(STORYBOARD_FIELDS, parts[0], op.get("value"))
+            result[parts[0]] = op["value"]
+            continue
+
+        if len(parts) == 3:
+            # Scene field
+            index = _scene_index(parts[1], len(scenes), allow_end=False)
+            name, scene = parts[2], scenes[index]
+            if kind == "remove":
+                if name not in SCENE_FIELDS or name in ("input_type", "source"):
+                    raise PatchError(f"Operation {n}: {name} can't be removed")
+                scene.pop(name, None)
+            elif kind in ("replace", "add"):
+                _check_field(SCENE_FIELDS, name, op.get("value"))
+                _set_scene_field(scene, name, op["value"], sources)
+            else:
+                raise PatchError(f"Operation {n}: {kind} applies to whole scenes")
+            continue
+
+        if len(parts) != 2:
+            raise PatchError(f"Operation {n}: invalid path {op.get('path')}")
+
+        # Whole scenes
+        if kind == "remove":
+            index = _scene_index(parts[1], len(scenes), allow_end=False)
+            del scenes[index], origins[index]
+        elif kind == "replace":
+            index = _scene_index(parts[1], len(scenes), allow_end=False)
+            scenes[index] = _scene_from_view(op.get("value"), sources)
+            origins[index] = None
+        elif kind == "add":
+            index = _scene_index(parts[1], len(scenes), allow_end=True)
+            scenes.insert(index, _scene_from_view(op.get("value"), sources))
+            origins.insert(index, None)
+        else:  # move / copy
+            src_parts = _parse_path(op.get("from"))
+            if len(src_parts) != 2 or src_parts[0] != "scenes":
+                raise PatchError(f"Operation {n}: {kind} needs from=/scenes/<i>")
+            src = _scene_index(src_parts[1], len(scenes), allow_end=False)
+            if kind == "move":
+                scene, origin = scenes.pop(src), origins.pop(src)
+            else:
+                scene, origin = copy.deepcopy(scenes[src]), None
+            index = _scene_index(parts[1], len(scenes), allow_end=True)
+            scenes.insert(index, scene)
+            origins.insert(index, origin)
+
+    if not scenes:
+        raise PatchError("The storyboard needs at least one scene")
+    changed = [
+        i for i, (origin, scene) in enumerate(zip(origins, scenes))
+        if origin is None or scene != original[origin]
+    ]
+    for i, scene in enumerate(scenes):
+        _validate_scene(i, scene, result, edited=i in changed)
+
+    try:
+        validated = Storyboard.model_validate(result)
+    except ValidationError as e:
+        raise PatchError(f"Invalid storyboard after edit: {e.errors()[0].get('msg')}")
+    return validated.model_dump(mode="json"), changed
@@ -0,0 +1,63 @@
+import os
+from typing import List
+
+from . import storage, generated_assets, broll_service, media_probe
+from ..models.storyboard import Storyboard
+
+# Storyboard checks that need the services. The model validates shape and timing;
+# here scene sources are confined to media the server manages, and cuts are
+# clamped to the probed source lengths. Every storyboard a client sends (/render,
+# /chat/edit) or that is re-rendered (/finalize) goes through check_sources, so a
+# client can't have the server probe, proxy or render an arbitrary file.
+
+
+class InvalidSource(ValueError):
+    """A scene's file_path is outside the managed media (maps to HTTP 422)."""
+
+
+def _source_roots() -> List[str]:
+    return [
+        os.path.realpath(root)
+        for root in (
+            storage.BLOB_DIR,
+            generated_assets.GENERATED_DIR,
+            broll_service.BROLL_LIBRARY_DIR,
+            broll_service.BROLL_CROP_DIR,
+        )
+    ]
+
+
+def is_allowed_source(path: str) -> bool:
+    """True if `path` resolves (symlinks included) inside the blob store, generated assets or the stock library."""
+    real = os.path.realpath(path)
+    return any(os.path.commonpath([real, root]) == root for root in _source_roots())
+
+
+def check_sources(storyboard: Storyboard) -> Storyboard:
+    """
+    Raises InvalidSource for a user_clip / user_image scene whose file isn't managed
+    media. (An ai_broll scene's file_path is only ever rendered if it's a library clip.)
+    """
+    for i, scene in enumerate(storyboard.scenes):
+        if scene.input_type in ("user_clip", "user_image") and scene.file_path and not is_allowed_source(scene.file_path):
+            raise InvalidSource(f"Scene {i}: file_path must be an uploaded file or a library clip")
+    return storyboard
+
+
+def clamped_to_sources(storyboard: Storyboard) -> Storyboard:
+    """Clip cuts clamped to their source's length (probes each source once, cached)."""
+    scenes = []
+    for scene in storyboard.scenes:
+        length = media_probe.duration(scene.file_path) if scene.input_type == "user_clip" else None
+        if length and scene.end > length:
+            end = length
+            # Cuts starting past the end keep their length, taken from the tail
+            start = scene.start if scene.start < length else max(0.0, length - scene.duration)
+            scene = scene.model_copy(update={"start": start, "end": end, "duration": end - start})
+        scenes.append(scene)
+    return storyboard.model_copy(update={"scenes": tuple(scenes)})
+
+
+def prepare(storyboard: Storyboard) -> Storyboard:
+    """check_sources, then clamped_to_sources: what a storyboard goes through before it's queued."""
+    return clamped_to_sources(check_sources(storyboard))
@@ -0,0 +1,49 @@
+import os
+import uuid
+import asyncio
+import hashlib
+import subprocess
+from typing import Optional
+
+# Local stand-in for the generative B-roll providers, for development only: used
+# when the server runs with BROLL_PROVIDER=stub (a scene can't select it).
+# Produces a real, renderable clip after an artificial delay, so concurrency,
+# dedup and render overlap can be exercised without API keys.
+
+STUB_DELAY_SECONDS = float(os.getenv("BROLL_STUB_DELAY", "5"))
+
+
+def _encode_placeholder(prompt: str, duration_seconds: int, output_path: str):
+    import imageio_ffmpeg
+    ffmpeg_exe = imageio_ffmpeg.get_ffmpeg_exe()
+
+    # Colour derived from the prompt so different prompts are easy to tell apart
+    color = "0x" + hashlib.md5(prompt.encode("utf-8")).hexdigest()[:6]
+    cmd = [
+        ffmpeg_exe, "-y",
+        "-f", "lavfi", "-i", f"color=c={color}:s=1080x1920:d={duration_seconds}:r=24",
+        "-f", "lavfi", "-i", "anullsrc=r=44100:cl=stereo",
+        "-shortest",
+        "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p",
+        "-c:a", "aac",
+        output_path,
+    ]
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def generate_broll_stub(
+    prompt: str,
+    duration_seconds: int = 3,
+    output_dir: str = "./media/output",
+) -> Optional[str]:
+    """
+    Waits STUB_DELAY_SECONDS, then writes a solid-colour clip of the requested length.
+
+    Returns:
+        Local file path to the generated clip.
+    """
+    await asyncio.sleep(STUB_DELAY_SECONDS)
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, f"stub_{uuid.uuid4().hex}.mp4")
+    await asyncio.to_thread(_encode_placeholder, prompt, max(1, duration_seconds), output_path)
+    return output_path
@@ -1,15 +1,71 @@
+import os
+import json
+import shutil
+import tempfile
+import functools
 import subprocess
+from typing import List, Optional, Dict, Any, Callable, Tuple
 
-def run_ffmpeg_command(command: list):
+
+@functools.lru_cache(maxsize=None)
+def ffmpeg_exe() -> str:
+    """ffmpeg on PATH, else the binary bundled with imageio-ffmpeg (no system install needed)."""
+    found = shutil.which("ffmpeg")
+    if found:
+        return found
+    import imageio_ffmpeg
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+@functools.lru_cache(maxsize=None)
+def ffprobe_exe() -> Optional[str]:
+    """
+    ffprobe on PATH, else next to the resolved ffmpeg, else None. imageio-ffmpeg
+    ships no ffprobe: without one, probes return None and callers take the paths
+    that don't need them (no stream copy, durations read by MoviePy).
+    """
+    found = shutil.which("ffprobe")
+    if found:
+        return found
+    sibling = os.path.join(os.path.dirname(ffmpeg_exe()), "ffprobe" + (".exe" if os.name == "nt" else ""))
+    if os.path.isfile(sibling):
+        return sibling
+    print("[FFmpeg] ffprobe not found; media probing is disabled")
+    return None
+
+def run_ffmpeg_command(
+    command: list,
+    progress_callback: Optional[Callable[[float], None]] = None,
+    total_duration: Optional[float] = None,
+):
     """
     Wrapper to run ffmpeg commands safely.
+    With `progress_callback` + `total_duration`, reports output progress (0..1)
+    parsed from ffmpeg's -progress stream.
     """
-    try:
-        subprocess.run(command, check=True, capture_output=True)
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"FFmpeg error: {e.stderr}")
-        return False
+    if not progress_callback or not total_duration:
+        try:
+            subprocess.run(command, check=True, capture_output=True)
+            return True
+        except subprocess.CalledProcessError as e:
+            print(f"FFmpeg error: {e.stderr}")
+            return False
+
+    command = [command[0], "-progress", "pipe:1", "-nostats", *command[1:]]
+    # stderr goes to a file so a chatty ffmpeg can't fill the pipe and stall
+    with tempfile.TemporaryFile() as err:
+        proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=err, text=True)
+        for line in proc.stdout:
+            key, _, value = line.strip().partition("=")
+            if key in ("out_time_us", "out_time_ms") and value.isdigit():
+                progress_callback(min(1.0, int(value) / 1_000_000 / total_duration))
+        proc.wait()
+        if proc.returncode != 0:
+            err.seek(0)
+            print(f"FFmpeg error: {err.read()}")
+            return False
+    progress_callback(1.0)
+    return True
 
 def normalize_audio(input_path: str, output_path: str):
     """
@@ -17,7 +73,7 @@ def normalize_audio(input_path: str, output_path: str):
     Target: I=-16, LRA=11, TP=-1.5
     """
     cmd = [
-        "ffmpeg", "-y", "-i", input_path,
+        ffmpeg_exe(), "-y", "-i", input_path,
         "-af", "loudnorm=I=-16:LRA=11:TP=-1.5",
         "-c:v", "copy",  # Copy video stream without re-encoding
         "-c:a", "aac", "-b:a", "192k",
@@ -40,10 +96,208 @@ def trim_start_silence(input_path: str, output_path: str):
     # We will stick to Audio Normalization for now as the 'safer' bet for the pipeline,
     # and trimming start silence only on the audio stream (which is still good).
     cmd = [
-        "ffmpeg", "-y", "-i", input_path,
+        ffmpeg_exe(), "-y", "-i", input_path,
         "-af", "silenceremove=start_periods=1:start_duration=0.3:start_threshold=-50dB",
         "-c:v", "copy",
         "-c:a", "aac",
         output_path
     ]
     return run_ffmpeg_command(cmd)
+
+
+def _parse_rate(rate: str) -> float:
+    """Parses an ffprobe rational like '30000/1001' into a float."""
+    try:
+        num, _, den = rate.partition("/")
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def probe_streams(path: str) -> Optional[Dict[str, Any]]:
+    """
+    Reads container/stream info with ffprobe (no decoding).
+    Returns video/audio codecs, video profile/level/B-frame reorder depth/field
+    order, size, fps, pix_fmt, rotation and audio presence,
+    or None if the file can't be probed (or there is no ffprobe).
+    """
+    if not ffprobe_exe():
+        return None
+    cmd = [
+        ffprobe_exe(), "-v", "error",
+        "-show_entries",
+        "format=duration:stream=codec_type,codec_name,profile,level,has_b_frames,field_order,width,height,r_frame_rate,pix_fmt,duration"
+        ":stream_tags=rotate:stream_side_data=rotation",
+        "-of", "json",
+        path,
+    ]
+    try:
+        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+        data = json.loads(result.stdout or "{}")
+    except (subprocess.CalledProcessError, OSError, ValueError) as e:
+        print(f"FFprobe error for {path}: {e}")
+        return None
+
+    streams = data.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+    if not video:
+        return None
+
+    rotation = video.get("tags", {}).get("rotate", 0)
+    for side_data in video.get("side_data_list", []):
+        if "rotation" in side_data:
+            rotation = side_data["rotation"]
+
+    duration = data.get("format", {}).get("duration") or video.get("duration") or 0.0
+    return {
+        "duration": float(duration),
+        "video_codec": video.get("codec_name"),
+        "audio_codec": audio.get("codec_name") if audio else None,
+        "profile": video.get("profile"),
+        "level": video.get("level"),
+        "has_b_frames": int(video.get("has_b_frames", 0)),
+        "field_order": video.get("field_order"),
+        "width": int(video.get("width", 0)),
+        "height": int(video.get("height", 0)),
+        "fps": _parse_rate(video.get("r_frame_rate", "0/1")),
+        "pix_fmt": video.get("pix_fmt"),
+        "rotation": int(float(rotation)) % 360,
+        "has_audio": audio is not None,
+    }
+
+
+def list_keyframes(path: str) -> List[float]:
+    """
+    Timestamps of every video keyframe. Reads packet headers only (no decoding),
+    so it costs one pass of file I/O. Empty without ffprobe.
+    """
+    if not ffprobe_exe():
+        return []
+    cmd = [
+        ffprobe_exe(), "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags",
+        "-of", "csv=p=0",
+        path,
+    ]
+    try:
+        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"FFprobe error for {path}: {e}")
+        return []
+
+    keyframes = []
+    for line in result.stdout.splitlines():
+        pts, _, flags = line.partition(",")
+        if "K" not in flags:
+            continue
+        try:
+            keyframes.append(float(pts))
+        except ValueError:
+            continue
+    return sorted(keyframes)
+
+
+def stream_copy_cut(input_path: str, start: float, duration: float, output_path: str):
+    """
+    Cuts [start, start+duration] without re-encoding video.
+    `start` should sit on a keyframe, otherwise the cut snaps to the previous one.
+    Audio is re-encoded to a fixed AAC layout so segments can be concatenated.
+    """
+    cmd = [
+        ffmpeg_exe(), "-y",
+        "-ss", f"{start:.3f}",
+        "-i", input_path,
+        "-t", f"{duration:.3f}",
+        "-map", "0:v:0", "-map", "0:a:0",
+        "-c:v", "copy",
+        "-c:a", "aac", "-ar", "44100", "-ac", "2",
+        "-avoid_negative_ts", "make_zero",
+        output_path
+    ]
+    return run_ffmpeg_command(cmd)
+
+
+def encode_still(image_path: str, duration: float, fps: float, output_path: str,
+                 codec: str = "libx264", preset: str = "veryfast", threads: int = 4,
+                 vf: Optional[str] = None, overlay: Optional[Tuple[str, int, int]] = None,
+                 encoder_params: Optional[List[str]] = None):
+    """
+    Encodes one still image as a `duration`-second clip with a silent stereo AAC
+    track (same layout as the other segments). The image is decoded once.
+    - vf: filter applied to the still (e.g. a zoompan move)
+    - overlay: (png, x, y) composited on top after `vf`, so captions don't move with it
+    - encoder_params: extra video encoder flags (e.g. -crf, or -profile:v/-level:v
+      to match stream-copied segments)
+    """
+    cmd = [
+        ffmpeg_exe(), "-y",
+        "-loop", "1", "-framerate", f"{fps}", "-i", image_path,
+        "-f", "lavfi", "-i", "anullsrc=r=44100:cl=stereo",
+    ]
+    graph = f"[0:v]{vf or 'null'}"
+    if overlay:
+        overlay_path, x, y = overlay
+        cmd += ["-loop", "1", "-framerate", f"{fps}", "-i", overlay_path]
+        graph += f"[base];[base][2:v]overlay={x}:{y}"
+    graph += ",format=yuv420p[v]"
+    cmd += [
+        "-t", f"{duration:.3f}",
+        "-filter_complex", graph,
+        "-map", "[v]", "-map", "1:a:0",
+        "-c:v", codec, "-preset", preset,
+        "-c:a", "aac", "-ar", "44100", "-ac", "2",
+        "-threads", str(threads),
+    ]
+    cmd += encoder_params or []
+    if codec == "libx264":
+        cmd += ["-tune", "stillimage"]
+    cmd.append(output_path)
+    return run_ffmpeg_command(cmd)
+
+
+def concat_segments(segment_paths: List[str], output_path: str):
+    """
+    Joins segments with the concat demuxer (no re-encode).
+    All segments must share codec, resolution and audio layout.
+    """
+    list_path = f"{output_path}.txt"
+    with open(list_path, "w", encoding="utf-8") as f:
+        for seg in segment_paths:
+            safe = os.path.abspath(seg).replace("'", "'\\''")
+            f.write(f"file '{safe}'\n")
+
+    cmd = [
+        ffmpeg_exe(), "-y",
+        "-f", "concat", "-safe", "0",
+        "-i", list_path,
+        "-c", "copy",
+        "-movflags", "+faststart",
+        output_path
+    ]
+    try:
+        return run_ffmpeg_command(cmd)
+    finally:
+        if os.path.exists(list_path):
+            os.remove(list_path)
+
+
+def mix_background_music(input_path: str, music_path: str, output_path: str, volume: float = 0.15):
+    """
+    Loops `music_path` under the existing audio track at `volume`.
+    Video is stream-copied.
+    """
+    cmd = [
+        ffmpeg_exe(), "-y",
+        "-i", input_path,
+        "-stream_loop", "-1", "-i", music_path,
+        "-filter_complex",
+        f"[1:a]volume={volume}[bg];[0:a][bg]amix=inputs=2:duration=first:normalize=0[a]",
+        "-map", "0:v", "-map", "[a]",
+        "-c:v", "copy",
+        "-c:a", "aac", "-b:a", "192k",
+        "-movflags", "+faststart",
+        output_path
+    ]
+    return run_ffmpeg_command(cmd)
@@ -0,0 +1,36 @@
+"""
+Standalone render worker.
+
+    python -m app.worker --concurrency 2
+
+Run the API with JOB_WORKERS=0 so renders only happen in these processes.
+"""
+import argparse
+import signal
+import threading
+
+from .services import job_queue
+
+
+def main():
+    parser = argparse.ArgumentParser(description="A.V.E.A render worker")
+    parser.add_argument("--concurrency", type=int, default=max(1, job_queue.JOB_WORKERS),
+                        help="Renders to run at once on this node")
+    args = parser.parse_args()
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+
+    threads = [
+        threading.Thread(target=job_queue.run_worker, args=(stop_event,), name=f"render-worker-{i}")
+        for i in range(args.concurrency)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Image-scene render benchmark: the previous lazy MoviePy path vs the prepared
+frame buffer vs the looped-still segment, on a photo-heavy storyboard.
+
+    cd backend
+    python -m benchmarks.image_scenes --photos 12 --duration 3
+
+Each variant runs in a fresh process so peak RSS is comparable. Needs ffmpeg on PATH.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import multiprocessing
+
+import numpy as np
+from PIL import Image
+
+
+def _make_photos(directory: str, count: int, size=(4032, 3024)):
+    """Noisy gradients (compress like real photos), alternating landscape/portrait."""
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        w, h = size if i % 2 == 0 else size[::-1]
+        gradient = np.linspace(0, 255, w, dtype=np.float32)[None, :, None]
+        noise = rng.normal(0, 25, (h, w, 3)).astype(np.float32)
+        pixels = np.clip(gradient + noise, 0, 255).astype(np.uint8)
+        path = os.path.join(directory, f"photo_{i:02d}.jpg")
+        Image.fromarray(pixels).save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+def _legacy_clip(scene, target_w, target_h):
+    """The pre-buffer path: ImageClip(path) + resize/crop through MoviePy."""
+    from moviepy.editor import ImageClip
+    from app.services import captions
+
+    clip = ImageClip(scene.file_path).set_duration(scene.duration)
+    clip = clip.resize(height=target_h)
+    if clip.w < target_w:
+        clip = clip.resize(width=target_w)
+    if clip.w > target_w:
+        clip = clip.crop(x1=clip.w / 2 - target_w / 2, width=target_w)
+    elif clip.h > target_h:
+        clip = clip.crop(y1=clip.h / 2 - target_h / 2, height=target_h)
+    return captions.overlay_caption(clip, scene.caption, target_w, target_h)
+
+
+def _run_variant(variant: str, storyboard_data, work_dir: str, queue):
+    from app.models.storyboard import Storyboard
+    from app.services import renderer, source_pool
+
+    storyboard = Storyboard.model_validate(storyboard_data)
+    settings = renderer.output_settings(storyboard)
+    started = time.perf_counter()
+    with source_pool.SourcePool(storyboard.scenes) as sources:
+        for i, scene in enumerate(storyboard.scenes):
+            seg_path = os.path.join(work_dir, f"{variant}_{i:03d}.ts")
+            if variant == "still":
+                ok = renderer._render_still_segment(i, scene, seg_path, work_dir, 4, settings)
+            else:
+                if variant == "legacy":
+                    clip = _legacy_clip(scene, *settings.size)
+                else:
+                    clip = renderer._build_clip_from_scene(scene, sources, settings.size, settings.voiceover, work_dir)
+                renderer._write_segment(clip, seg_path, settings, work_dir, 4)
+                if variant == "legacy":
+                    clip.close()
+                else:
+                    # The pool owns what the clip reads from, as in the renderer
+                    sources.release(scene.file_path)
+                ok = True
+            if not ok:
+                raise RuntimeError(f"{variant}: scene {i} failed")
+    elapsed = time.perf_counter() - started
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    queue.put((elapsed, peak_mb))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Image scene render benchmark")
+    parser.add_argument("--photos", type=int, default=12)
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument("--variants", default="legacy,buffer,still")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_images_")
+    try:
+        photos = _make_photos(work_dir, args.photos)
+        storyboard = {
+            "scenes": [
+                {"input_type": "user_image", "file_path": p, "duration": args.duration, "caption": f"Photo {i + 1}"}
+                for i, p in enumerate(photos)
+            ]
+        }
+        total = args.photos * args.duration
+        print(f"{args.photos} photos x {args.duration:.1f}s ({total:.0f}s of video)")
+        print(f"{'variant':<8} {'seconds':>8} {'x realtime':>11} {'peak RSS MB':>12}")
+
+        ctx = multiprocessing.get_context("spawn")
+        for variant in args.variants.split(","):
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_run_variant, args=(variant, storyboard, work_dir, queue))
+            proc.start()
+            proc.join()
+            if proc.exitcode != 0:
+                print(f"{variant:<8} failed (exit {proc.exitcode})")
+                continue
+            elapsed, peak_mb = queue.get()
+            print(f"{variant:<8} {elapsed:>8.2f} {total / elapsed:>11.1f} {peak_mb:>12.0f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
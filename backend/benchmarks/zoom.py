@@ -0,0 +1,94 @@
+"""
+Zoom / Ken Burns throughput benchmark at the reel resolution, on one core.
+
+    cd backend
+    python -m benchmarks.zoom --seconds 5
+
+Measures the MoviePy-path warp (motion.apply_motion) and, if ffmpeg is on PATH,
+the zoompan filter used by the ffmpeg paths. Exits non-zero if any measured path
+runs slower than realtime, so it can gate changes to the effect code.
+"""
+import sys
+import time
+import shutil
+import argparse
+import subprocess
+
+import cv2
+import numpy as np
+
+from app.services import motion
+
+W, H, FPS = 1080, 1920, 24
+
+
+class _FrameSource:
+    """Minimal clip stand-in: a fixed frame, so only the warp is measured."""
+
+    def __init__(self, frame: np.ndarray, duration: float):
+        self.frame = frame
+        self.w, self.h = frame.shape[1], frame.shape[0]
+        self.duration = duration
+
+    def fl(self, fun, apply_to=None):
+        source = self
+
+        class _Warped:
+            def get_frame(self, t):
+                return fun(lambda _t: source.frame, t)
+        return _Warped()
+
+
+def bench_warp(effect: str, seconds: float) -> float:
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, (H, W, 3), dtype=np.uint8)
+    clip = motion.apply_motion(_FrameSource(frame, seconds), effect)
+    n = int(seconds * FPS)
+    started = time.perf_counter()
+    for i in range(n):
+        clip.get_frame(i / FPS)
+    return n / (time.perf_counter() - started)
+
+
+def bench_zoompan(effect: str, seconds: float) -> float:
+    vf = motion.zoompan_filter(effect, seconds, FPS, W, H)
+    cmd = [
+        "ffmpeg", "-v", "error", "-threads", "1", "-filter_threads", "1",
+        "-f", "lavfi", "-i", f"testsrc2=s={W}x{H}:r={FPS}:d={seconds}",
+        "-vf", vf, "-f", "null", "-",
+    ]
+    started = time.perf_counter()
+    subprocess.run(cmd, check=True)
+    return seconds * FPS / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Zoom/pan effect benchmark")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--effects", default=",".join(motion.MOTION_EFFECTS))
+    args = parser.parse_args()
+
+    cv2.setNumThreads(1)
+    has_ffmpeg = shutil.which("ffmpeg") is not None
+    slowest = float("inf")
+
+    print(f"{W}x{H} @ {FPS}fps, one core (realtime = {FPS} fps)")
+    print(f"{'effect':<14} {'warp fps':>9} {'zoompan fps':>12}")
+    for effect in args.effects.split(","):
+        warp_fps = bench_warp(effect, args.seconds)
+        slowest = min(slowest, warp_fps)
+        zoompan = "n/a"
+        if has_ffmpeg:
+            zoompan_fps = bench_zoompan(effect, args.seconds)
+            slowest = min(slowest, zoompan_fps)
+            zoompan = f"{zoompan_fps:.1f}"
+        print(f"{effect:<14} {warp_fps:>9.1f} {zoompan:>12}")
+
+    if slowest < FPS:
+        print(f"FAIL: slowest path ran at {slowest:.1f} fps, below realtime")
+        sys.exit(1)
+    print(f"OK: slowest path {slowest / FPS:.1f}x realtime")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+import os
+import tempfile
+
+# Point the served media, private state (SQLite DBs, uploads), caches and the
+# stock library at a scratch directory before any app module is imported, so a
+# test run writes nothing into the source tree
+_scratch = tempfile.mkdtemp(prefix="avea-tests-")
+os.environ.setdefault("MEDIA_DIR", os.path.join(_scratch, "media"))
+os.environ.setdefault("STATE_DIR", os.path.join(_scratch, "state"))
+os.environ.setdefault("CACHE_DIR", os.path.join(_scratch, "cache"))
+os.environ.setdefault("BROLL_LIBRARY_DIR", os.path.join(_scratch, "broll_library"))
+os.makedirs(os.environ["BROLL_LIBRARY_DIR"], exist_ok=True)
+# Provider comes from each scene (a forced provider would override the tests' choice)
+os.environ["BROLL_PROVIDER"] = ""
+# Tests drive the API in-process; renders aren't run
+os.environ["JOB_WORKERS"] = "0"
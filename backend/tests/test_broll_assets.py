@@ -0,0 +1,127 @@
+import os
+import uuid
+import asyncio
+
+import pytest
+
+from app.models.storyboard import Scene
+from app.services import flow_orchestrator, generated_assets, renderer
+
+# AI B-roll end to end with an injected stub generator: generation -> asset cache ->
+# what the renderer puts on screen for the scene.
+
+
+def _stub_generator(output_dir, fail=None):
+    """A generator that writes a tiny file per prompt (or raises `fail`) and records its calls."""
+    calls = []
+
+    async def generate(provider, prompt, duration, style):
+        calls.append(prompt)
+        if fail:
+            raise fail
+        path = os.path.join(output_dir, f"{uuid.uuid4().hex}.mp4")
+        with open(path, "wb") as f:
+            f.write(b"stub")
+        return path
+
+    generate.calls = calls
+    return generate
+
+
+def _generate(scenes, generate):
+    async def run():
+        tasks = await flow_orchestrator._start_broll(scenes, "", generate=generate)
+        await asyncio.gather(*tasks)
+        await asyncio.to_thread(flow_orchestrator._attach_ready_assets, scenes)
+
+    asyncio.run(run())
+
+
+def _broll_scene(**fields):
+    # A fresh prompt per test keeps tests independent in the shared asset DB
+    scene = {"input_type": "ai_broll", "provider": "veo", "b_roll_keyword": f"clip {uuid.uuid4().hex}", "duration": 2.0}
+    scene.update(fields)
+    return scene
+
+
+def test_generated_clip_replaces_placeholder(tmp_path):
+    generate = _stub_generator(str(tmp_path))
+    scenes = [_broll_scene()]
+    _generate(scenes, generate)
+
+    resolved = renderer._resolve_generated_asset(Scene.model_validate(scenes[0]))
+
+    assert resolved.input_type == "user_clip"
+    assert os.path.dirname(resolved.file_path) == str(tmp_path)
+    assert (resolved.start, resolved.end) == (0.0, 2.0)
+
+
+def test_duplicate_prompts_generate_once(tmp_path):
+    generate = _stub_generator(str(tmp_path))
+    first = _broll_scene()
+    scenes = [first, dict(first), dict(first, b_roll_keyword=first["b_roll_keyword"].upper())]
+    _generate(scenes, generate)
+    # A later storyboard with the same prompt hits the cache
+    again = [dict(first)]
+    _generate(again, generate)
+
+    assert len(generate.calls) == 1
+    assert len({s["file_path"] for s in scenes + again}) == 1
+
+
+def test_failed_generation_renders_placeholder(tmp_path):
+    generate = _stub_generator(str(tmp_path), fail=RuntimeError("quota exceeded"))
+    scenes = [_broll_scene()]
+    _generate(scenes, generate)
+
+    scene = Scene.model_validate(scenes[0])
+    entry = generated_assets.get(scene.asset_key)
+    assert entry["status"] == generated_assets.FAILED
+    assert entry["error"] == "quota exceeded"
+    assert renderer._resolve_generated_asset(scene) == scene
+
+
+def test_claim_and_wait_ready(tmp_path):
+    key = generated_assets.asset_key("stub", f"claim {uuid.uuid4().hex}")
+    clip = tmp_path / "clip.mp4"
+    clip.write_bytes(b"stub")
+
+    assert generated_assets.claim(key, "stub", "prompt")
+    # Someone else is generating it: no second claim, and waiting times out
+    assert not generated_assets.claim(key, "stub", "prompt")
+    assert generated_assets.wait_ready(key, 0.05) is None
+
+    generated_assets.mark_ready(key, str(clip))
+    assert generated_assets.wait_ready(key, 0.05) == str(clip)
+    assert not generated_assets.claim(key, "stub", "prompt")
+
+    # A ready asset whose file is gone is regenerated
+    clip.unlink()
+    assert generated_assets.claim(key, "stub", "prompt")
+
+
+def test_no_asset_never_falls_back_to_user_footage(tmp_path):
+    # No generative provider and an empty stock library: nothing to show but the card,
+    # even though the scene still points at the user's main video
+    main_video = tmp_path / "main.mp4"
+    main_video.write_bytes(b"user footage")
+    scenes = [_broll_scene(provider="", file_path=str(main_video))]
+    _generate(scenes, _stub_generator(str(tmp_path)))
+
+    scene = Scene.model_validate(scenes[0])
+    resolved = renderer._resolve_generated_asset(scene)
+
+    assert resolved == scene
+    assert resolved.input_type == "ai_broll"
+
+
+@pytest.mark.parametrize("provider, expected", [("Veo-2", "veo"), (None, None), ("", None), ("stub", None)])
+def test_provider_comes_from_the_scene(provider, expected):
+    # The local stand-in is a server setting (BROLL_PROVIDER=stub), never a scene's choice
+    assert flow_orchestrator._provider_for({"input_type": "ai_broll", "provider": provider}) == expected
+
+
+def test_forced_stub_provider(monkeypatch):
+    monkeypatch.setattr(flow_orchestrator, "BROLL_PROVIDER", "stub")
+
+    assert flow_orchestrator._provider_for({"input_type": "ai_broll", "provider": "veo"}) == "stub"
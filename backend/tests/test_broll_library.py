@@ -0,0 +1,36 @@
+import pytest
+
+from app.services import broll_service, media_probe
+
+# Stock library lookups on a fresh start: no persisted index yet, so the first
+# search scans before answering instead of returning the placeholder.
+
+
+@pytest.fixture
+def fresh_library(tmp_path, monkeypatch):
+    library = tmp_path / "library"
+    library.mkdir()
+    monkeypatch.setattr(broll_service, "BROLL_LIBRARY_DIR", str(library))
+    monkeypatch.setattr(broll_service, "BROLL_INDEX_PATH", str(tmp_path / "broll_index.json"))
+    monkeypatch.setattr(broll_service, "BROLL_INDEX_REFRESH_SECONDS", 3600)
+    for name, value in [("_entries", {}), ("_inverted", {}), ("_hits", {}), ("_loaded", False),
+                        ("_last_refresh", 0.0), ("_refresher", None)]:
+        monkeypatch.setattr(broll_service, name, value)
+    # Indexing probes each clip; these files aren't real video
+    monkeypatch.setattr(media_probe, "probe", lambda path: {
+        "duration": 4.0, "display_width": 1080, "display_height": 1920,
+    })
+    return library
+
+
+def test_first_search_after_a_fresh_start_finds_library_clips(fresh_library):
+    clip = fresh_library / "city_night_traffic.mp4"
+    clip.write_bytes(b"clip")
+
+    assert broll_service.get_broll_path("city traffic") == str(clip)
+
+
+def test_no_match_returns_the_placeholder(fresh_library):
+    (fresh_library / "ocean_waves.mp4").write_bytes(b"clip")
+
+    assert broll_service.get_broll_path("bitcoin") == "BROLL_PLACEHOLDER:bitcoin"
@@ -0,0 +1,125 @@
+import asyncio
+import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import ai_client, gemini_file_cache
+
+# The remote-file cache against a fake upload API: what gets uploaded, what is
+# reused, and what happens when the remote copy is gone or failed processing.
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(ai_client, "POLL_INITIAL_DELAY", 0.001)
+    monkeypatch.setattr(ai_client, "POLL_MAX_DELAY", 0.001)
+
+
+class FakeClient:
+    """upload_file/get_file with files that process for `polls` get_file calls, then reach `final_state`."""
+
+    def __init__(self, final_state="ACTIVE", polls=1, expires_in=None):
+        self.final_state = final_state
+        self.polls = polls
+        self.expires_in = expires_in
+        self.files = {}
+        self.uploads = []
+
+    def _ref(self, name):
+        file = self.files[name]
+        state = "PROCESSING" if file["polls"] > 0 else file["state"]
+        expiration = None
+        if self.expires_in is not None:
+            expiration = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=self.expires_in)
+        return SimpleNamespace(name=name, state=SimpleNamespace(name=state), expiration_time=expiration)
+
+    def upload_file(self, path):
+        name = f"files/{len(self.uploads)}"
+        self.uploads.append(path)
+        self.files[name] = {"polls": self.polls, "state": self.final_state}
+        return self._ref(name)
+
+    def get_file(self, name):
+        if name not in self.files:
+            raise LookupError(f"{name} not found")
+        self.files[name]["polls"] -= 1
+        return self._ref(name)
+
+
+@pytest.fixture
+def make_cache(tmp_path):
+    def make(client):
+        return gemini_file_cache.GeminiFileCache(client=client, db_path=str(tmp_path / "gemini_files.db"))
+    return make
+
+
+def _get(cache, key="clip-key"):
+    return asyncio.run(cache.get_or_upload("/media/clip.mp4", key=key))
+
+
+def test_active_file_is_reused(make_cache):
+    client = FakeClient()
+    cache = make_cache(client)
+
+    first = _get(cache)
+    second = _get(cache)
+
+    assert first.state.name == "ACTIVE"
+    assert second.name == first.name
+    assert client.uploads == ["/media/clip.mp4"]
+
+
+def test_missing_remote_file_is_uploaded_again(make_cache):
+    client = FakeClient()
+    cache = make_cache(client)
+    first = _get(cache)
+
+    del client.files[first.name]
+    second = _get(cache)
+
+    assert second.state.name == "ACTIVE"
+    assert second.name != first.name
+    assert len(client.uploads) == 2
+
+
+def test_expired_reference_is_uploaded_again(make_cache):
+    # Expires inside the safety margin: not handed out again
+    client = FakeClient(expires_in=gemini_file_cache.EXPIRY_MARGIN_SECONDS / 2)
+    cache = make_cache(client)
+
+    _get(cache)
+    _get(cache)
+
+    assert len(client.uploads) == 2
+
+
+def test_failed_upload_is_returned_but_not_cached(make_cache):
+    client = FakeClient(final_state="FAILED")
+    cache = make_cache(client)
+
+    first = _get(cache)
+    _get(cache)
+
+    assert first.state.name == "FAILED"
+    assert len(client.uploads) == 2
+
+
+def test_cached_file_that_failed_is_forgotten(make_cache):
+    client = FakeClient()
+    cache = make_cache(client)
+    first = _get(cache)
+
+    client.files[first.name]["state"] = "FAILED"
+    second = _get(cache)
+
+    assert second.name != first.name
+    assert len(client.uploads) == 2
+
+
+def test_processing_timeout_raises(make_cache, monkeypatch):
+    monkeypatch.setattr(ai_client, "AI_UPLOAD_TIMEOUT", 0.0005)
+    cache = make_cache(FakeClient(polls=1000))
+
+    with pytest.raises(TimeoutError):
+        _get(cache)
@@ -0,0 +1,122 @@
+import uuid
+
+import pytest
+
+from app.services import job_queue, job_registry, resources
+
+# The SQLite render queue without worker processes: claim order, retries,
+# cancellation and memory admission, driven through the same calls the workers make.
+
+MB = resources.MB
+
+
+@pytest.fixture(autouse=True)
+def fresh_queue(tmp_path, monkeypatch):
+    # A queue of its own per test (jobs left queued would be claimed by the next one)
+    db_path = str(tmp_path / "jobs.db")
+    monkeypatch.setattr(job_queue, "QUEUE_DB_PATH", db_path)
+    monkeypatch.setattr(job_registry, "REGISTRY_DB_PATH", db_path)
+    monkeypatch.setattr(job_queue, "_schema_ready", False)
+    monkeypatch.setattr(job_registry, "_schema_ready", False)
+    # Memory estimates come from the test storyboards, not from probing media
+    monkeypatch.setattr(job_queue, "_estimate_rss", lambda storyboard: storyboard.get("rss"))
+
+
+def _enqueue(priority=0, rss=None):
+    job_id = uuid.uuid4().hex
+    job_queue.enqueue({"scenes": [], "rss": rss}, job_id, priority=priority)
+    return job_id
+
+
+def test_claims_by_priority_then_submission_order():
+    first, second, urgent = _enqueue(), _enqueue(), _enqueue(priority=5)
+
+    claimed = [job_queue.claim_next("w")["job_id"] for _ in range(3)]
+
+    assert claimed == [urgent, first, second]
+    assert job_queue.claim_next("w") is None
+
+
+def test_failed_job_is_retried_until_attempts_run_out(monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_MAX_ATTEMPTS", 2)
+    job_id = _enqueue()
+
+    job_queue.claim_next("w")
+    job_queue.mark_failed(job_id, "boom")
+    assert job_queue.get_job(job_id)["status"] == job_queue.QUEUED
+    assert job_registry.get(job_id)["status"] == job_registry.QUEUED
+
+    retry = job_queue.claim_next("w")
+    assert (retry["job_id"], retry["attempts"]) == (job_id, 2)
+    job_queue.mark_failed(job_id, "boom")
+
+    assert job_queue.get_job(job_id)["status"] == job_queue.FAILED
+    assert job_registry.get(job_id)["status"] == job_registry.FAILED
+    assert job_queue.claim_next("w") is None
+
+
+def test_stale_running_job_is_requeued():
+    job_id = _enqueue()
+    job_queue.claim_next("w")
+
+    assert job_queue.requeue_stale(timeout=-1) == [job_id]
+    assert job_queue.get_job(job_id)["status"] == job_queue.QUEUED
+
+
+def test_cancelling_a_queued_job_removes_it_from_the_queue():
+    job_id = _enqueue()
+
+    job_queue.cancel(job_id)
+
+    assert job_queue.get_job(job_id)["status"] == job_queue.CANCELLED
+    assert job_registry.get(job_id)["status"] == job_registry.CANCELLED
+    assert job_queue.claim_next("w") is None
+
+
+def test_cancelling_a_running_job_flags_it_for_its_worker():
+    job_id = _enqueue()
+    job_queue.claim_next("w")
+    assert job_queue.heartbeat(job_id) is False
+
+    job_queue.cancel(job_id)
+
+    assert job_queue.get_job(job_id)["status"] == job_queue.RUNNING
+    assert job_queue.heartbeat(job_id) is True
+
+
+@pytest.fixture
+def memory_budget(monkeypatch):
+    monkeypatch.setattr(resources, "memory_budget", lambda: 1000 * MB)
+    monkeypatch.setattr(resources, "memory_available", lambda: None)
+
+
+def test_job_waits_for_memory_held_by_running_jobs(memory_budget):
+    small, big = _enqueue(rss=600 * MB), _enqueue(rss=600 * MB)
+
+    assert job_queue.claim_next("w1")["job_id"] == small
+    assert job_queue.committed_rss() == 600 * MB
+    # Another worker (a separate process in production) sees the same commitment
+    assert job_queue.claim_next("w2") is None
+
+    job_queue.mark_completed(small)
+    assert job_queue.claim_next("w2")["job_id"] == big
+
+
+def test_jobs_behind_a_waiting_job_wait_too(memory_budget):
+    _enqueue(rss=600 * MB)
+    _enqueue(rss=600 * MB)
+    _enqueue(rss=10 * MB)
+
+    job_queue.claim_next("w1")
+
+    assert job_queue.claim_next("w2") is None
+
+
+def test_job_over_the_whole_budget_runs_alone(memory_budget):
+    huge = _enqueue(rss=5000 * MB)
+    small = _enqueue(rss=10 * MB)
+
+    assert job_queue.claim_next("w1")["job_id"] == huge
+    assert job_queue.claim_next("w2") is None
+    job_queue.mark_completed(huge)
+    assert job_queue.claim_next("w2")["job_id"] == small
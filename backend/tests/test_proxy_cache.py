@@ -0,0 +1,63 @@
+import os
+import time
+import uuid
+
+import pytest
+
+from app.models.storyboard import Scene
+from app.services import proxy_cache, renderer
+
+# Proxies as preview sources: used only once encoded (a preview never waits on
+# an encode), and never evicted while a render may still be reading them.
+
+
+@pytest.fixture
+def proxy_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(proxy_cache, "PROXY_DIR", str(tmp_path / "proxies"))
+    os.makedirs(proxy_cache.PROXY_DIR)
+    return proxy_cache.PROXY_DIR
+
+
+@pytest.fixture
+def clip(tmp_path):
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(uuid.uuid4().bytes)
+    return str(path)
+
+
+def _preview(clip):
+    scene = Scene.model_validate({"input_type": "user_clip", "file_path": clip, "start": 0, "end": 2})
+    settings = renderer.OutputSettings(360, 640, 12, "ultrafast", quality="preview")
+    return renderer._preview_source(scene, settings).file_path
+
+
+def test_preview_reads_the_original_until_the_proxy_exists(proxy_dir, clip):
+    assert _preview(clip) == clip
+
+    proxy = proxy_cache.proxy_path_for(clip)
+    open(proxy, "wb").close()
+
+    assert _preview(clip) == proxy
+
+
+def test_proxies_smaller_than_the_frame_are_not_used(proxy_dir, clip, monkeypatch):
+    open(proxy_cache.proxy_path_for(clip), "wb").close()
+    monkeypatch.setattr(proxy_cache, "PROXY_SHORT_EDGE", 360)
+
+    assert _preview(clip) == clip
+
+
+def test_eviction_skips_proxies_in_use(proxy_dir, monkeypatch):
+    monkeypatch.setattr(proxy_cache, "PROXY_CACHE_MAX_BYTES", 0)
+    paths = {}
+    for name, age in [("old", 2 * proxy_cache.PROXY_IN_USE_SECONDS), ("recent", 60)]:
+        paths[name] = os.path.join(proxy_dir, f"{name}.mp4")
+        with open(paths[name], "wb") as f:
+            f.write(b"proxy")
+        used = time.time() - age
+        os.utime(paths[name], (used, used))
+
+    proxy_cache._evict()
+
+    assert not os.path.exists(paths["old"])
+    assert os.path.exists(paths["recent"])
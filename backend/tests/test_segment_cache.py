@@ -0,0 +1,83 @@
+import os
+import uuid
+
+import pytest
+
+from app.models.storyboard import Scene
+from app.services import segment_cache, renderer
+
+# Segment cache keys: a scene re-renders only when something that decides its
+# bytes changed (scene fields, source content, copy window, output settings).
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(uuid.uuid4().bytes)
+    return str(path)
+
+
+def _scene(path, **fields):
+    return Scene.model_validate({"input_type": "user_clip", "file_path": path, "start": 0, "end": 2, **fields})
+
+
+SETTINGS = renderer.OutputSettings(720, 1280, 24, "ultrafast")
+
+
+def test_same_scene_and_content_share_a_key(source, tmp_path):
+    copy = tmp_path / "renamed.mp4"
+    copy.write_bytes(open(source, "rb").read())
+
+    # Keyed on content, not on where the file lives
+    assert segment_cache.segment_key(_scene(source), None, SETTINGS) == segment_cache.segment_key(_scene(str(copy)), None, SETTINGS)
+
+
+@pytest.mark.parametrize("change", [
+    lambda scene, window, settings: (scene.model_copy(update={"caption": "New"}), window, settings),
+    lambda scene, window, settings: (scene.model_copy(update={"end": 1.5, "duration": 1.5}), window, settings),
+    lambda scene, window, settings: (scene, (0.04, 2.0), settings),
+    lambda scene, window, settings: (scene, window, renderer.OutputSettings(720, 1280, 30, "ultrafast")),
+    lambda scene, window, settings: (scene, window, renderer.OutputSettings(720, 1280, 24, "ultrafast", crf=30)),
+])
+def test_anything_that_changes_the_output_changes_the_key(source, change):
+    scene, window = _scene(source), (0.0, 2.0)
+
+    assert segment_cache.segment_key(*change(scene, window, SETTINGS)) != segment_cache.segment_key(scene, window, SETTINGS)
+
+
+def test_edited_source_content_changes_the_key(tmp_path):
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(b"first")
+    before = segment_cache.segment_key(_scene(str(path)), None, SETTINGS)
+
+    path.write_bytes(b"second take")
+    os.utime(path, ns=(1, 1))
+
+    assert segment_cache.segment_key(_scene(str(path)), None, SETTINGS) != before
+
+
+def test_store_then_fetch_and_miss(source, tmp_path):
+    key = segment_cache.segment_key(_scene(source), None, SETTINGS)
+    segment = tmp_path / "seg.ts"
+    segment.write_bytes(b"segment bytes")
+
+    assert not segment_cache.fetch(key, str(tmp_path / "miss.ts"))
+    segment_cache.store(key, str(segment))
+    assert segment_cache.fetch(key, str(tmp_path / "hit.ts"))
+    assert (tmp_path / "hit.ts").read_bytes() == b"segment bytes"
+
+
+def test_eviction_drops_least_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(segment_cache, "SEGMENT_CACHE_DIR", str(tmp_path / "cache"))
+    os.makedirs(segment_cache.SEGMENT_CACHE_DIR)
+    monkeypatch.setattr(segment_cache, "SEGMENT_CACHE_MAX_BYTES", 10)
+    for key in ("old", "new"):
+        segment = tmp_path / f"{key}.ts"
+        segment.write_bytes(b"x" * 6)
+        segment_cache.store(key, str(segment))
+    os.utime(segment_cache._path_for("old"), (1, 1))
+
+    segment_cache.evict()
+
+    assert not os.path.exists(segment_cache._path_for("old"))
+    assert os.path.exists(segment_cache._path_for("new"))
@@ -0,0 +1,105 @@
+import pytest
+
+from app.services import storyboard_patch
+from app.services.storyboard_patch import PatchError
+
+# Chat edits as JSON-Patch-style operations: the compact view the model sees,
+# applying edits all or nothing, and the checks that keep edits renderable.
+
+
+def _storyboard():
+    return {
+        "scenes": [
+            {"input_type": "user_clip", "file_path": "/blobs/a.mp4", "start": 0.0, "end": 3.0, "caption": "Hook"},
+            {"input_type": "user_image", "file_path": "/blobs/b.jpg", "duration": 2.0},
+            {"input_type": "ai_broll", "b_roll_keyword": "city", "duration": 2.0, "asset_key": "k1", "file_path": "/gen/k1.mp4"},
+        ],
+        "aspect_ratio": "9:16",
+        "media_names": {"/blobs/a.mp4": "beach.mp4", "/blobs/b.jpg": "sunset.jpg"},
+    }
+
+
+def test_compact_view_uses_media_refs_not_paths():
+    view = storyboard_patch.compact(_storyboard())
+
+    assert "/blobs/" not in view
+    assert 'MEDIA m0 "beach.mp4"' in view
+    assert '"source":"m1"' in view
+
+
+def test_replace_a_field_reports_only_that_scene():
+    result, changed = storyboard_patch.apply(_storyboard(), [
+        {"op": "replace", "path": "/scenes/0/caption", "value": "New hook"},
+    ])
+
+    assert result["scenes"][0]["caption"] == "New hook"
+    assert result["scenes"][1]["file_path"] == "/blobs/b.jpg"
+    assert changed == [0]
+
+
+def test_clip_duration_moves_the_end_cut():
+    result, _ = storyboard_patch.apply(_storyboard(), [
+        {"op": "replace", "path": "/scenes/0/duration", "value": 1.5},
+    ])
+
+    assert (result["scenes"][0]["start"], result["scenes"][0]["end"]) == (0.0, 1.5)
+
+
+def test_changing_a_broll_prompt_drops_the_generated_clip():
+    result, changed = storyboard_patch.apply(_storyboard(), [
+        {"op": "replace", "path": "/scenes/2/b_roll_keyword", "value": "forest"},
+    ])
+
+    scene = result["scenes"][2]
+    assert scene["asset_key"] is None and scene["file_path"] is None
+    assert changed == [2]
+
+
+def test_move_add_and_remove_whole_scenes():
+    result, changed = storyboard_patch.apply(_storyboard(), [
+        {"op": "move", "from": "/scenes/2", "path": "/scenes/0"},
+        {"op": "remove", "path": "/scenes/2"},
+        {"op": "add", "path": "/scenes/-", "value": {"input_type": "user_clip", "source": "m0", "start": 5, "end": 7}},
+    ])
+
+    assert [s["input_type"] for s in result["scenes"]] == ["ai_broll", "user_clip", "user_clip"]
+    assert result["scenes"][2]["file_path"] == "/blobs/a.mp4"
+    # Moved scenes are unchanged; only the added one is new
+    assert changed == [2]
+
+
+def test_storyboard_settings_are_editable():
+    result, changed = storyboard_patch.apply(_storyboard(), [
+        {"op": "replace", "path": "/aspect_ratio", "value": "1:1"},
+    ])
+
+    assert result["aspect_ratio"] == "1:1"
+    assert changed == []
+
+
+@pytest.mark.parametrize("operations", [
+    [{"op": "replace", "path": "/scenes/9/caption", "value": "x"}],
+    [{"op": "replace", "path": "/scenes/0/file_path", "value": "/etc/passwd"}],
+    [{"op": "replace", "path": "/scenes/0/source", "value": "m7"}],
+    [{"op": "replace", "path": "/aspect_ratio", "value": "7:3"}],
+    [{"op": "test", "path": "/scenes/0"}],
+    [{"op": "remove", "path": "/scenes/0/input_type"}],
+    [{"op": "replace", "path": "/scenes/1/input_type", "value": "user_clip"}],
+    [{"op": "remove", "path": "/scenes/0"}, {"op": "remove", "path": "/scenes/0"}, {"op": "remove", "path": "/scenes/0"}],
+    "not a list",
+])
+def test_invalid_edits_are_rejected(operations):
+    with pytest.raises(PatchError):
+        storyboard_patch.apply(_storyboard(), operations)
+
+
+def test_edits_apply_all_or_nothing():
+    storyboard = _storyboard()
+
+    with pytest.raises(PatchError):
+        storyboard_patch.apply(storyboard, [
+            {"op": "replace", "path": "/scenes/0/caption", "value": "Changed"},
+            {"op": "replace", "path": "/scenes/0/start", "value": -1},
+        ])
+
+    assert storyboard == _storyboard()
@@ -0,0 +1,51 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models.storyboard import Storyboard
+from app.services import storage, storyboard_service
+
+# Scene sources must be media the server manages: a client-sent storyboard can't
+# point the renderer (or the prober) at arbitrary files.
+
+
+def _storyboard(path, input_type="user_clip"):
+    return {"scenes": [{"input_type": input_type, "file_path": path, "start": 0, "end": 2}]}
+
+
+def test_blob_paths_are_allowed():
+    blob = os.path.join(storage.BLOB_DIR, "ab", "ab" * 32 + ".mp4")
+    storyboard = Storyboard.model_validate(_storyboard(blob))
+
+    assert storyboard_service.check_sources(storyboard) is storyboard
+
+
+@pytest.mark.parametrize("path", [
+    "/etc/passwd",
+    os.path.join(storage.BLOB_DIR, "..", "..", "secrets.mp4"),
+    os.path.join(storage.STATE_DIR, "jobs.db"),
+])
+def test_paths_outside_managed_media_are_rejected(path):
+    with pytest.raises(storyboard_service.InvalidSource):
+        storyboard_service.check_sources(Storyboard.model_validate(_storyboard(path)))
+
+
+def test_symlink_out_of_the_blob_store_is_rejected(tmp_path):
+    link = os.path.join(storage.BLOB_DIR, "zz", "zz" * 32 + ".mp4")
+    os.makedirs(os.path.dirname(link), exist_ok=True)
+    try:
+        os.symlink("/etc/passwd", link)
+        with pytest.raises(storyboard_service.InvalidSource):
+            storyboard_service.check_sources(Storyboard.model_validate(_storyboard(link, "user_image")))
+    finally:
+        os.remove(link)
+
+
+def test_render_and_chat_edit_answer_422():
+    client = TestClient(app)
+
+    assert client.post("/api/render", json=_storyboard("/etc/passwd")).status_code == 422
+    response = client.post("/api/chat/edit", json={"storyboard": _storyboard("/etc/hosts"), "message": "shorter"})
+    assert response.status_code == 422
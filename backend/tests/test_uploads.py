@@ -0,0 +1,180 @@
+import os
+import uuid
+import hashlib
+import threading
+import concurrent.futures
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import storage
+
+# Content-addressed storage and the resumable chunked upload API: what extension
+# a blob gets, parts in any order, resuming from received_parts, completing.
+
+PART_SIZE = 4
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(storage, "UPLOAD_PART_SIZE", PART_SIZE)
+    return TestClient(app)
+
+
+def _ftyp(major, *compatible):
+    body = b"ftyp" + major + b"\0\0\0\0" + b"".join(compatible)
+    return (len(body) + 4).to_bytes(4, "big") + body
+
+
+@pytest.mark.parametrize("head, filename, ext", [
+    (_ftyp(b"isom", b"isom", b"mp41"), "clip.bin", ".mp4"),
+    (_ftyp(b"qt  ", b"qt  "), "clip.MOV", ".mp4"),
+    (_ftyp(b"heic", b"mif1", b"heic"), "photo.jpg", ".heic"),
+    (_ftyp(b"mif1", b"mif1", b"heic"), "photo", ".heic"),
+    (_ftyp(b"avif", b"avif", b"mif1"), "photo", ".avif"),
+    (_ftyp(b"mif1", b"mif1", b"miaf", b"avif"), "photo", ".avif"),
+    (b"\x89PNG\r\n\x1a\n", "photo.jpg", ".png"),
+    (b"RIFF\0\0\0\0WEBPVP8 ", "photo", ".webp"),
+    (b"unknown bytes", "photo.JPEG", ".jpg"),
+    (b"unknown bytes", "clip.heif", ".heic"),
+])
+def test_blob_extension_comes_from_the_bytes(head, filename, ext):
+    assert storage._blob_ext(head, filename) == ext
+
+
+def _payload():
+    # Unique content per test: the blob store is shared
+    return b"\x89PNG\r\n\x1a\n" + uuid.uuid4().bytes
+
+
+def _parts(data):
+    return [data[i:i + PART_SIZE] for i in range(0, len(data), PART_SIZE)]
+
+
+def _init(client, data, **fields):
+    response = client.post("/api/uploads", json={"filename": "photo.png", "size": len(data), **fields})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_parts_in_any_order_then_complete(client):
+    data = _payload()
+    upload = _init(client, data, sha256=hashlib.sha256(data).hexdigest())
+    parts = _parts(data)
+    assert upload["total_parts"] == len(parts)
+
+    for n in reversed(range(1, len(parts) + 1)):
+        assert client.put(f"/api/uploads/{upload['upload_id']}/parts/{n}", content=parts[n - 1]).status_code == 200
+    response = client.post(f"/api/uploads/{upload['upload_id']}/complete")
+
+    assert response.status_code == 200
+    meta = response.json()
+    assert meta["status"] == "complete"
+    assert meta["path"].endswith(".png")
+    with open(meta["path"], "rb") as f:
+        assert f.read() == data
+
+
+def test_resume_sends_only_the_missing_parts(client):
+    data = _payload()
+    upload = _init(client, data)
+    parts = _parts(data)
+    client.put(f"/api/uploads/{upload['upload_id']}/parts/1", content=parts[0])
+
+    status = client.get(f"/api/uploads/{upload['upload_id']}").json()
+    assert status["received_parts"] == [1]
+    assert client.post(f"/api/uploads/{upload['upload_id']}/complete").status_code == 400
+
+    for n in range(2, len(parts) + 1):
+        client.put(f"/api/uploads/{upload['upload_id']}/parts/{n}", content=parts[n - 1])
+    assert client.post(f"/api/uploads/{upload['upload_id']}/complete").status_code == 200
+
+
+def test_retried_part_overwrites_the_first_attempt(client):
+    data = _payload()
+    upload = _init(client, data)
+    parts = _parts(data)
+    client.put(f"/api/uploads/{upload['upload_id']}/parts/1", content=b"xxxx")
+    for n in range(1, len(parts) + 1):
+        client.put(f"/api/uploads/{upload['upload_id']}/parts/{n}", content=parts[n - 1])
+
+    meta = client.post(f"/api/uploads/{upload['upload_id']}/complete").json()
+
+    assert meta["sha256"] == hashlib.sha256(data).hexdigest()
+
+
+def test_wrong_part_size_and_checksum_are_rejected(client):
+    data = _payload()
+    upload = _init(client, data, sha256="0" * 64)
+    assert client.put(f"/api/uploads/{upload['upload_id']}/parts/1", content=b"toolong").status_code == 413
+    assert client.put(f"/api/uploads/{upload['upload_id']}/parts/1", content=b"x").status_code == 400
+
+    for n, part in enumerate(_parts(data), start=1):
+        client.put(f"/api/uploads/{upload['upload_id']}/parts/{n}", content=part)
+    response = client.post(f"/api/uploads/{upload['upload_id']}/complete")
+
+    assert response.status_code == 400
+    assert "sha256 mismatch" in response.json()["detail"]
+
+
+def test_identical_uploads_share_one_blob(client):
+    data = _payload()
+    metas = []
+    for _ in range(2):
+        upload = _init(client, data)
+        for n, part in enumerate(_parts(data), start=1):
+            client.put(f"/api/uploads/{upload['upload_id']}/parts/{n}", content=part)
+        metas.append(client.post(f"/api/uploads/{upload['upload_id']}/complete").json())
+
+    assert metas[0]["path"] == metas[1]["path"]
+    assert (metas[0]["deduplicated"], metas[1]["deduplicated"]) == (False, True)
+
+
+def test_unknown_upload_is_404(client):
+    assert client.get(f"/api/uploads/{uuid.uuid4().hex}").status_code == 404
+    assert client.get("/api/uploads/not-hex").status_code == 404
+
+
+def test_concurrent_completes_all_get_the_stored_file(client):
+    data = _payload()
+    upload = _init(client, data)
+    for n, part in enumerate(_parts(data), start=1):
+        client.put(f"/api/uploads/{upload['upload_id']}/parts/{n}", content=part)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as pool:
+        metas = list(pool.map(lambda _: storage.complete_upload(upload["upload_id"]), range(8)))
+
+    assert {meta["status"] for meta in metas} == {"complete"}
+    assert len({meta["path"] for meta in metas}) == 1
+
+
+def _claimed_by_another_process(client):
+    """An upload whose data another API process has claimed for completing."""
+    data = _payload()
+    upload = _init(client, data)
+    for n, part in enumerate(_parts(data), start=1):
+        client.put(f"/api/uploads/{upload['upload_id']}/parts/{n}", content=part)
+    data_path = os.path.join(storage._upload_dir(upload["upload_id"]), "data")
+    os.rename(data_path, f"{data_path}.completing")
+    return storage.get_upload(upload["upload_id"])
+
+
+def test_complete_returns_what_another_process_completed(client):
+    meta = _claimed_by_another_process(client)
+    done = dict(meta, status="complete", path="/elsewhere/blob.png")
+    done.pop("received_parts")
+    timer = threading.Timer(0.3, storage._write_meta, (meta["upload_id"], done))
+    timer.start()
+
+    assert storage.complete_upload(meta["upload_id"]) == done
+    timer.join()
+
+
+def test_complete_gives_up_on_a_stuck_completion(client, monkeypatch):
+    monkeypatch.setattr(storage, "UPLOAD_COMPLETE_WAIT_SECONDS", 0.3)
+    meta = _claimed_by_another_process(client)
+
+    response = client.post(f"/api/uploads/{meta['upload_id']}/complete")
+
+    assert response.status_code == 409
@@ -47,7 +47,7 @@ export default function DashboardPage() {
             // New logic: If we have a job ID but no URL, we are still processing
             setIsProcessing(true);
             setStatus('Finalizing your video...');
-            pollJob(storedJobId);
+            watchJob(storedJobId);
             // Clear it so we don't poll forever on refresh if it completed? 
             // Better to leave it until completion clears it or overwrites URL
         }
@@ -63,29 +63,81 @@ export default function DashboardPage() {
         }
     };
 
+    // Returns true once the job reached a final state
+    const handleJobStatus = (statusData: any): boolean => {
+        if (statusData.status === 'completed') {
+            setIsProcessing(false);
+            // Use relative path for video URL
+            setVideoUrl(statusData.output_url);
+            setStatus('Completed!');
+            localStorage.removeItem('avea_onboarding_job_id'); // Clear job ID
+            return true;
+        } else if (statusData.status === 'failed' || statusData.status === 'cancelled') {
+            setIsProcessing(false);
+            alert('Generation Failed: ' + statusData.message);
+            localStorage.removeItem('avea_onboarding_job_id'); // Clear job ID
+            return true;
+        }
+
+        if (typeof statusData.progress === 'number' && statusData.progress > 0) {
+            setStatus(`${statusData.message} ${Math.round(statusData.progress * 100)}%`);
+        } else if (statusData.message) {
+            setStatus(statusData.message);
+        }
+        return false;
+    };
+
     const pollJob = (jobId: string) => {
-        const interval = setInterval(async () => {
+        const poll = async () => {
+            // Server suggests how long to wait (slower while queued, faster while encoding)
+            let nextPollMs = 2000;
             try {
                 const statusRes = await fetch(`/api/status/${jobId}`);
                 const statusData = await statusRes.json();
-
-                if (statusData.status === 'completed') {
-                    clearInterval(interval);
-                    setIsProcessing(false);
-                    // Use relative path for video URL
-                    setVideoUrl(statusData.output_url);
-                    setStatus('Completed!');
-                    localStorage.removeItem('avea_onboarding_job_id'); // Clear job ID
-                } else if (statusData.status === 'failed') {
-                    clearInterval(interval);
-                    setIsProcessing(false);
-                    alert('Generation Failed: ' + statusData.message);
-                    localStorage.removeItem('avea_onboarding_job_id'); // Clear job ID
+                if (handleJobStatus(statusData)) return;
+                if (statusData.poll_after) {
+                    nextPollMs = statusData.poll_after * 1000;
                 }
             } catch (e) {
                 console.error('Polling error', e);
             }
-        }, 2000);
+            setTimeout(poll, nextPollMs);
+        };
+        setTimeout(poll, 2000);
+    };
+
+    const watchJob = (jobId: string) => {
+        // Push updates over SSE; fall back to polling if the stream isn't available
+        if (typeof EventSource === 'undefined') {
+            pollJob(jobId);
+            return;
+        }
+        const source = new EventSource(`/api/status/${jobId}/events`);
+        let finished = false;
+        source.addEventListener('status', (e) => {
+            if (handleJobStatus(JSON.parse((e as MessageEvent).data))) {
+                finished = true;
+                source.close();
+            }
+        });
+        // The server caps each stream's lifetime; pick up where it left off
+        source.addEventListener('timeout', () => {
+            finished = true;
+            source.close();
+            watchJob(jobId);
+        });
+        source.addEventListener('not_found', () => {
+            finished = true;
+            source.close();
+            setIsProcessing(false);
+            setStatus('Job not found');
+            localStorage.removeItem('avea_onboarding_job_id');
+        });
+        source.onerror = () => {
+            if (finished) return;
+            source.close();
+            pollJob(jobId);
+        };
     };
 
     const handleGenerate = async () => {
@@ -127,7 +179,7 @@ export default function DashboardPage() {
 
             if (data.job_id) {
                 localStorage.setItem('avea_onboarding_job_id', data.job_id);
-                pollJob(data.job_id);
+                watchJob(data.job_id);
             }
         } catch (e) {
             console.error(e);
@@ -152,7 +204,7 @@ export default function DashboardPage() {
             const data = await res.json();
             if (data.job_id) {
                 localStorage.setItem('avea_onboarding_job_id', data.job_id); 
-                pollJob(data.job_id);
+                watchJob(data.job_id);
             }
         } catch (e) {
             console.error('Render error', e);